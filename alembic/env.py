@@ -21,7 +21,8 @@ target_metadata = Base.metadata
 # Получаем DATABASE_URL из env
 env = Env()
 env.read_env()
-db_url = env("DATABASE_URL")
+# Миграции выполняются синхронно, поэтому асинхронный драйвер бота заменяем на psycopg2
+db_url = env("DATABASE_URL").replace("+asyncpg", "+psycopg2")
 config.set_main_option("sqlalchemy.url", db_url)
 
 def run_migrations_offline():
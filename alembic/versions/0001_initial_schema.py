@@ -0,0 +1,159 @@
+"""Initial schema
+
+Revision ID: 0001
+Revises: 
+Create Date: 2025-07-30 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+ASSOCIATIONS = [
+    ('task_event', 'task_id', 'tasks', 'event_id', 'events'),
+    ('task_goal', 'task_id', 'tasks', 'goal_id', 'goals'),
+    ('task_idea', 'task_id', 'tasks', 'idea_id', 'ideas'),
+    ('task_note', 'task_id', 'tasks', 'note_id', 'notes'),
+    ('event_goal', 'event_id', 'events', 'goal_id', 'goals'),
+    ('event_idea', 'event_id', 'events', 'idea_id', 'ideas'),
+    ('event_note', 'event_id', 'events', 'note_id', 'notes'),
+    ('goal_idea', 'goal_id', 'goals', 'idea_id', 'ideas'),
+    ('goal_note', 'goal_id', 'goals', 'note_id', 'notes'),
+    ('idea_note', 'idea_id', 'ideas', 'note_id', 'notes'),
+    ('task_tag', 'task_id', 'tasks', 'tag_id', 'tags'),
+    ('event_tag', 'event_id', 'events', 'tag_id', 'tags'),
+    ('goal_tag', 'goal_id', 'goals', 'tag_id', 'tags'),
+    ('idea_tag', 'idea_id', 'ideas', 'tag_id', 'tags'),
+    ('note_tag', 'note_id', 'notes', 'tag_id', 'tags'),
+]
+
+
+def _timestamps():
+    return [
+        sa.Column('created', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    ]
+
+
+def upgrade():
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('last_name', sa.String(), nullable=True),
+        sa.Column('username', sa.String(), nullable=True),
+        sa.Column('tg_id', sa.BigInteger(), nullable=False),
+        *_timestamps(),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('tg_id'),
+    )
+    op.create_table(
+        'tags',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('is_deleted', sa.Boolean(), nullable=False),
+        *_timestamps(),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name'),
+    )
+    op.create_table(
+        'tasks',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('status', sa.Enum('NEW', 'IN_PROGRESS', 'COMPLETED', name='task_status'), nullable=False),
+        sa.Column('deadline', sa.DateTime(), nullable=True),
+        sa.Column('is_deleted', sa.Boolean(), nullable=False),
+        *_timestamps(),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'subtasks',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('is_done', sa.Boolean(), nullable=False),
+        sa.Column('is_deleted', sa.Boolean(), nullable=False),
+        sa.Column('task_id', sa.Integer(), nullable=False),
+        *_timestamps(),
+        sa.ForeignKeyConstraint(['task_id'], ['tasks.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('start_time', sa.DateTime(), nullable=True),
+        sa.Column('end_time', sa.DateTime(), nullable=True),
+        sa.Column('is_confirmed', sa.Boolean(), nullable=False),
+        sa.Column('is_deleted', sa.Boolean(), nullable=False),
+        sa.Column('tag', sa.String(), nullable=True),
+        *_timestamps(),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'goals',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('deadline', sa.DateTime(), nullable=True),
+        sa.Column('is_confirmed', sa.Boolean(), nullable=False),
+        sa.Column('is_deleted', sa.Boolean(), nullable=False),
+        *_timestamps(),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'ideas',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('is_confirmed', sa.Boolean(), nullable=False),
+        sa.Column('is_deleted', sa.Boolean(), nullable=False),
+        *_timestamps(),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'notes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('is_deleted', sa.Boolean(), nullable=False),
+        *_timestamps(),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    for name, left_col, left_table, right_col, right_table in ASSOCIATIONS:
+        op.create_table(
+            name,
+            sa.Column(left_col, sa.Integer(), nullable=False),
+            sa.Column(right_col, sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint([left_col], [f'{left_table}.id']),
+            sa.ForeignKeyConstraint([right_col], [f'{right_table}.id']),
+            sa.PrimaryKeyConstraint(left_col, right_col),
+        )
+
+
+def downgrade():
+    for name, *_ in reversed(ASSOCIATIONS):
+        op.drop_table(name)
+    for name in ['notes', 'ideas', 'goals', 'events', 'subtasks', 'tasks', 'tags', 'users']:
+        op.drop_table(name)
+    sa.Enum(name='task_status').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,95 @@
+"""Indexes for per-user, soft-delete-filtered queries
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+ACTIVE = sa.text('is_deleted = false')
+
+# Списки задач/событий/... всегда фильтруются по user_id и is_deleted и сортируются по id
+ENTITY_TABLES = ['tasks', 'events', 'goals', 'ideas', 'notes', 'tags']
+
+# Обратные индексы для таблиц связей: первичный ключ (left, right) обслуживает только поиск по left
+ASSOCIATIONS = [
+    ('task_event', 'task_id', 'event_id'),
+    ('task_goal', 'task_id', 'goal_id'),
+    ('task_idea', 'task_id', 'idea_id'),
+    ('task_note', 'task_id', 'note_id'),
+    ('event_goal', 'event_id', 'goal_id'),
+    ('event_idea', 'event_id', 'idea_id'),
+    ('event_note', 'event_id', 'note_id'),
+    ('goal_idea', 'goal_id', 'idea_id'),
+    ('goal_note', 'goal_id', 'note_id'),
+    ('idea_note', 'idea_id', 'note_id'),
+    ('task_tag', 'task_id', 'tag_id'),
+    ('event_tag', 'event_id', 'tag_id'),
+    ('goal_tag', 'goal_id', 'tag_id'),
+    ('idea_tag', 'idea_id', 'tag_id'),
+    ('note_tag', 'note_id', 'tag_id'),
+]
+
+
+def upgrade():
+    for table in ENTITY_TABLES:
+        op.create_index(
+            f'ix_{table}_user_id_active',
+            table,
+            ['user_id', sa.text('id DESC')],
+            postgresql_where=ACTIVE,
+        )
+    op.create_index(
+        'ix_tasks_user_created_active',
+        'tasks',
+        ['user_id', sa.text('created DESC')],
+        postgresql_where=ACTIVE,
+    )
+    op.create_index(
+        'ix_tasks_user_deadline_active',
+        'tasks',
+        ['user_id', 'deadline'],
+        postgresql_where=sa.text('is_deleted = false AND deadline IS NOT NULL'),
+    )
+    op.create_index(
+        'ix_goals_user_deadline_active',
+        'goals',
+        ['user_id', 'deadline'],
+        postgresql_where=sa.text('is_deleted = false AND deadline IS NOT NULL'),
+    )
+    op.create_index(
+        'ix_events_user_start_time_active',
+        'events',
+        ['user_id', 'start_time'],
+        postgresql_where=sa.text('is_deleted = false AND start_time IS NOT NULL'),
+    )
+    op.create_index(
+        'ix_subtasks_task_id_active',
+        'subtasks',
+        ['task_id', 'id'],
+        postgresql_where=ACTIVE,
+    )
+    for table, left_col, right_col in ASSOCIATIONS:
+        op.create_index(f'ix_{table}_{right_col}', table, [right_col, left_col])
+
+
+def downgrade():
+    for table, left_col, right_col in reversed(ASSOCIATIONS):
+        op.drop_index(f'ix_{table}_{right_col}', table_name=table)
+    op.drop_index('ix_subtasks_task_id_active', table_name='subtasks')
+    op.drop_index('ix_events_user_start_time_active', table_name='events')
+    op.drop_index('ix_goals_user_deadline_active', table_name='goals')
+    op.drop_index('ix_tasks_user_deadline_active', table_name='tasks')
+    op.drop_index('ix_tasks_user_created_active', table_name='tasks')
+    for table in reversed(ENTITY_TABLES):
+        op.drop_index(f'ix_{table}_user_id_active', table_name=table)
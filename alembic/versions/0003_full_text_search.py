@@ -0,0 +1,67 @@
+"""Full-text search vectors and GIN indexes
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+ACTIVE = sa.text('is_deleted = false')
+
+# Таблица -> поля, из которых строится вектор (первое с весом A, остальные с весом B)
+SEARCHABLE = {
+    'tasks': ['name', 'description'],
+    'subtasks': ['name'],
+    'events': ['name', 'description'],
+    'goals': ['name', 'description'],
+    'ideas': ['name', 'description'],
+    'notes': ['name', 'description'],
+}
+
+
+def search_vector_expression(fields):
+    weights = ['A'] + ['B'] * (len(fields) - 1)
+    return ' || '.join(
+        f"setweight(to_tsvector('russian', coalesce({field}, '')), '{weight}')"
+        for field, weight in zip(fields, weights)
+    )
+
+
+def upgrade():
+    # btree_gin позволяет положить user_id в тот же GIN-индекс, что и вектор
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gin')
+    for table, fields in SEARCHABLE.items():
+        op.add_column(
+            table,
+            sa.Column(
+                'search_vector',
+                postgresql.TSVECTOR(),
+                sa.Computed(search_vector_expression(fields), persisted=True),
+                nullable=True,
+            ),
+        )
+        columns = ['search_vector'] if table == 'subtasks' else ['user_id', 'search_vector']
+        op.create_index(
+            f'ix_{table}_search',
+            table,
+            columns,
+            postgresql_using='gin',
+            postgresql_where=ACTIVE,
+        )
+
+
+def downgrade():
+    for table in reversed(list(SEARCHABLE)):
+        op.drop_index(f'ix_{table}_search', table_name=table)
+        op.drop_column(table, 'search_vector')
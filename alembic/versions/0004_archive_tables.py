@@ -0,0 +1,76 @@
+"""Archive tables for soft-deleted rows
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+ENTITIES = ['tasks', 'subtasks', 'events', 'goals', 'ideas', 'notes', 'tags']
+
+# Таблица связи -> колонки первичного ключа
+ASSOCIATIONS = {
+    'task_event': ['task_id', 'event_id'],
+    'task_goal': ['task_id', 'goal_id'],
+    'task_idea': ['task_id', 'idea_id'],
+    'task_note': ['task_id', 'note_id'],
+    'event_goal': ['event_id', 'goal_id'],
+    'event_idea': ['event_id', 'idea_id'],
+    'event_note': ['event_id', 'note_id'],
+    'goal_idea': ['goal_id', 'idea_id'],
+    'goal_note': ['goal_id', 'note_id'],
+    'idea_note': ['idea_id', 'note_id'],
+    'task_tag': ['task_id', 'tag_id'],
+    'event_tag': ['event_id', 'tag_id'],
+    'goal_tag': ['goal_id', 'tag_id'],
+    'idea_tag': ['idea_id', 'tag_id'],
+    'note_tag': ['note_id', 'tag_id'],
+}
+
+# search_vector из 0003 генерируемый — в архиве он не нужен
+SEARCHABLE = {'tasks', 'subtasks', 'events', 'goals', 'ideas', 'notes'}
+
+
+def create_archive_table(table, primary_key):
+    # LIKE копирует колонки, типы и NOT NULL, но не внешние ключи, уникальность и индексы
+    op.execute(f'CREATE TABLE archive_{table} (LIKE {table} INCLUDING DEFAULTS)')
+    if table in SEARCHABLE:
+        op.drop_column(f'archive_{table}', 'search_vector')
+    op.add_column(
+        f'archive_{table}',
+        sa.Column('archived_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    )
+    op.create_primary_key(f'archive_{table}_pkey', f'archive_{table}', primary_key)
+
+
+def upgrade():
+    for table in ENTITIES:
+        create_archive_table(table, ['id'])
+        op.create_index(
+            f'ix_{table}_deleted_updated',
+            table,
+            ['updated'],
+            postgresql_where=sa.text('is_deleted = true'),
+        )
+    for table, primary_key in ASSOCIATIONS.items():
+        create_archive_table(table, primary_key)
+    op.create_index('ix_archive_subtasks_task_id', 'archive_subtasks', ['task_id'])
+
+
+def downgrade():
+    op.drop_index('ix_archive_subtasks_task_id', table_name='archive_subtasks')
+    for table in reversed(list(ASSOCIATIONS)):
+        op.drop_table(f'archive_{table}')
+    for table in reversed(ENTITIES):
+        op.drop_index(f'ix_{table}_deleted_updated', table_name=table)
+        op.drop_table(f'archive_{table}')
@@ -0,0 +1,178 @@
+"""Per-user summary counters maintained by triggers
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+COUNTERS = [
+    'tasks', 'tasks_new', 'tasks_in_progress', 'tasks_completed',
+    'subtasks', 'subtasks_done', 'events', 'goals', 'ideas', 'notes', 'tags',
+]
+SIMPLE_TABLES = ['events', 'goals', 'ideas', 'notes', 'tags']
+
+# Прибавляет дельты к строке пользователя (создаёт её при первой записи)
+USER_STATS_ADD = f"""
+CREATE FUNCTION user_stats_add(
+    p_user_id integer,
+    {', '.join(f'p_{name} integer DEFAULT 0' for name in COUNTERS)}
+) RETURNS void AS $$
+    INSERT INTO user_stats AS s (user_id, {', '.join(COUNTERS)})
+    VALUES (p_user_id, {', '.join(f'p_{name}' for name in COUNTERS)})
+    ON CONFLICT (user_id) DO UPDATE SET
+        {', '.join(f'{name} = s.{name} + EXCLUDED.{name}' for name in COUNTERS)},
+        updated = now()
+$$ LANGUAGE sql
+"""
+
+# Задача учитывается, пока не удалена; вместе с ней учитываются её неудалённые подзадачи
+USER_STATS_TASKS = """
+CREATE FUNCTION user_stats_tasks() RETURNS trigger AS $$
+DECLARE
+    sub_total integer;
+    sub_done integer;
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.is_deleted = NEW.is_deleted AND OLD.status = NEW.status
+            AND OLD.user_id = NEW.user_id THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') AND NOT OLD.is_deleted THEN
+        SELECT count(*), count(*) FILTER (WHERE is_done) INTO sub_total, sub_done
+        FROM subtasks WHERE task_id = OLD.id AND NOT is_deleted;
+        PERFORM user_stats_add(
+            OLD.user_id,
+            p_tasks => -1,
+            p_tasks_new => -(OLD.status = 'NEW')::integer,
+            p_tasks_in_progress => -(OLD.status = 'IN_PROGRESS')::integer,
+            p_tasks_completed => -(OLD.status = 'COMPLETED')::integer,
+            p_subtasks => -sub_total,
+            p_subtasks_done => -sub_done
+        );
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NOT NEW.is_deleted THEN
+        SELECT count(*), count(*) FILTER (WHERE is_done) INTO sub_total, sub_done
+        FROM subtasks WHERE task_id = NEW.id AND NOT is_deleted;
+        PERFORM user_stats_add(
+            NEW.user_id,
+            p_tasks => 1,
+            p_tasks_new => (NEW.status = 'NEW')::integer,
+            p_tasks_in_progress => (NEW.status = 'IN_PROGRESS')::integer,
+            p_tasks_completed => (NEW.status = 'COMPLETED')::integer,
+            p_subtasks => sub_total,
+            p_subtasks_done => sub_done
+        );
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+# Подзадача учитывается, если не удалена ни она, ни её задача
+USER_STATS_SUBTASKS = """
+CREATE FUNCTION user_stats_subtasks() RETURNS trigger AS $$
+DECLARE
+    owner_id integer;
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.is_deleted = NEW.is_deleted AND OLD.is_done = NEW.is_done
+            AND OLD.task_id = NEW.task_id THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') AND NOT OLD.is_deleted THEN
+        SELECT user_id INTO owner_id FROM tasks WHERE id = OLD.task_id AND NOT is_deleted;
+        IF FOUND THEN
+            PERFORM user_stats_add(owner_id, p_subtasks => -1, p_subtasks_done => -OLD.is_done::integer);
+        END IF;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NOT NEW.is_deleted THEN
+        SELECT user_id INTO owner_id FROM tasks WHERE id = NEW.task_id AND NOT is_deleted;
+        IF FOUND THEN
+            PERFORM user_stats_add(owner_id, p_subtasks => 1, p_subtasks_done => NEW.is_done::integer);
+        END IF;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+# events/goals/ideas/notes/tags: счётчик называется так же, как таблица
+USER_STATS_SIMPLE = """
+CREATE FUNCTION user_stats_simple() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.is_deleted = NEW.is_deleted AND OLD.user_id = NEW.user_id THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') AND NOT OLD.is_deleted THEN
+        EXECUTE format('SELECT user_stats_add($1, p_%s => -1)', TG_TABLE_NAME) USING OLD.user_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NOT NEW.is_deleted THEN
+        EXECUTE format('SELECT user_stats_add($1, p_%s => 1)', TG_TABLE_NAME) USING NEW.user_id;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+BACKFILL = f"""
+INSERT INTO user_stats (user_id, {', '.join(COUNTERS)})
+SELECT
+    u.id,
+    (SELECT count(*) FROM tasks t WHERE t.user_id = u.id AND NOT t.is_deleted),
+    (SELECT count(*) FROM tasks t WHERE t.user_id = u.id AND NOT t.is_deleted AND t.status = 'NEW'),
+    (SELECT count(*) FROM tasks t WHERE t.user_id = u.id AND NOT t.is_deleted AND t.status = 'IN_PROGRESS'),
+    (SELECT count(*) FROM tasks t WHERE t.user_id = u.id AND NOT t.is_deleted AND t.status = 'COMPLETED'),
+    (SELECT count(*) FROM subtasks s JOIN tasks t ON t.id = s.task_id
+     WHERE t.user_id = u.id AND NOT t.is_deleted AND NOT s.is_deleted),
+    (SELECT count(*) FROM subtasks s JOIN tasks t ON t.id = s.task_id
+     WHERE t.user_id = u.id AND NOT t.is_deleted AND NOT s.is_deleted AND s.is_done),
+    {', '.join(f'(SELECT count(*) FROM {table} x WHERE x.user_id = u.id AND NOT x.is_deleted)' for table in SIMPLE_TABLES)}
+FROM users u
+"""
+
+
+def upgrade():
+    op.create_table(
+        'user_stats',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        *(sa.Column(name, sa.Integer(), server_default='0', nullable=False) for name in COUNTERS),
+        sa.Column('updated', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('user_id'),
+    )
+    op.execute(USER_STATS_ADD)
+    op.execute(USER_STATS_TASKS)
+    op.execute(USER_STATS_SUBTASKS)
+    op.execute(USER_STATS_SIMPLE)
+    # Обновления, не меняющие учитываемых колонок, отсекаются в самих функциях
+    op.execute(
+        'CREATE TRIGGER user_stats_tasks AFTER INSERT OR DELETE OR UPDATE OF is_deleted, status, user_id '
+        'ON tasks FOR EACH ROW EXECUTE FUNCTION user_stats_tasks()'
+    )
+    op.execute(
+        'CREATE TRIGGER user_stats_subtasks AFTER INSERT OR DELETE OR UPDATE OF is_deleted, is_done, task_id '
+        'ON subtasks FOR EACH ROW EXECUTE FUNCTION user_stats_subtasks()'
+    )
+    for table in SIMPLE_TABLES:
+        op.execute(
+            f'CREATE TRIGGER user_stats_{table} AFTER INSERT OR DELETE OR UPDATE OF is_deleted, user_id '
+            f'ON {table} FOR EACH ROW EXECUTE FUNCTION user_stats_simple()'
+        )
+    op.execute(BACKFILL)
+
+
+def downgrade():
+    for table in ['tasks', 'subtasks', *SIMPLE_TABLES]:
+        op.execute(f'DROP TRIGGER user_stats_{table} ON {table}')
+    for function in ['user_stats_simple', 'user_stats_subtasks', 'user_stats_tasks', 'user_stats_add']:
+        op.execute(f'DROP FUNCTION {function}')
+    op.drop_table('user_stats')
@@ -0,0 +1,116 @@
+"""Unified typed links table mirrored from the association tables
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+ENTITY_TABLES = {'task': 'tasks', 'event': 'events', 'goal': 'goals', 'idea': 'ideas', 'note': 'notes', 'tag': 'tags'}
+
+# Таблица связи -> (src_type, dst_type); направление как в имени таблицы
+ASSOCIATIONS = {
+    name: tuple(name.split('_'))
+    for name in [
+        'task_event', 'task_goal', 'task_idea', 'task_note',
+        'event_goal', 'event_idea', 'event_note', 'goal_idea', 'goal_note', 'idea_note',
+        'task_tag', 'event_tag', 'goal_tag', 'idea_tag', 'note_tag',
+    ]
+}
+
+# Пока основной слой — парные таблицы, их вставки и удаления повторяются в links.
+# Аргументы: src_type, dst_type, таблица src (из неё берётся user_id)
+LINKS_MIRROR = """
+CREATE FUNCTION links_mirror() RETURNS trigger AS $$
+DECLARE
+    v_src_id integer;
+    v_dst_id integer;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        v_src_id := (to_jsonb(NEW) ->> (TG_ARGV[0] || '_id'))::integer;
+        v_dst_id := (to_jsonb(NEW) ->> (TG_ARGV[1] || '_id'))::integer;
+        EXECUTE format(
+            'INSERT INTO links (user_id, src_type, src_id, dst_type, dst_id) '
+            'SELECT user_id, $1, $2, $3, $4 FROM %I WHERE id = $2 ON CONFLICT DO NOTHING',
+            TG_ARGV[2]
+        ) USING TG_ARGV[0], v_src_id, TG_ARGV[1], v_dst_id;
+    ELSE
+        v_src_id := (to_jsonb(OLD) ->> (TG_ARGV[0] || '_id'))::integer;
+        v_dst_id := (to_jsonb(OLD) ->> (TG_ARGV[1] || '_id'))::integer;
+        DELETE FROM links
+        WHERE src_type = TG_ARGV[0] AND src_id = v_src_id AND dst_type = TG_ARGV[1] AND dst_id = v_dst_id;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+
+def _links_columns():
+    return [
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('src_type', sa.String(length=16), nullable=False),
+        sa.Column('src_id', sa.Integer(), nullable=False),
+        sa.Column('dst_type', sa.String(length=16), nullable=False),
+        sa.Column('dst_id', sa.Integer(), nullable=False),
+    ]
+
+
+def upgrade():
+    op.create_table(
+        'links',
+        *_links_columns(),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('src_type', 'src_id', 'dst_type', 'dst_id'),
+    )
+    op.create_index('ix_links_dst', 'links', ['dst_type', 'dst_id', 'src_type', 'src_id'])
+    op.create_index('ix_links_user', 'links', ['user_id', 'src_type', 'dst_type', 'src_id', 'dst_id'])
+    op.create_table(
+        'archive_links',
+        *_links_columns(),
+        sa.Column('archived_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('src_type', 'src_id', 'dst_type', 'dst_id'),
+    )
+
+    for name, (src_type, dst_type) in ASSOCIATIONS.items():
+        src_table = ENTITY_TABLES[src_type]
+        op.execute(f"""
+            INSERT INTO links (user_id, src_type, src_id, dst_type, dst_id)
+            SELECT s.user_id, '{src_type}', a.{src_type}_id, '{dst_type}', a.{dst_type}_id
+            FROM {name} a JOIN {src_table} s ON s.id = a.{src_type}_id
+        """)
+        # Архивные связи тоже переносим, чтобы restore работал с любым слоем
+        op.execute(f"""
+            INSERT INTO archive_links (user_id, src_type, src_id, dst_type, dst_id, archived_at)
+            SELECT s.user_id, '{src_type}', a.{src_type}_id, '{dst_type}', a.{dst_type}_id, a.archived_at
+            FROM archive_{name} a
+            JOIN (SELECT id, user_id FROM {src_table} UNION ALL SELECT id, user_id FROM archive_{src_table}) s
+                ON s.id = a.{src_type}_id
+        """)
+
+    op.execute(LINKS_MIRROR)
+    for name, (src_type, dst_type) in ASSOCIATIONS.items():
+        op.execute(
+            f'CREATE TRIGGER links_mirror_{name} AFTER INSERT OR DELETE ON {name} FOR EACH ROW '
+            f"EXECUTE FUNCTION links_mirror('{src_type}', '{dst_type}', '{ENTITY_TABLES[src_type]}')"
+        )
+
+
+def downgrade():
+    for name in reversed(list(ASSOCIATIONS)):
+        op.execute(f'DROP TRIGGER links_mirror_{name} ON {name}')
+    op.execute('DROP FUNCTION links_mirror')
+    op.drop_table('archive_links')
+    op.drop_index('ix_links_user', table_name='links')
+    op.drop_index('ix_links_dst', table_name='links')
+    op.drop_table('links')
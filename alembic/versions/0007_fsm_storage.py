@@ -0,0 +1,34 @@
+"""FSM and dialog state storage
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'fsm_storage',
+        sa.Column('key', sa.String(length=255), nullable=False),
+        sa.Column('state', sa.String(length=255), nullable=True),
+        sa.Column('data', postgresql.JSONB(), server_default='{}', nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('key'),
+    )
+    op.create_index('ix_fsm_storage_expires_at', 'fsm_storage', ['expires_at'])
+
+
+def downgrade():
+    op.drop_index('ix_fsm_storage_expires_at', table_name='fsm_storage')
+    op.drop_table('fsm_storage')
@@ -0,0 +1,34 @@
+"""Subtask deadlines for period digests
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-20 01:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('subtasks', sa.Column('deadline', sa.DateTime(), nullable=True))
+    # Архив переносит строки по списку колонок горячей таблицы
+    op.add_column('archive_subtasks', sa.Column('deadline', sa.DateTime(), nullable=True))
+    op.create_index(
+        'ix_subtasks_deadline_active',
+        'subtasks',
+        ['deadline'],
+        postgresql_where=sa.text('is_deleted = false AND deadline IS NOT NULL'),
+    )
+
+
+def downgrade():
+    op.drop_index('ix_subtasks_deadline_active', table_name='subtasks')
+    op.drop_column('archive_subtasks', 'deadline')
+    op.drop_column('subtasks', 'deadline')
@@ -0,0 +1,119 @@
+"""
+Бенчмарк сводок /today, /week, /month, /year (services/digest.py) для пользователей с большой историей.
+
+Заполняет базу так же, как link_layouts.py, раскидывает сроки задач, подзадач (--subtasks-per-task
+на задачу) и начала событий на --years лет назад и вперёд и меряет медиану и p95 одного запроса
+сводки для каждого периода и слоя связей, а также ответ из кэша. Всё в одной транзакции,
+которая откатывается:
+
+    python benchmarks/digest_periods.py --users 10 --per-type 5000 --links-per-item 4 --years 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+from environs import Env
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'bot')))
+from database.links import LINK_STORES
+from services.digest import PERIODS, fetch_digest, get_digest, period_bounds
+from link_layouts import seed
+
+
+def percentiles(timings: list) -> tuple:
+    timings = sorted(timings)
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+async def spread_dates(conn, user_ids: list, subtasks_per_task: int, years: int) -> None:
+    days = years * 365
+    params = {"ids": user_ids, "days": days, "per_task": subtasks_per_task}
+    await conn.execute(text("""
+        UPDATE tasks SET deadline = now() + make_interval(days => (random() * 2 * :days)::int - :days)
+        WHERE user_id = ANY(:ids)
+    """), params)
+    await conn.execute(text("""
+        UPDATE events SET start_time = now() + make_interval(hours => ((random() * 2 * :days - :days) * 24)::int)
+        WHERE user_id = ANY(:ids)
+    """), params)
+    await conn.execute(text("""
+        UPDATE goals SET deadline = now() + make_interval(days => (random() * :days)::int)
+        WHERE user_id = ANY(:ids) AND random() < 0.5
+    """), params)
+    await conn.execute(text("""
+        INSERT INTO subtasks (name, is_done, is_deleted, task_id, deadline)
+        SELECT 'bench subtask ' || g, random() < 0.5, false, t.id,
+               t.deadline - make_interval(days => (random() * 14)::int)
+        FROM tasks t CROSS JOIN generate_series(1, :per_task) g
+        WHERE t.user_id = ANY(:ids)
+    """), params)
+    for table in ("tasks", "subtasks", "events", "goals"):
+        await conn.execute(text(f"ANALYZE {table}"))
+
+
+async def main(users: int, per_type: int, links_per_item: int, subtasks_per_task: int, years: int, samples: int) -> None:
+    env = Env()
+    env.read_env()
+    engine = create_async_engine(env("DATABASE_URL"))
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        try:
+            print(f"Seeding {users} users x {per_type} objects per type, {subtasks_per_task} subtasks per task...")
+            await seed(conn, users, per_type, links_per_item)
+            user_ids = (await conn.execute(text(
+                "SELECT id FROM users WHERE username LIKE 'bench_links_%' ORDER BY id"
+            ))).scalars().all()
+            await spread_dates(conn, user_ids, subtasks_per_task, years)
+            session = AsyncSession(bind=conn, autoflush=False)
+            now = datetime.now()
+
+            print(f"{'period':>8}{'backend':>10}{'median':>12}{'p95':>12}{'tasks':>8}{'events':>8}")
+            for period in PERIODS:
+                start, end = period_bounds(period, now)
+                for backend, store_class in LINK_STORES.items():
+                    store = store_class()
+                    timings, tasks, events = [], [], []
+                    for index in range(samples):
+                        user_id = user_ids[index % len(user_ids)]
+                        started = time.perf_counter()
+                        digest = await fetch_digest(session, user_id, start, end, store=store)
+                        timings.append((time.perf_counter() - started) * 1000)
+                        tasks.append(digest["tasks_total"])
+                        events.append(digest["events_total"])
+                    median, p95 = percentiles(timings)
+                    print(f"{period:>8}{backend:>10}{median:>10.2f}ms{p95:>10.2f}ms"
+                          f"{statistics.mean(tasks):>8.0f}{statistics.mean(events):>8.0f}")
+
+            # Повторные сводки без записей между ними обслуживаются кэшем
+            for user_id in user_ids:
+                await get_digest(session, -user_id, user_id, "month")
+            timings = []
+            for index in range(samples):
+                user_id = user_ids[index % len(user_ids)]
+                started = time.perf_counter()
+                await get_digest(session, -user_id, user_id, "month")
+                timings.append((time.perf_counter() - started) * 1000)
+            median, p95 = percentiles(timings)
+            print(f"{'cached':>8}{'':>10}{median:>10.3f}ms{p95:>10.3f}ms")
+            await session.close()
+        finally:
+            await transaction.rollback()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--per-type", type=int, default=5000)
+    parser.add_argument("--links-per-item", type=int, default=4)
+    parser.add_argument("--subtasks-per-task", type=int, default=3)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--samples", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.per_type, args.links_per_item, args.subtasks_per_task, args.years, args.samples))
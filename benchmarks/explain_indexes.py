@@ -0,0 +1,140 @@
+"""
+EXPLAIN-бенчмарк индексов для запросов вида user_id = ? AND is_deleted = false.
+
+Заполняет базу синтетическими данными (по умолчанию 1M задач), снимает планы горячих
+запросов с индексами из миграций 0002/0003 и без них. Всё выполняется в одной транзакции,
+которая откатывается в конце, поэтому запускать можно на dev-базе после `alembic upgrade head`:
+
+    python benchmarks/explain_indexes.py --rows 1000000 --users 1000
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+from environs import Env
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from bot.database.models import Base
+
+QUERIES = {
+    "tasks list (user_id, id DESC)": """
+        SELECT id, name, status FROM tasks
+        WHERE user_id = :user_id AND is_deleted = false
+        ORDER BY id DESC LIMIT 8
+    """,
+    "tasks by created": """
+        SELECT id, name FROM tasks
+        WHERE user_id = :user_id AND is_deleted = false
+        ORDER BY created DESC
+    """,
+    "tasks by deadline range": """
+        SELECT id, name FROM tasks
+        WHERE user_id = :user_id AND is_deleted = false
+          AND deadline >= now() AND deadline < now() + interval '7 days'
+    """,
+    "events by start_time range": """
+        SELECT id, name FROM events
+        WHERE user_id = :user_id AND is_deleted = false
+          AND start_time >= now() AND start_time < now() + interval '7 days'
+    """,
+    "reverse link lookup (event -> tasks)": """
+        SELECT task_id FROM task_event WHERE event_id = :event_id
+    """,
+    "full-text search (tasks)": """
+        SELECT id, name, ts_rank_cd(search_vector, websearch_to_tsquery('russian', 'task 42')) AS rank
+        FROM tasks
+        WHERE user_id = :user_id AND is_deleted = false
+          AND search_vector @@ websearch_to_tsquery('russian', 'task 42')
+        ORDER BY rank DESC LIMIT 9
+    """,
+    "subtasks of task": """
+        SELECT id, name, is_done FROM subtasks
+        WHERE task_id = :task_id AND is_deleted = false ORDER BY id
+    """,
+}
+
+
+async def seed(conn, rows: int, users: int) -> dict:
+    first_user = (await conn.execute(text("""
+        INSERT INTO users (tg_id, username)
+        SELECT -g, 'bench_' || g FROM generate_series(1, :users) g
+        RETURNING id
+    """), {"users": users})).scalars().all()[0]
+    await conn.execute(text("""
+        INSERT INTO tasks (name, status, deadline, is_deleted, user_id)
+        SELECT 'task ' || g, 'NEW', now() + (g % 365) * interval '1 day', g % 10 = 0,
+               :first_user + g % :users
+        FROM generate_series(1, :rows) g
+    """), {"rows": rows, "users": users, "first_user": first_user})
+    await conn.execute(text("""
+        INSERT INTO events (name, start_time, is_confirmed, is_deleted, user_id)
+        SELECT 'event ' || g, now() + (g % 365) * interval '1 day', false, g % 10 = 0,
+               :first_user + g % :users
+        FROM generate_series(1, :rows / 4) g
+    """), {"rows": rows, "users": users, "first_user": first_user})
+    await conn.execute(text("""
+        INSERT INTO subtasks (name, is_done, is_deleted, task_id)
+        SELECT 'subtask', false, false, t.id FROM tasks t, generate_series(1, 2)
+        WHERE t.user_id BETWEEN :first_user AND :first_user + :users AND t.id % 10 = 1
+    """), {"users": users, "first_user": first_user})
+    await conn.execute(text("""
+        INSERT INTO task_event (task_id, event_id)
+        SELECT t.id, e.id FROM tasks t
+        JOIN events e ON e.user_id = t.user_id AND e.id % 97 = t.id % 97
+        WHERE t.user_id BETWEEN :first_user AND :first_user + :users AND t.id % 4 = 0
+        ON CONFLICT DO NOTHING
+    """), {"users": users, "first_user": first_user})
+    for table in ["users", "tasks", "events", "subtasks", "task_event"]:
+        await conn.execute(text(f"ANALYZE {table}"))
+    return {
+        "user_id": first_user,
+        "event_id": (await conn.execute(text("SELECT max(event_id) FROM task_event"))).scalar(),
+        "task_id": (await conn.execute(text(
+            "SELECT max(id) FROM tasks WHERE user_id = :u"), {"u": first_user})).scalar(),
+    }
+
+
+async def explain_all(conn, params: dict) -> dict:
+    plans = {}
+    for title, sql in QUERIES.items():
+        rows = (await conn.execute(text("EXPLAIN (ANALYZE, BUFFERS, COSTS OFF) " + sql), params)).scalars().all()
+        plans[title] = rows
+    return plans
+
+
+async def main(rows: int, users: int) -> None:
+    env = Env()
+    env.read_env()
+    engine = create_async_engine(env("DATABASE_URL"))
+    index_names = sorted(
+        index.name for table in Base.metadata.tables.values() for index in table.indexes
+    )
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        try:
+            print(f"Seeding {rows} tasks for {users} users...")
+            params = await seed(conn, rows, users)
+            after = await explain_all(conn, params)
+            for name in index_names:
+                await conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+            before = await explain_all(conn, params)
+            for title in QUERIES:
+                print(f"\n=== {title} ===")
+                print("--- before (no indexes) ---")
+                print("\n".join(before[title]))
+                print("--- after (migrations 0002/0003) ---")
+                print("\n".join(after[title]))
+        finally:
+            await transaction.rollback()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1_000)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.users))
@@ -0,0 +1,149 @@
+"""
+Нагрузочный тест вебхук-режима без Telegram: фейковый Bot API и отправитель апдейтов.
+
+Фейковый Bot API отвечает на любые методы (sendMessage и правки — правдоподобным Message,
+остальные — true) и запоминает, когда какому чату ушёл ответ. Отправитель шлёт каждому из
+--users пользователей --per-user апдейтов-команд подряд (следующий — после 200 на предыдущий),
+все пользователи параллельно. Бот нужно запустить на тестовой базе с тем же WEBHOOK_SECRET:
+
+    TELEGRAM_API_URL=http://127.0.0.1:8081 python bot/webhook.py --workers 4
+    python benchmarks/fake_telegram.py --users 200 --per-user 20 --commands /start,/stats
+
+Печатает время подтверждения вебхука (ack) и время до ответа бота: k-й ответ чату
+сопоставляется с k-м апдейтом пользователя, поэтому нарушение порядка видно как пропуски.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from collections import defaultdict
+
+from aiohttp import ClientSession, web
+from environs import Env
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+FIRST_USER_ID = 9_000_000_000
+
+
+def percentiles(timings: list) -> tuple:
+    timings = sorted(timings)
+    return statistics.median(timings), timings[max(int(len(timings) * 0.95) - 1, 0)], timings[-1]
+
+
+class FakeBotApi:
+    """Bot API, который всем отвечает успехом и записывает время ответов по чатам."""
+    MESSAGE_METHODS = {"sendmessage", "editmessagetext", "editmessagereplymarkup"}
+
+    def __init__(self):
+        self.replies = defaultdict(list)
+        self.calls = defaultdict(int)
+        self.message_id = 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        self.calls[method] += 1
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        if method not in self.MESSAGE_METHODS:
+            return web.json_response({"ok": True, "result": True})
+        chat_id = int(params.get("chat_id") or 0)
+        if method == "sendmessage":
+            self.replies[chat_id].append(time.perf_counter())
+        self.message_id += 1
+        return web.json_response({"ok": True, "result": {
+            "message_id": int(params.get("message_id") or self.message_id),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": str(params.get("text", "")),
+        }})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+
+def make_update(update_id: int, user_id: int, message_id: int, text: str) -> dict:
+    command = text.split()[0]
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Load", "username": f"load{user_id}"},
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(command)}] if command.startswith("/") else [],
+        },
+    }
+
+
+async def send_user(session: ClientSession, url: str, secret: str, user_id: int, commands: list, per_user: int,
+                    first_update_id: int, acks: list, sent: dict) -> None:
+    for index in range(per_user):
+        update = make_update(first_update_id + index, user_id, index + 1, commands[index % len(commands)])
+        started = time.perf_counter()
+        sent[user_id].append(started)
+        async with session.post(url, data=json.dumps(update), headers={
+            SECRET_HEADER: secret, "Content-Type": "application/json",
+        }) as response:
+            if response.status != 200:
+                print(f"user {user_id}: update {index} answered {response.status}")
+        acks.append((time.perf_counter() - started) * 1000)
+
+
+async def main(url: str, api_port: int, users: int, per_user: int, commands: list, settle: float) -> None:
+    env = Env()
+    env.read_env()
+    api = FakeBotApi()
+    runner = web.AppRunner(api.app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", api_port).start()
+
+    acks, sent = [], defaultdict(list)
+    started = time.perf_counter()
+    async with ClientSession() as session:
+        await asyncio.gather(*(
+            send_user(session, url, env("WEBHOOK_SECRET", ""), FIRST_USER_ID + i, commands, per_user,
+                      i * per_user + 1, acks, sent)
+            for i in range(users)
+        ))
+    sent_in = time.perf_counter() - started
+
+    # Ждём, пока бот доотвечает: ответов больше не прибавляется settle секунд
+    total = -1
+    while total != sum(len(replies) for replies in api.replies.values()):
+        total = sum(len(replies) for replies in api.replies.values())
+        await asyncio.sleep(settle)
+    await runner.cleanup()
+
+    latencies, missing = [], 0
+    for user_id, times in sent.items():
+        replies = api.replies.get(user_id, [])
+        missing += max(len(times) - len(replies), 0)
+        latencies.extend((reply - send) * 1000 for send, reply in zip(times, replies))
+
+    updates = users * per_user
+    print(f"{updates} updates from {users} users sent in {sent_in:.2f}s ({updates / sent_in:.0f}/s)")
+    print(f"{'':>10}{'median':>12}{'p95':>12}{'max':>12}")
+    for name, timings in (("ack", acks), ("reply", latencies)):
+        if timings:
+            median, p95, top = percentiles(timings)
+            print(f"{name:>10}{median:>10.2f}ms{p95:>10.2f}ms{top:>10.2f}ms")
+    print(f"replies: {total}, missing: {missing}; Bot API calls: {dict(api.calls)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=f"http://127.0.0.1:{os.environ.get('WEBHOOK_PORT', 8080)}/webhook")
+    parser.add_argument("--api-port", type=int, default=8081)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--per-user", type=int, default=10)
+    parser.add_argument("--commands", default="/start,/stats")
+    parser.add_argument("--settle", type=float, default=2.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.api_port, args.users, args.per_user, args.commands.split(","), args.settle))
@@ -0,0 +1,118 @@
+"""
+Бенчмарк раскладок связей: 15 парных таблиц (LINK_BACKEND=tables) против единой таблицы links.
+
+Заполняет базу синтетическими пользователями, объектами и связями (в парные таблицы — триггеры
+миграции 0006 зеркалируют их в links) и сравнивает на одних и тех же данных:
+  - всё, что связано с задачей (get_all_linked_ids);
+  - обратный поиск: задачи с тегом (get_linked_ids tag -> task);
+  - выгрузку всех связей пользователя для system-промпта (fetch_catalog).
+Всё выполняется в одной транзакции, которая откатывается в конце:
+
+    python benchmarks/link_layouts.py --users 50 --per-type 200 --links-per-item 4
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+from environs import Env
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'bot')))
+from database.links import LINK_PAIRS, LINK_STORES
+from database.models import LINK_ENTITY_TABLES
+
+
+async def seed(conn, users: int, per_type: int, links_per_item: int) -> dict:
+    user_ids = (await conn.execute(text("""
+        INSERT INTO users (tg_id, username)
+        SELECT -g, 'bench_links_' || g FROM generate_series(1, :users) g
+        RETURNING id
+    """), {"users": users})).scalars().all()
+    first_user, last_user = min(user_ids), max(user_ids)
+    params = {"first_user": first_user, "users": users, "rows": users * per_type}
+    extra = {
+        "tasks": ("status", "'NEW'"),
+        "events": ("is_confirmed", "false"),
+        "goals": ("is_confirmed", "false"),
+        "ideas": ("is_confirmed", "false"),
+    }
+    for link_type, table in LINK_ENTITY_TABLES.items():
+        column, value = extra.get(table, (None, None))
+        await conn.execute(text(f"""
+            INSERT INTO {table} (name, is_deleted, user_id{', ' + column if column else ''})
+            SELECT 'bench {link_type} ' || g, false, :first_user + g % :users{', ' + value if column else ''}
+            FROM generate_series(1, :rows) g
+        """), params)
+    modulo = max(per_type // links_per_item, 1)
+    for (src_type, dst_type), (table, src_col, dst_col) in LINK_PAIRS.items():
+        await conn.execute(text(f"""
+            INSERT INTO {table.name} ({src_col.name}, {dst_col.name})
+            SELECT s.id, d.id
+            FROM {LINK_ENTITY_TABLES[src_type]} s
+            JOIN {LINK_ENTITY_TABLES[dst_type]} d ON d.user_id = s.user_id AND (s.id * 7 + d.id) % :modulo = 0
+            WHERE s.user_id BETWEEN :first_user AND :last_user
+        """), {"modulo": modulo, "first_user": first_user, "last_user": last_user})
+    for table in [*LINK_ENTITY_TABLES.values(), *(table.name for table, _, _ in LINK_PAIRS.values()), "links"]:
+        await conn.execute(text(f"ANALYZE {table}"))
+    samples = {}
+    for table in ("tasks", "tags"):
+        samples[table] = (await conn.execute(text(
+            f"SELECT id FROM {table} WHERE user_id BETWEEN :first_user AND :last_user ORDER BY random() LIMIT 200"
+        ), {"first_user": first_user, "last_user": last_user})).scalars().all()
+    return {
+        "users": user_ids[:20],
+        **samples,
+        "links": (await conn.execute(text("SELECT count(*) FROM links"))).scalar(),
+    }
+
+
+async def timed(call, items) -> float:
+    """Медиана времени одного вызова, мс."""
+    timings = []
+    for item in items:
+        started = time.perf_counter()
+        await call(item)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+async def main(users: int, per_type: int, links_per_item: int) -> None:
+    env = Env()
+    env.read_env()
+    engine = create_async_engine(env("DATABASE_URL"))
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        try:
+            print(f"Seeding {users} users x {per_type} objects per type...")
+            data = await seed(conn, users, per_type, links_per_item)
+            print(f"{data['links']} links in total\n")
+            session = AsyncSession(bind=conn, autoflush=False)
+            print(f"{'':>28}{'tables':>12}{'links':>12}")
+            results = {}
+            for backend, store_class in LINK_STORES.items():
+                store = store_class()
+                results[backend] = [
+                    await timed(lambda task_id: store.get_all_linked_ids(session, "task", task_id), data["tasks"]),
+                    await timed(lambda tag_id: store.get_linked_ids(session, "tag", tag_id, "task"), data["tags"]),
+                    await timed(lambda user_id: store.fetch_catalog(session, user_id), data["users"]),
+                ]
+            titles = ["everything linked to a task", "tasks with a tag", "user link catalog"]
+            for index, title in enumerate(titles):
+                print(f"{title:>28}{results['tables'][index]:>10.2f}ms{results['links'][index]:>10.2f}ms")
+            await session.close()
+        finally:
+            await transaction.rollback()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--per-type", type=int, default=200)
+    parser.add_argument("--links-per-item", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.per_type, args.links_per_item))
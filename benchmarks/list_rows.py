@@ -0,0 +1,103 @@
+"""
+Бенчмарк загрузки списков для окон связей: ORM-сущности против строк с проекцией колонок.
+
+Заполняет базу синтетическими данными (по умолчанию 10k событий/заметок/целей/идей/тегов
+на пользователя) и сравнивает время и пиковую память (tracemalloc) загрузки через
+`select(Model)` и через `fetch_active_rows` (только id, name). Всё выполняется в одной
+транзакции, которая откатывается в конце:
+
+    python benchmarks/list_rows.py --rows 10000 --repeat 20
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+from environs import Env
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'bot')))
+from database.models import DbEvent, DbGoal, DbIdea, DbNote, DbTag
+from database.queries import fetch_active_rows
+
+SEED = {
+    "events": "INSERT INTO events (name, start_time, is_confirmed, is_deleted, user_id) "
+              "SELECT 'event ' || g, now(), false, false, :user_id FROM generate_series(1, :rows) g",
+    "notes": "INSERT INTO notes (name, is_deleted, user_id) "
+             "SELECT 'note ' || g, false, :user_id FROM generate_series(1, :rows) g",
+    "goals": "INSERT INTO goals (name, is_confirmed, is_deleted, user_id) "
+             "SELECT 'goal ' || g, false, false, :user_id FROM generate_series(1, :rows) g",
+    "ideas": "INSERT INTO ideas (name, is_confirmed, is_deleted, user_id) "
+             "SELECT 'idea ' || g, false, false, :user_id FROM generate_series(1, :rows) g",
+    "tags": "INSERT INTO tags (name, is_deleted, user_id) "
+            "SELECT 'bench tag ' || g, false, :user_id FROM generate_series(1, :rows) g",
+}
+MODELS = (DbEvent, DbNote, DbGoal, DbIdea, DbTag)
+
+
+async def load_orm(session: AsyncSession, user_id: int) -> int:
+    total = 0
+    for model in MODELS:
+        items = (await session.scalars(
+            select(model).where(model.user_id == user_id, model.is_deleted == False).order_by(model.id)
+        )).all()
+        total += len(items)
+    return total
+
+
+async def load_rows(session: AsyncSession, user_id: int) -> int:
+    total = 0
+    for model in MODELS:
+        total += len(await fetch_active_rows(session, model, user_id))
+    return total
+
+
+async def measure(session: AsyncSession, loader, user_id: int, repeat: int) -> tuple:
+    timings = []
+    for _ in range(repeat):
+        # ORM-сущности иначе остались бы в identity map и следующий прогон их бы переиспользовал
+        session.expunge_all()
+        started = time.perf_counter()
+        count = await loader(session, user_id)
+        timings.append((time.perf_counter() - started) * 1000)
+    session.expunge_all()
+    tracemalloc.start()
+    await loader(session, user_id)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    timings.sort()
+    return count, timings[len(timings) // 2], peak / 1024 / 1024
+
+
+async def main(rows: int, repeat: int) -> None:
+    env = Env()
+    env.read_env()
+    engine = create_async_engine(env("DATABASE_URL"))
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        try:
+            user_id = (await conn.execute(text(
+                "INSERT INTO users (tg_id, username) VALUES (-1, 'bench_rows') RETURNING id"
+            ))).scalar()
+            print(f"Seeding {rows} rows per table for user {user_id}...")
+            for sql in SEED.values():
+                await conn.execute(text(sql), {"rows": rows, "user_id": user_id})
+            session = AsyncSession(bind=conn, autoflush=False)
+            for title, loader in (("ORM entities", load_orm), ("projected rows", load_rows)):
+                count, median_ms, peak_mb = await measure(session, loader, user_id, repeat)
+                print(f"{title:>15}: {count} objects, median {median_ms:.1f} ms, peak {peak_mb:.1f} MiB")
+            await session.close()
+        finally:
+            await transaction.rollback()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.repeat))
@@ -0,0 +1,114 @@
+"""
+Бенчмарк планировщика исходящих запросов (utils/rate_limiter.py) без Telegram и без базы.
+
+Фейковый Bot API отвечает через --latency мс и применяет флуд-контроль как Telegram: бакеты
+на чат (1 сообщение в секунду, пачка до 3) и на бота (30 в секунду); сверх них — 429 с retry_after.
+Каждый из --users пользователей одновременно отправляет голосовое (два ответа подряд) и
+делает --clicks кликов в диалоге с интервалом --click-interval мс (каждый клик — правка одного
+и того же сообщения). Сравнивается прямая отправка и отправка через OutboundScheduler:
+
+    python benchmarks/outbound_limits.py --users 100 --clicks 10 --click-interval 150
+"""
+import argparse
+import asyncio
+import math
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import EditMessageText, SendMessage
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'bot')))
+from utils.metrics import metrics
+from utils.rate_limiter import OutboundScheduler, TokenBucket
+
+FIRST_USER_ID = 9_000_000_000
+
+
+def percentiles(timings: list) -> tuple:
+    timings = sorted(timings)
+    return statistics.median(timings), timings[max(int(len(timings) * 0.95) - 1, 0)], timings[-1]
+
+
+class FloodControlledApi:
+    """make_request, который отвечает с задержкой и отклоняет запросы сверх лимитов Telegram."""
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.global_bucket = TokenBucket(30, 30)
+        self.chats = {}
+        self.calls = Counter()
+
+    async def __call__(self, bot, method):
+        await asyncio.sleep(self.latency)
+        bucket = self.chats.setdefault(method.chat_id, TokenBucket(1, 3))
+        wait = max(bucket.reserve(), self.global_bucket.reserve())
+        if wait > 0:
+            # Отклонённый запрос токенов не тратит
+            bucket.tokens += 1
+            self.global_bucket.tokens += 1
+            self.calls["429"] += 1
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=math.ceil(wait))
+        self.calls[method.__api_method__] += 1
+        return True
+
+
+async def user_session(send, user_id: int, clicks: int, click_interval: float, latencies: list, errors: Counter) -> None:
+    async def call(method) -> None:
+        started = time.perf_counter()
+        try:
+            await send(method)
+        except TelegramRetryAfter:
+            errors["failed"] += 1
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    async def clicking() -> None:
+        pending = []
+        for click in range(clicks):
+            pending.append(asyncio.create_task(call(EditMessageText(chat_id=user_id, message_id=1, text=f"page {click}"))))
+            await asyncio.sleep(click_interval)
+        await asyncio.gather(*pending)
+
+    await asyncio.gather(
+        call(SendMessage(chat_id=user_id, text="🎤 Распознанный текст")),
+        call(SendMessage(chat_id=user_id, text="✅ Задача создана")),
+        clicking(),
+    )
+
+
+async def run(name: str, send, api: FloodControlledApi, users: int, clicks: int, click_interval: float) -> None:
+    latencies, errors = [], Counter()
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        user_session(send, FIRST_USER_ID + i, clicks, click_interval, latencies, errors) for i in range(users)
+    ))
+    elapsed = time.perf_counter() - started
+    median, p95, top = percentiles(latencies)
+    print(f"{name:>10}{elapsed:>9.2f}s{median:>10.1f}ms{p95:>10.1f}ms{top:>10.1f}ms"
+          f"{sum(api.calls.values()) - api.calls['429']:>8}{api.calls['429']:>7}{errors['failed']:>8}")
+
+
+async def main(users: int, clicks: int, click_interval: float, latency: float) -> None:
+    print(f"{'':>10}{'total':>10}{'median':>12}{'p95':>12}{'max':>12}{'sent':>8}{'429':>7}{'failed':>8}")
+    api = FloodControlledApi(latency)
+    await run("direct", lambda method: api(None, method), api, users, clicks, click_interval)
+
+    api = FloodControlledApi(latency)
+    scheduler = OutboundScheduler(global_rate=30, chat_rate=1, chat_burst=3, group_rate=20 / 60, retry_limit=3)
+    await run("scheduled", lambda method: scheduler(api, None, method), api, users, clicks, click_interval)
+    histograms = metrics.snapshot()["histograms"]
+    delay = histograms.get("telegram.queue_delay_ms", {"avg": 0.0, "max": 0.0})
+    print(f"coalesced edits: {metrics.counters['telegram.coalesced']}, "
+          f"queue delay avg {delay['avg']:.1f}ms, max {delay['max']:.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--clicks", type=int, default=10)
+    parser.add_argument("--click-interval", type=float, default=150, help="ms")
+    parser.add_argument("--latency", type=float, default=30, help="ms")
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.clicks, args.click_interval / 1000, args.latency / 1000))
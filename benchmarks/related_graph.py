@@ -0,0 +1,84 @@
+"""
+Бенчмарк обхода графа связей (services/related.py) на плотных синтетических графах.
+
+Заполняет базу так же, как link_layouts.py (объекты и связи в парных таблицах, зеркало в links),
+и для случайных целей меряет медиану и p95 обхода на глубину 1..RELATED_MAX_DEPTH для обоих
+слоёв связей, а также ответ из кэша. Всё выполняется в одной транзакции, которая откатывается:
+
+    python benchmarks/related_graph.py --users 20 --per-type 300 --links-per-item 12 --fanout 10
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+from environs import Env
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'bot')))
+from database.links import LINK_STORES
+from services.related import RELATED_MAX_DEPTH, fetch_related, get_related
+from link_layouts import seed
+
+
+def percentiles(timings: list) -> tuple:
+    timings = sorted(timings)
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+async def main(users: int, per_type: int, links_per_item: int, fanout: int, samples: int) -> None:
+    env = Env()
+    env.read_env()
+    engine = create_async_engine(env("DATABASE_URL"))
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        try:
+            print(f"Seeding {users} users x {per_type} objects per type, ~{links_per_item} links per pair...")
+            data = await seed(conn, users, per_type, links_per_item)
+            goals = (await conn.execute(text(
+                "SELECT user_id, id FROM goals WHERE name LIKE 'bench goal %' ORDER BY random() LIMIT :limit"
+            ), {"limit": samples})).all()
+            print(f"{data['links']} links in total, fan-out limit {fanout}\n")
+            session = AsyncSession(bind=conn, autoflush=False)
+
+            print(f"{'depth':>6}{'backend':>10}{'median':>12}{'p95':>12}{'items':>10}")
+            for depth in range(1, RELATED_MAX_DEPTH + 1):
+                for backend, store_class in LINK_STORES.items():
+                    store = store_class()
+                    timings, found = [], []
+                    for user_id, goal_id in goals:
+                        started = time.perf_counter()
+                        related = await fetch_related(session, user_id, [("goal", goal_id)], depth, fanout, store=store)
+                        timings.append((time.perf_counter() - started) * 1000)
+                        found.append(len(related[("goal", goal_id)]))
+                    median, p95 = percentiles(timings)
+                    print(f"{depth:>6}{backend:>10}{median:>10.2f}ms{p95:>10.2f}ms{statistics.mean(found):>10.1f}")
+
+            # Повторный запрос тех же целей обслуживается кэшем
+            for user_id, goal_id in goals:
+                await get_related(session, user_id, "goal", goal_id, RELATED_MAX_DEPTH, fanout)
+            timings = []
+            for user_id, goal_id in goals:
+                started = time.perf_counter()
+                await get_related(session, user_id, "goal", goal_id, RELATED_MAX_DEPTH, fanout)
+                timings.append((time.perf_counter() - started) * 1000)
+            median, p95 = percentiles(timings)
+            print(f"{'cached':>6}{'':>10}{median:>10.3f}ms{p95:>10.3f}ms")
+            await session.close()
+        finally:
+            await transaction.rollback()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--per-type", type=int, default=300)
+    parser.add_argument("--links-per-item", type=int, default=12)
+    parser.add_argument("--fanout", type=int, default=10)
+    parser.add_argument("--samples", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.per_type, args.links_per_item, args.fanout, args.samples))
@@ -0,0 +1,85 @@
+"""
+Бенчмарк холодного старта бота: время до первого polling и разбивка импортов (-X importtime).
+
+Запускает `python bot/main.py` несколько раз, ждёт строку "Bot started in" из startup-хука
+и останавливает процесс. Нужны .env и доступная база (для проверки схемы); токен
+может быть любым синтаксически корректным — до запросов к Telegram дело не доходит.
+
+    python benchmarks/startup_time.py --runs 5 --top 20
+    FAST_START=true python benchmarks/startup_time.py
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+MAIN = os.path.join(ROOT, 'bot', 'main.py')
+READY_MARKER = "Bot started in"
+
+
+def start_once(timeout: float, importtime: bool = False) -> tuple:
+    """Один запуск: (секунды до строки READY_MARKER, строки stderr с -X importtime)."""
+    command = [sys.executable, *(["-X", "importtime"] if importtime else []), MAIN]
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        command, cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        env={**os.environ, "VOICE_PRELOAD": "false"},
+    )
+    stderr_lines = []
+    reader = threading.Thread(target=lambda: stderr_lines.extend(process.stderr), daemon=True)
+    reader.start()
+    timer = threading.Timer(timeout, process.kill)
+    timer.start()
+    elapsed = None
+    try:
+        for line in process.stdout:
+            if READY_MARKER in line:
+                elapsed = time.perf_counter() - started
+                break
+    finally:
+        timer.cancel()
+        process.kill()
+        process.wait()
+        reader.join()
+    if elapsed is None:
+        raise RuntimeError("Bot did not start:\n" + "".join(stderr_lines[-20:]))
+    return elapsed, stderr_lines
+
+
+def import_breakdown(lines: list, top: int) -> list:
+    """Суммарное cumulative-время импорта по пакетам верхнего уровня, мкс."""
+    totals = defaultdict(int)
+    for line in lines:
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Вложенные модули с отступом уже учтены в cumulative родителя
+        if name.startswith("  "):
+            continue
+        totals[name.strip().split(".")[0]] += int(cumulative)
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def main(runs: int, top: int, timeout: float) -> None:
+    timings = [start_once(timeout)[0] for _ in range(runs)]
+    print(f"FAST_START={os.environ.get('FAST_START', 'false')}")
+    print(f"time to first poll: median {statistics.median(timings):.2f}s, "
+          f"min {min(timings):.2f}s, max {max(timings):.2f}s over {runs} runs")
+    _, lines = start_once(timeout, importtime=True)
+    print(f"\nTop {top} imports by cumulative time:")
+    for name, microseconds in import_breakdown(lines, top):
+        print(f"  {microseconds / 1000:9.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+    main(args.runs, args.top, args.timeout)
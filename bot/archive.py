@@ -0,0 +1,63 @@
+"""
+Архивация давно удалённых строк в таблицы archive_* и восстановление из архива.
+
+    python bot/archive.py run --days 30 --batch-size 1000 [--vacuum]
+    python bot/archive.py restore tasks 123
+"""
+import argparse
+import asyncio
+import json
+
+from environs import Env
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from database.engine import create_db_engine
+from database.models import ARCHIVED_ENTITIES, ASSOCIATION_TABLES
+from services.archiver import archive_deleted, refresh_table_stats, restore_archived
+from utils.logger import db_logger
+from utils.metrics import metrics
+
+env = Env()
+env.read_env()
+
+
+async def vacuum_hot_tables(engine) -> None:
+    # VACUUM нельзя выполнить внутри транзакции
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for table in [*ARCHIVED_ENTITIES, *(table.name for table in ASSOCIATION_TABLES)]:
+            await conn.execute(text(f"VACUUM (ANALYZE) {table}"))
+
+
+async def run(args: argparse.Namespace) -> None:
+    engine = create_db_engine(env("DATABASE_URL"), name="archiver")
+    try:
+        if args.command == "run":
+            totals = await archive_deleted(engine, args.days, args.batch_size)
+            if args.vacuum:
+                await vacuum_hot_tables(engine)
+                await refresh_table_stats(engine)
+            print(f"Moved to archive: {totals}")
+            print(json.dumps(metrics.snapshot()["gauges"], indent=2, sort_keys=True))
+        else:
+            try:
+                restored = await restore_archived(engine, args.table, args.id)
+            except (ValueError, IntegrityError) as e:
+                db_logger.error(f"Restore of {args.table} {args.id} failed: {e}")
+                raise SystemExit(1)
+            print(f"Restored: {restored}")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="перенести в архив строки, удалённые больше N дней назад")
+    run_parser.add_argument("--days", type=int, default=env.int("ARCHIVE_AFTER_DAYS", 30))
+    run_parser.add_argument("--batch-size", type=int, default=env.int("ARCHIVE_BATCH_SIZE", 1000))
+    run_parser.add_argument("--vacuum", action="store_true", help="VACUUM (ANALYZE) горячих таблиц после переноса")
+    restore_parser = commands.add_parser("restore", help="вернуть объект из архива")
+    restore_parser.add_argument("table", choices=ARCHIVED_ENTITIES)
+    restore_parser.add_argument("id", type=int)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,60 @@
+from collections import defaultdict
+from typing import Callable, Dict, List
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from database.routing import WriterSession
+
+# Виды пометок: пользователь (его объекты или связи) и отдельная задача (поля, подзадачи, связи)
+USER = "user"
+TASK = "task"
+# Любая пометка в сессии апдейта: ключ — tg_id её пользователя (session.info["tg_id"]).
+# Для кэшей, зависящих от всех данных пользователя сразу (сводки /today, /week, ...)
+TG_USER = "tg_user"
+
+# Ключ session.info: вид -> множество id, изменённых в текущей транзакции
+CHANGES_KEY = "changes"
+
+_subscribers: Dict[str, List[Callable[[int], None]]] = defaultdict(list)
+
+
+def mark_changed(session: AsyncSession, kind: str, key: int) -> None:
+    """
+    Помечает изменение в текущей транзакции. Подписчики вида получат key после commit.
+    """
+    session.info.setdefault(CHANGES_KEY, defaultdict(set))[kind].add(key)
+
+
+def mark_user_changed(session: AsyncSession, user_id: int) -> None:
+    """Меняются объекты или связи пользователя."""
+    mark_changed(session, USER, user_id)
+
+
+def mark_task_changed(session: AsyncSession, task_id: int) -> None:
+    """Меняется задача, её подзадачи или связи."""
+    mark_changed(session, TASK, task_id)
+
+
+def subscribe(kind: str, callback: Callable[[int], None]) -> None:
+    """Регистрирует callback(key), вызываемый для каждого закоммиченного изменения вида kind."""
+    _subscribers[kind].append(callback)
+
+
+def track_changes() -> None:
+    """
+    После commit пишущей сессии передаёт пометки подписчикам (сброс кэшей).
+    При откате пометки просто забываются.
+    """
+    @event.listens_for(WriterSession, "after_commit")
+    def on_commit(session: Session) -> None:
+        marks = session.info.pop(CHANGES_KEY, {})
+        if marks and session.info.get("tg_id") is not None:
+            marks[TG_USER].add(session.info["tg_id"])
+        for kind, keys in marks.items():
+            for key in keys:
+                for callback in _subscribers[kind]:
+                    callback(key)
+
+    @event.listens_for(WriterSession, "after_rollback")
+    def on_rollback(session: Session) -> None:
+        session.info.pop(CHANGES_KEY, None)
@@ -0,0 +1,92 @@
+import time
+from environs import Env
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from utils.logger import db_logger
+from utils.metrics import metrics
+
+env = Env()
+env.read_env()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Пул соединений, который замеряет, сколько checkout ждал свободного соединения.
+    """
+    def _do_get(self):
+        name = self._orig_logging_name or "primary"
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            metrics.inc(f"db.pool.{name}.timeouts")
+            db_logger.warning(f"Pool '{name}' checkout timed out: {self.status()}")
+            raise
+        finally:
+            metrics.observe(f"db.pool.{name}.checkout_wait_ms", (time.perf_counter() - started) * 1000)
+
+
+def instrument_pool(engine: AsyncEngine, name: str) -> None:
+    """
+    Вешает обработчики событий пула, экспортирующие занятость, overflow и инвалидации в метрики.
+    """
+    pool = engine.sync_engine.pool
+
+    def update_gauges() -> None:
+        metrics.set_gauge(f"db.pool.{name}.in_use", pool.checkedout())
+        metrics.set_gauge(f"db.pool.{name}.overflow", max(pool.overflow(), 0))
+
+    @event.listens_for(pool, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        metrics.inc(f"db.pool.{name}.connects")
+
+    @event.listens_for(pool, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.inc(f"db.pool.{name}.checkouts")
+        if pool.overflow() > 0:
+            metrics.inc(f"db.pool.{name}.overflow_checkouts")
+        update_gauges()
+
+    @event.listens_for(pool, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        update_gauges()
+
+    @event.listens_for(pool, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.inc(f"db.pool.{name}.invalidations")
+        db_logger.warning(f"Pool '{name}' connection invalidated: {exception}")
+
+    @event.listens_for(pool, "soft_invalidate")
+    def on_soft_invalidate(dbapi_connection, connection_record, exception):
+        metrics.inc(f"db.pool.{name}.soft_invalidations")
+
+    metrics.set_gauge(f"db.pool.{name}.size", pool.size())
+
+
+def create_db_engine(url: str, name: str = "primary") -> AsyncEngine:
+    """
+    Создаёт AsyncEngine с настройками пула из окружения:
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING, DB_POOL_USE_LIFO.
+
+    pre_ping добавляет round trip на каждый checkout; без него устаревшие соединения
+    отсекаются через pool_recycle и инвалидацию при ошибке соединения.
+    """
+    settings = dict(
+        pool_size=env.int("DB_POOL_SIZE", 5),
+        max_overflow=env.int("DB_MAX_OVERFLOW", 10),
+        pool_timeout=env.float("DB_POOL_TIMEOUT", 30),
+        pool_recycle=env.int("DB_POOL_RECYCLE", -1),
+        pool_pre_ping=env.bool("DB_POOL_PRE_PING", True),
+        pool_use_lifo=env.bool("DB_POOL_USE_LIFO", False),
+    )
+    db_logger.info(f"Creating '{name}' engine with pool settings: {settings}")
+    engine = create_async_engine(
+        url,
+        poolclass=InstrumentedQueuePool,
+        pool_logging_name=name,
+        **settings,
+    )
+    instrument_pool(engine, name)
+    return engine
@@ -0,0 +1,185 @@
+import asyncio
+import json
+from dataclasses import astuple
+from datetime import timedelta
+from typing import Any, Dict, Mapping, Optional
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from environs import Env
+from sqlalchemy import Text, case, cast, delete, func, literal, null, or_, select, update
+from sqlalchemy.dialects.postgresql import JSONB, insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+from database.models import fsm_storage
+from utils.logger import db_logger
+from utils.metrics import metrics
+
+env = Env()
+env.read_env()
+
+# memory — в процессе (теряется при перезапуске), redis — REDIS_URL, postgres — таблица fsm_storage
+FSM_STORAGE = env("FSM_STORAGE", "memory")
+# Состояние, не менявшееся столько секунд, удаляется (0 — хранить бессрочно; memory не поддерживает TTL)
+FSM_STATE_TTL = env.int("FSM_STATE_TTL", 7 * 86400)
+
+EMPTY = cast(literal("{}", Text), JSONB)
+
+
+def dumps(data: Mapping[str, Any]) -> str:
+    """
+    Компактный JSON для данных FSM и диалогов. В dialog_data должны лежать только id и
+    скаляры: ORM-объект или Row здесь дают TypeError сразу, а не раздувают хранилище.
+    """
+    payload = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+    metrics.observe("fsm.data_bytes", len(payload.encode()))
+    return payload
+
+
+class PostgresStorage(BaseStorage):
+    """
+    Хранилище FSM в таблице fsm_storage: одна строка (state, data) на ключ, TTL — колонка
+    expires_at, которая сдвигается при каждой записи. Просроченные строки не читаются и
+    перезаписываются как пустые; физически их удаляет purge_expired.
+    """
+    def __init__(self, engine: AsyncEngine, ttl: Optional[float]):
+        self.engine = engine
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        # В ключ входит destiny: aiogram_dialog хранит стеки и контексты под отдельными ключами
+        return ":".join("" if part is None else str(part) for part in astuple(key))
+
+    def _expires_at(self):
+        return func.now() + timedelta(seconds=self.ttl) if self.ttl else null()
+
+    @staticmethod
+    def _alive():
+        return or_(fsm_storage.c.expires_at.is_(None), fsm_storage.c.expires_at > func.now())
+
+    @staticmethod
+    def _expired():
+        return fsm_storage.c.expires_at <= func.now()
+
+    async def _clear(self, key: str, column: str, other_is_empty) -> None:
+        """Сбрасывает state или data; строка, в которой больше ничего нет, удаляется."""
+        async with self.engine.begin() as conn:
+            deleted = await conn.execute(
+                delete(fsm_storage).where(fsm_storage.c.key == key, or_(other_is_empty, self._expired()))
+            )
+            if not deleted.rowcount:
+                await conn.execute(
+                    update(fsm_storage)
+                    .where(fsm_storage.c.key == key)
+                    .values({column: EMPTY if column == "data" else None, "expires_at": self._expires_at()})
+                )
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        if state is None:
+            await self._clear(self._key(key), "state", fsm_storage.c.data == EMPTY)
+            return
+        statement = insert(fsm_storage).values(key=self._key(key), state=state, expires_at=self._expires_at())
+        async with self.engine.begin() as conn:
+            await conn.execute(statement.on_conflict_do_update(
+                index_elements=[fsm_storage.c.key],
+                set_={
+                    "state": statement.excluded.state,
+                    "data": case((self._expired(), EMPTY), else_=fsm_storage.c.data),
+                    "expires_at": statement.excluded.expires_at,
+                },
+            ))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        async with self.engine.connect() as conn:
+            return await conn.scalar(
+                select(fsm_storage.c.state).where(fsm_storage.c.key == self._key(key), self._alive())
+            )
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not data:
+            await self._clear(self._key(key), "data", fsm_storage.c.state.is_(None))
+            return
+        statement = insert(fsm_storage).values(
+            key=self._key(key), data=cast(literal(dumps(data), Text), JSONB), expires_at=self._expires_at()
+        )
+        async with self.engine.begin() as conn:
+            await conn.execute(statement.on_conflict_do_update(
+                index_elements=[fsm_storage.c.key],
+                set_={
+                    "state": case((self._expired(), null()), else_=fsm_storage.c.state),
+                    "data": statement.excluded.data,
+                    "expires_at": statement.excluded.expires_at,
+                },
+            ))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        async with self.engine.connect() as conn:
+            data = await conn.scalar(
+                select(fsm_storage.c.data).where(fsm_storage.c.key == self._key(key), self._alive())
+            )
+        return dict(data) if data else {}
+
+    async def update_data(self, key: StorageKey, data: Mapping[str, Any]) -> Dict[str, Any]:
+        """Слияние на стороне БД (jsonb ||) — один round trip вместо get_data + set_data."""
+        statement = insert(fsm_storage).values(
+            key=self._key(key), data=cast(literal(dumps(data), Text), JSONB), expires_at=self._expires_at()
+        )
+        async with self.engine.begin() as conn:
+            merged = await conn.scalar(statement.on_conflict_do_update(
+                index_elements=[fsm_storage.c.key],
+                set_={
+                    "state": case((self._expired(), null()), else_=fsm_storage.c.state),
+                    "data": case(
+                        (self._expired(), statement.excluded.data),
+                        else_=fsm_storage.c.data.op("||")(statement.excluded.data),
+                    ),
+                    "expires_at": statement.excluded.expires_at,
+                },
+            ).returning(fsm_storage.c.data))
+        return dict(merged)
+
+    async def close(self) -> None:
+        # Движок общий с ботом, его закрывает main
+        pass
+
+    async def purge_expired(self) -> int:
+        async with self.engine.begin() as conn:
+            result = await conn.execute(delete(fsm_storage).where(self._expired()))
+        metrics.inc("fsm.purged", result.rowcount)
+        return result.rowcount
+
+    async def purge_periodically(self, interval: float) -> None:
+        """Фоновое удаление просроченных строк. Ошибка одного запуска не останавливает цикл."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                purged = await self.purge_expired()
+                if purged:
+                    db_logger.info(f"Purged {purged} expired FSM rows")
+            except Exception as e:
+                db_logger.error(f"FSM purge failed: {e}")
+
+
+def create_fsm_storage(engine: AsyncEngine) -> BaseStorage:
+    ttl = FSM_STATE_TTL or None
+    db_logger.info(f"FSM storage: {FSM_STORAGE}, TTL {ttl}")
+    if FSM_STORAGE == "postgres":
+        return PostgresStorage(engine, ttl)
+    if FSM_STORAGE == "redis":
+        # redis нужен только этому бэкенду
+        from redis.asyncio import Redis
+        from aiogram.fsm.storage.redis import DefaultKeyBuilder, RedisStorage
+
+        return RedisStorage(
+            Redis.from_url(env("REDIS_URL")),
+            # destiny обязателен для aiogram_dialog: стеки диалогов хранятся рядом с состоянием
+            key_builder=DefaultKeyBuilder(with_destiny=True),
+            state_ttl=ttl,
+            data_ttl=ttl,
+            json_dumps=dumps,
+            json_loads=json.loads,
+        )
+    if FSM_STORAGE != "memory":
+        raise ValueError(f"Unknown FSM_STORAGE: {FSM_STORAGE}")
+    return MemoryStorage()
@@ -0,0 +1,272 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from environs import Env
+from sqlalchemy import Select, delete, literal, select, union_all
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.changes import mark_user_changed
+from database.models import ASSOCIATION_TABLES, LINK_ENTITY_TABLES, Base, links
+
+env = Env()
+env.read_env()
+
+# Пара типов в каноническом направлении (как в имени таблицы: task_event) -> (таблица, колонка src, колонка dst)
+LINK_PAIRS = {}
+for _table in ASSOCIATION_TABLES:
+    _src, _dst = _table.name.split("_")
+    LINK_PAIRS[(_src, _dst)] = (_table, _table.c[f"{_src}_id"], _table.c[f"{_dst}_id"])
+
+
+def visible_ids_query(user_id: int, item_type: str, ids: Optional[Iterable[int]] = None) -> Select:
+    """
+    Id неудалённых объектов пользователя данного типа (среди ids, если заданы) —
+    только их связи можно менять из бота.
+    """
+    table = Base.metadata.tables[LINK_ENTITY_TABLES[item_type]]
+    query = select(table.c.id).where(table.c.user_id == user_id, table.c.is_deleted == False)
+    return query if ids is None else query.where(table.c.id.in_(ids))
+
+
+def orient(item_type: str, other_type: str) -> Tuple[str, str, bool]:
+    """
+    Каноническое направление связи между двумя типами: (src_type, dst_type, item — это dst).
+    """
+    if (item_type, other_type) in LINK_PAIRS:
+        return item_type, other_type, False
+    if (other_type, item_type) in LINK_PAIRS:
+        return other_type, item_type, True
+    raise ValueError(f"Objects of type {item_type} and {other_type} can't be linked")
+
+
+class TablesLinkStore:
+    """
+    Связи в 15 парных таблицах (task_event, task_goal, ...).
+    """
+    def _columns(self, item_type: str, other_type: str):
+        src_type, dst_type, flipped = orient(item_type, other_type)
+        table, src_col, dst_col = LINK_PAIRS[(src_type, dst_type)]
+        return (table, dst_col, src_col) if flipped else (table, src_col, dst_col)
+
+    def linked_ids_query(self, item_type: str, item_id: int, other_type: str) -> Select:
+        _, own_col, other_col = self._columns(item_type, other_type)
+        return select(other_col).where(own_col == item_id)
+
+    async def get_linked_ids(self, session: AsyncSession, item_type: str, item_id: int, other_type: str) -> List[int]:
+        return list((await session.scalars(self.linked_ids_query(item_type, item_id, other_type))).all())
+
+    async def get_all_linked_ids(self, session: AsyncSession, item_type: str, item_id: int) -> Dict[str, List[int]]:
+        """Всё, что связано с объектом: по запросу на каждую таблицу, где он участвует."""
+        result = {}
+        for other_type in LINK_ENTITY_TABLES:
+            if other_type != item_type:
+                result[other_type] = await self.get_linked_ids(session, item_type, item_id, other_type)
+        return result
+
+    async def set_linked_ids(
+        self, session: AsyncSession, user_id: int, item_type: str, item_id: int, other_type: str, ids: Iterable[int]
+    ) -> int:
+        """
+        Приводит связи объекта с объектами other_type к набору ids, не читая текущие связи:
+        DELETE лишних и INSERT ... ON CONFLICT DO NOTHING недостающих. Затрагиваются только
+        неудалённые объекты пользователя: чужие id не вставляются, связи с удалёнными сохраняются.
+        Без commit; возвращает число изменённых строк.
+        """
+        table, own_col, other_col = self._columns(item_type, other_type)
+        ids = list(set(ids))
+        changed = (await session.execute(delete(table).where(
+            own_col == item_id, other_col.not_in(ids), other_col.in_(visible_ids_query(user_id, other_type))
+        ))).rowcount
+        if ids:
+            changed += (await session.execute(
+                insert(table)
+                .from_select(
+                    [other_col.name, own_col.name],
+                    visible_ids_query(user_id, other_type, ids).add_columns(literal(item_id)),
+                )
+                .on_conflict_do_nothing()
+            )).rowcount
+        if changed:
+            mark_user_changed(session, user_id)
+        return changed
+
+    async def link_many(
+        self, session: AsyncSession, user_id: int, item_type: str, item_ids: Iterable[int], other_type: str, other_id: int
+    ) -> int:
+        """
+        Связывает объекты item_ids с одним объектом other_type одним INSERT ... SELECT
+        (массовые действия). Чужие и удалённые объекты пропускаются. Без commit; возвращает число новых связей.
+        """
+        table, own_col, other_col = self._columns(item_type, other_type)
+        added = (await session.execute(
+            insert(table)
+            .from_select(
+                [own_col.name, other_col.name],
+                visible_ids_query(user_id, item_type, item_ids)
+                .add_columns(literal(other_id))
+                .where(visible_ids_query(user_id, other_type, [other_id]).exists()),
+            )
+            .on_conflict_do_nothing()
+        )).rowcount
+        if added:
+            mark_user_changed(session, user_id)
+        return added
+
+    def edges_sql(self, types: Iterable[str]) -> str:
+        """
+        SQL рёбер графа между объектами types в обе стороны: (from_type, from_id, to_type, to_id).
+        По ветке на направление каждой парной таблицы; обе идут по индексам таблицы.
+        """
+        types = set(types)
+        branches = []
+        for (src_type, dst_type), (table, src_col, dst_col) in LINK_PAIRS.items():
+            if src_type in types and dst_type in types:
+                branches.append(
+                    f"SELECT '{src_type}'::text AS from_type, {src_col.name} AS from_id, "
+                    f"'{dst_type}'::text AS to_type, {dst_col.name} AS to_id FROM {table.name}"
+                )
+                branches.append(
+                    f"SELECT '{dst_type}'::text, {dst_col.name}, '{src_type}'::text, {src_col.name} FROM {table.name}"
+                )
+        return "\nUNION ALL ".join(branches)
+
+    async def fetch_catalog(self, session: AsyncSession, user_id: int) -> Dict[str, List[Tuple[int, int]]]:
+        """Все связи пользователя по таблицам: имя таблицы -> [(src_id, dst_id)]. 15 запросов."""
+        catalog = {}
+        for (src_type, _), (table, src_col, dst_col) in LINK_PAIRS.items():
+            src_table = Base.metadata.tables[LINK_ENTITY_TABLES[src_type]]
+            catalog[table.name] = [tuple(row) for row in (await session.execute(
+                select(src_col, dst_col).join(src_table, src_table.c.id == src_col).where(src_table.c.user_id == user_id)
+            )).all()]
+        return catalog
+
+
+class UnifiedLinkStore:
+    """
+    Связи в единой таблице links(user_id, src_type, src_id, dst_type, dst_id).
+    """
+    def linked_ids_query(self, item_type: str, item_id: int, other_type: str) -> Select:
+        src_type, dst_type, flipped = orient(item_type, other_type)
+        if flipped:
+            return select(links.c.src_id).where(
+                links.c.dst_type == item_type, links.c.dst_id == item_id, links.c.src_type == other_type
+            )
+        return select(links.c.dst_id).where(
+            links.c.src_type == item_type, links.c.src_id == item_id, links.c.dst_type == other_type
+        )
+
+    async def get_linked_ids(self, session: AsyncSession, item_type: str, item_id: int, other_type: str) -> List[int]:
+        return list((await session.scalars(self.linked_ids_query(item_type, item_id, other_type))).all())
+
+    async def get_all_linked_ids(self, session: AsyncSession, item_type: str, item_id: int) -> Dict[str, List[int]]:
+        """Всё, что связано с объектом, одним запросом: по индексу src и по индексу dst."""
+        rows = (await session.execute(union_all(
+            select(links.c.dst_type, links.c.dst_id).where(links.c.src_type == item_type, links.c.src_id == item_id),
+            select(links.c.src_type, links.c.src_id).where(links.c.dst_type == item_type, links.c.dst_id == item_id),
+        ))).all()
+        result = {other_type: [] for other_type in LINK_ENTITY_TABLES if other_type != item_type}
+        for other_type, other_id in rows:
+            result[other_type].append(other_id)
+        return result
+
+    async def set_linked_ids(
+        self, session: AsyncSession, user_id: int, item_type: str, item_id: int, other_type: str, ids: Iterable[int]
+    ) -> int:
+        """
+        Приводит связи объекта с объектами other_type к набору ids, не читая текущие связи
+        (см. TablesLinkStore.set_linked_ids). Без commit; возвращает число изменённых строк.
+        """
+        src_type, dst_type, flipped = orient(item_type, other_type)
+        own_type, own_id, other_type_col, other_id_col = (
+            (links.c.dst_type, links.c.dst_id, links.c.src_type, links.c.src_id) if flipped
+            else (links.c.src_type, links.c.src_id, links.c.dst_type, links.c.dst_id)
+        )
+        ids = list(set(ids))
+        changed = (await session.execute(delete(links).where(
+            own_type == item_type,
+            own_id == item_id,
+            other_type_col == other_type,
+            other_id_col.not_in(ids),
+            other_id_col.in_(visible_ids_query(user_id, other_type)),
+        ))).rowcount
+        if ids:
+            changed += (await session.execute(
+                insert(links)
+                .from_select(
+                    [other_id_col.name, "user_id", "src_type", "dst_type", own_id.name],
+                    visible_ids_query(user_id, other_type, ids).add_columns(
+                        literal(user_id), literal(src_type), literal(dst_type), literal(item_id)
+                    ),
+                )
+                .on_conflict_do_nothing()
+            )).rowcount
+        if changed:
+            mark_user_changed(session, user_id)
+        return changed
+
+    async def link_many(
+        self, session: AsyncSession, user_id: int, item_type: str, item_ids: Iterable[int], other_type: str, other_id: int
+    ) -> int:
+        """Связывает объекты item_ids с одним объектом other_type (см. TablesLinkStore.link_many)."""
+        src_type, dst_type, flipped = orient(item_type, other_type)
+        own_id, other_id_col = ("dst_id", "src_id") if flipped else ("src_id", "dst_id")
+        added = (await session.execute(
+            insert(links)
+            .from_select(
+                [own_id, "user_id", "src_type", "dst_type", other_id_col],
+                visible_ids_query(user_id, item_type, item_ids)
+                .add_columns(literal(user_id), literal(src_type), literal(dst_type), literal(other_id))
+                .where(visible_ids_query(user_id, other_type, [other_id]).exists()),
+            )
+            .on_conflict_do_nothing()
+        )).rowcount
+        if added:
+            mark_user_changed(session, user_id)
+        return added
+
+    def edges_sql(self, types: Iterable[str]) -> str:
+        """
+        SQL рёбер графа между объектами types в обе стороны: (from_type, from_id, to_type, to_id).
+        Прямое направление идёт по первичному ключу links, обратное — по ix_links_dst.
+        """
+        type_list = ", ".join(f"'{link_type}'" for link_type in sorted(types))
+        return (
+            "SELECT src_type::text AS from_type, src_id AS from_id, dst_type::text AS to_type, dst_id AS to_id "
+            f"FROM links WHERE src_type IN ({type_list}) AND dst_type IN ({type_list})\n"
+            "UNION ALL SELECT dst_type::text, dst_id, src_type::text, src_id "
+            f"FROM links WHERE src_type IN ({type_list}) AND dst_type IN ({type_list})"
+        )
+
+    async def fetch_catalog(self, session: AsyncSession, user_id: int) -> Dict[str, List[Tuple[int, int]]]:
+        """Все связи пользователя: имя пары (task_event, ...) -> [(src_id, dst_id)]. Один index-only scan."""
+        catalog = {table.name: [] for table, _, _ in LINK_PAIRS.values()}
+        rows = (await session.execute(
+            select(links.c.src_type, links.c.dst_type, links.c.src_id, links.c.dst_id).where(links.c.user_id == user_id)
+        )).all()
+        for src_type, dst_type, src_id, dst_id in rows:
+            catalog[f"{src_type}_{dst_type}"].append((src_id, dst_id))
+        return catalog
+
+
+async def sync_tables_from_links(session: AsyncSession) -> Dict[str, Tuple[int, int]]:
+    """
+    Приводит 15 парных таблиц к содержимому links — перед возвратом с LINK_BACKEND=links
+    на tables: триггеры зеркалируют только парные таблицы в links, обратно связи не копируются.
+    Без commit; возвращает имя таблицы -> (удалено, добавлено).
+    """
+    result = {}
+    for (src_type, dst_type), (table, src_col, dst_col) in LINK_PAIRS.items():
+        pair = (links.c.src_type == src_type, links.c.dst_type == dst_type)
+        removed = (await session.execute(delete(table).where(
+            ~select(links.c.src_id).where(*pair, links.c.src_id == src_col, links.c.dst_id == dst_col).exists()
+        ))).rowcount
+        added = (await session.execute(
+            insert(table)
+            .from_select([src_col.name, dst_col.name], select(links.c.src_id, links.c.dst_id).where(*pair))
+            .on_conflict_do_nothing()
+        )).rowcount
+        result[table.name] = (removed, added)
+    return result
+
+
+LINK_STORES = {"tables": TablesLinkStore, "links": UnifiedLinkStore}
+# Слой links пишет только в links: назад на tables — после sync_tables_from_links (bot/link_tables_sync.py)
+link_store = LINK_STORES[env("LINK_BACKEND", "tables")]()
@@ -0,0 +1,102 @@
+import asyncio
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy import Row, event, select
+from sqlalchemy.orm import Session
+from database.models import DbSubtask, DbTask
+from database.routing import SessionRouter, WriterSession
+from utils.logger import db_logger
+from utils.metrics import metrics
+
+# Что умеет загружать RowLoader: вид -> колонки строки (первая — id)
+LOADABLE = {
+    "task": (DbTask.id, DbTask.name, DbTask.description, DbTask.status, DbTask.deadline, DbTask.user_id),
+    "subtask": (DbSubtask.id, DbSubtask.name, DbSubtask.is_done, DbSubtask.deadline, DbSubtask.task_id),
+}
+
+# Ключ session.info пишущей сессии: её RowLoader, который сбрасывается после commit
+LOADER_KEY = "row_loader"
+
+
+class RowLoader:
+    """
+    Загрузчик строк в пределах одного апдейта (в духе DataLoader): запоминает уже
+    загруженные строки и объединяет запросы, сделанные в одной итерации event loop,
+    в один SELECT ... WHERE id IN (...) на вид. Повторные обращения к выбранной задаче
+    или подзадаче из хендлера и геттеров стоят не больше одного запроса.
+    Читает через db_router.reader() в момент запроса, поэтому после записи видит primary.
+    """
+    __slots__ = ("_router", "_rows", "_pending", "_scheduled", "_tasks")
+
+    def __init__(self, router: SessionRouter):
+        self._router = router
+        self._rows: Dict[Tuple[str, int], Optional[Row]] = {}
+        self._pending: Dict[str, Dict[int, asyncio.Future]] = {}
+        self._scheduled = False
+        self._tasks = set()
+
+    async def load(self, kind: str, entity_id: Optional[int]) -> Optional[Row]:
+        if entity_id is None:
+            return None
+        key = (kind, entity_id)
+        if key in self._rows:
+            metrics.inc("loader.hits")
+            return self._rows[key]
+        metrics.inc("loader.misses")
+        futures = self._pending.setdefault(kind, {})
+        future = futures.get(entity_id)
+        if future is None:
+            future = futures[entity_id] = asyncio.get_running_loop().create_future()
+            if not self._scheduled:
+                # Ждём конца текущей итерации loop, чтобы собрать все id в один запрос
+                self._scheduled = True
+                asyncio.get_running_loop().call_soon(self._dispatch)
+        return await future
+
+    async def load_many(self, kind: str, entity_ids: Iterable[int]) -> Dict[int, Optional[Row]]:
+        entity_ids = list(dict.fromkeys(entity_ids))
+        rows = await asyncio.gather(*(self.load(kind, entity_id) for entity_id in entity_ids))
+        return dict(zip(entity_ids, rows))
+
+    def clear(self) -> None:
+        """Забыть загруженные строки (после записи они могли устареть)."""
+        self._rows.clear()
+
+    def _dispatch(self) -> None:
+        self._scheduled = False
+        batches, self._pending = self._pending, {}
+        task = asyncio.create_task(self._fetch(batches))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fetch(self, batches: Dict[str, Dict[int, asyncio.Future]]) -> None:
+        # Виды — по очереди: одна AsyncSession не допускает параллельных запросов
+        for kind, futures in batches.items():
+            columns = LOADABLE[kind]
+            try:
+                rows = (await self._router.reader().execute(
+                    select(*columns).where(columns[0].in_(list(futures)))
+                )).all()
+            except Exception as e:
+                db_logger.error(f"RowLoader failed to load {kind} {list(futures)}: {e}")
+                for future in futures.values():
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            metrics.inc("loader.queries")
+            found = {row.id: row for row in rows}
+            for entity_id, future in futures.items():
+                self._rows[(kind, entity_id)] = found.get(entity_id)
+                if not future.done():
+                    future.set_result(found.get(entity_id))
+
+
+def clear_loaders_on_commit() -> None:
+    """
+    После commit пишущей сессии сбрасывает её RowLoader: следующий геттер увидит
+    изменения, сделанные хендлером в том же апдейте.
+    """
+    @event.listens_for(WriterSession, "after_commit")
+    def on_commit(session: Session) -> None:
+        loader = session.info.get(LOADER_KEY)
+        if loader is not None:
+            loader.clear()
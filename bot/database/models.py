@@ -7,15 +7,32 @@ from sqlalchemy import (
     ForeignKey,
     Table,
     Text,
+    Index,
     func,
     BigInteger,
+    Computed,
 )
-from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from sqlalchemy.orm import relationship, declarative_base, deferred
 from sqlalchemy.types import Enum as SqlEnum
 import enum
 
 Base = declarative_base()
 
+
+def search_vector_column(*fields: str):
+    """
+    Генерируемая колонка tsvector для полнотекстового поиска (русская конфигурация):
+    первое поле с весом A, остальные с весом B. Отложенная загрузка — спискам и деталям
+    вектор не нужен.
+    """
+    weights = ["A"] + ["B"] * (len(fields) - 1)
+    expression = " || ".join(
+        f"setweight(to_tsvector('russian', coalesce({field}, '')), '{weight}')"
+        for field, weight in zip(fields, weights)
+    )
+    return deferred(Column(TSVECTOR, Computed(expression, persisted=True)))
+
 # Enum for task status
 class TaskStatus(enum.Enum):
     NEW = "🆕"
@@ -44,6 +61,7 @@ task_event = Table(
     Base.metadata,
     Column('task_id', Integer, ForeignKey('tasks.id'), primary_key=True),
     Column('event_id', Integer, ForeignKey('events.id'), primary_key=True),
+    Index('ix_task_event_event_id', 'event_id', 'task_id'),
 )
 
 task_goal = Table(
@@ -51,6 +69,7 @@ task_goal = Table(
     Base.metadata,
     Column('task_id', Integer, ForeignKey('tasks.id'), primary_key=True),
     Column('goal_id', Integer, ForeignKey('goals.id'), primary_key=True),
+    Index('ix_task_goal_goal_id', 'goal_id', 'task_id'),
 )
 
 task_idea = Table(
@@ -58,6 +77,7 @@ task_idea = Table(
     Base.metadata,
     Column('task_id', Integer, ForeignKey('tasks.id'), primary_key=True),
     Column('idea_id', Integer, ForeignKey('ideas.id'), primary_key=True),
+    Index('ix_task_idea_idea_id', 'idea_id', 'task_id'),
 )
 
 task_note = Table(
@@ -65,6 +85,7 @@ task_note = Table(
     Base.metadata,
     Column('task_id', Integer, ForeignKey('tasks.id'), primary_key=True),
     Column('note_id', Integer, ForeignKey('notes.id'), primary_key=True),
+    Index('ix_task_note_note_id', 'note_id', 'task_id'),
 )
 
 event_goal = Table(
@@ -72,6 +93,7 @@ event_goal = Table(
     Base.metadata,
     Column('event_id', Integer, ForeignKey('events.id'), primary_key=True),
     Column('goal_id', Integer, ForeignKey('goals.id'), primary_key=True),
+    Index('ix_event_goal_goal_id', 'goal_id', 'event_id'),
 )
 
 event_idea = Table(
@@ -79,6 +101,7 @@ event_idea = Table(
     Base.metadata,
     Column('event_id', Integer, ForeignKey('events.id'), primary_key=True),
     Column('idea_id', Integer, ForeignKey('ideas.id'), primary_key=True),
+    Index('ix_event_idea_idea_id', 'idea_id', 'event_id'),
 )
 
 event_note = Table(
@@ -86,6 +109,7 @@ event_note = Table(
     Base.metadata,
     Column('event_id', Integer, ForeignKey('events.id'), primary_key=True),
     Column('note_id', Integer, ForeignKey('notes.id'), primary_key=True),
+    Index('ix_event_note_note_id', 'note_id', 'event_id'),
 )
 
 goal_idea = Table(
@@ -93,6 +117,7 @@ goal_idea = Table(
     Base.metadata,
     Column('goal_id', Integer, ForeignKey('goals.id'), primary_key=True),
     Column('idea_id', Integer, ForeignKey('ideas.id'), primary_key=True),
+    Index('ix_goal_idea_idea_id', 'idea_id', 'goal_id'),
 )
 
 goal_note = Table(
@@ -100,6 +125,7 @@ goal_note = Table(
     Base.metadata,
     Column('goal_id', Integer, ForeignKey('goals.id'), primary_key=True),
     Column('note_id', Integer, ForeignKey('notes.id'), primary_key=True),
+    Index('ix_goal_note_note_id', 'note_id', 'goal_id'),
 )
 
 idea_note = Table(
@@ -107,6 +133,7 @@ idea_note = Table(
     Base.metadata,
     Column('idea_id', Integer, ForeignKey('ideas.id'), primary_key=True),
     Column('note_id', Integer, ForeignKey('notes.id'), primary_key=True),
+    Index('ix_idea_note_note_id', 'note_id', 'idea_id'),
 )
 
 task_tag = Table(
@@ -114,6 +141,7 @@ task_tag = Table(
     Base.metadata,
     Column('task_id', Integer, ForeignKey('tasks.id'), primary_key=True),
     Column('tag_id', Integer, ForeignKey('tags.id'), primary_key=True),
+    Index('ix_task_tag_tag_id', 'tag_id', 'task_id'),
 )
 
 event_tag = Table(
@@ -121,6 +149,7 @@ event_tag = Table(
     Base.metadata,
     Column('event_id', Integer, ForeignKey('events.id'), primary_key=True),
     Column('tag_id', Integer, ForeignKey('tags.id'), primary_key=True),
+    Index('ix_event_tag_tag_id', 'tag_id', 'event_id'),
 )
 
 goal_tag = Table(
@@ -128,6 +157,7 @@ goal_tag = Table(
     Base.metadata,
     Column('goal_id', Integer, ForeignKey('goals.id'), primary_key=True),
     Column('tag_id', Integer, ForeignKey('tags.id'), primary_key=True),
+    Index('ix_goal_tag_tag_id', 'tag_id', 'goal_id'),
 )
 
 idea_tag = Table(
@@ -135,6 +165,7 @@ idea_tag = Table(
     Base.metadata,
     Column('idea_id', Integer, ForeignKey('ideas.id'), primary_key=True),
     Column('tag_id', Integer, ForeignKey('tags.id'), primary_key=True),
+    Index('ix_idea_tag_tag_id', 'tag_id', 'idea_id'),
 )
 
 note_tag = Table(
@@ -142,6 +173,7 @@ note_tag = Table(
     Base.metadata,
     Column('note_id', Integer, ForeignKey('notes.id'), primary_key=True),
     Column('tag_id', Integer, ForeignKey('tags.id'), primary_key=True),
+    Index('ix_note_tag_tag_id', 'tag_id', 'note_id'),
 )
 
 
@@ -174,6 +206,7 @@ class DbTask(Base):
     is_deleted = Column(Boolean, default=False, nullable=False)
     created = Column(DateTime, server_default=func.now(), nullable=False)
     updated = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
+    search_vector = search_vector_column("name", "description")
 
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     user = relationship('DbUser', back_populates='tasks')
@@ -190,11 +223,13 @@ class DbSubtask(Base):
     __tablename__ = 'subtasks'
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
+    deadline = Column(DateTime)
     is_done = Column(Boolean, default=False, nullable=False)
     is_deleted = Column(Boolean, default=False, nullable=False)
     task_id = Column(Integer, ForeignKey('tasks.id'), nullable=False)
     created = Column(DateTime, server_default=func.now(), nullable=False)
     updated = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
+    search_vector = search_vector_column("name")
 
     task = relationship('DbTask', back_populates='subtasks')
 
@@ -211,6 +246,7 @@ class DbEvent(Base):
     tag = Column(String)
     created = Column(DateTime, server_default=func.now(), nullable=False)
     updated = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
+    search_vector = search_vector_column("name", "description")
 
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     user = relationship('DbUser', back_populates='events')
@@ -231,6 +267,7 @@ class DbGoal(Base):
     is_deleted = Column(Boolean, default=False, nullable=False)
     created = Column(DateTime, server_default=func.now(), nullable=False)
     updated = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
+    search_vector = search_vector_column("name", "description")
 
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     user = relationship('DbUser', back_populates='goals')
@@ -250,6 +287,7 @@ class DbIdea(Base):
     is_deleted = Column(Boolean, default=False, nullable=False)
     created = Column(DateTime, server_default=func.now(), nullable=False)
     updated = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
+    search_vector = search_vector_column("name", "description")
 
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     user = relationship('DbUser', back_populates='ideas')
@@ -268,6 +306,7 @@ class DbNote(Base):
     is_deleted = Column(Boolean, default=False, nullable=False)
     created = Column(DateTime, server_default=func.now(), nullable=False)
     updated = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
+    search_vector = search_vector_column("name", "description")
 
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     user = relationship('DbUser', back_populates='notes')
@@ -294,4 +333,146 @@ class DbUser(Base):
     notes = relationship('DbNote', back_populates='user')
 
     created = Column(DateTime, server_default=func.now(), nullable=False)
-    updated = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
\ No newline at end of file
+    updated = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
+
+# Сводка по пользователю: счётчики неудалённых объектов. Поддерживается триггерами
+# (миграция 0005) при любых изменениях, сверяется фоновой задачей services/stats.py
+class DbUserStats(Base):
+    __tablename__ = 'user_stats'
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    tasks = Column(Integer, server_default='0', nullable=False)
+    tasks_new = Column(Integer, server_default='0', nullable=False)
+    tasks_in_progress = Column(Integer, server_default='0', nullable=False)
+    tasks_completed = Column(Integer, server_default='0', nullable=False)
+    subtasks = Column(Integer, server_default='0', nullable=False)
+    subtasks_done = Column(Integer, server_default='0', nullable=False)
+    events = Column(Integer, server_default='0', nullable=False)
+    goals = Column(Integer, server_default='0', nullable=False)
+    ideas = Column(Integer, server_default='0', nullable=False)
+    notes = Column(Integer, server_default='0', nullable=False)
+    tags = Column(Integer, server_default='0', nullable=False)
+    updated = Column(DateTime, server_default=func.now(), nullable=False)
+
+# Индексы под горячие запросы: фильтр по user_id и is_deleted = false с сортировкой по id/created,
+# выборки по срокам (deadline/start_time) и подзадачи задачи
+for _model in (DbTask, DbEvent, DbGoal, DbIdea, DbNote, DbTag):
+    Index(
+        f"ix_{_model.__tablename__}_user_id_active",
+        _model.user_id,
+        _model.id.desc(),
+        postgresql_where=_model.is_deleted == False,
+    )
+Index("ix_tasks_user_created_active", DbTask.user_id, DbTask.created.desc(), postgresql_where=DbTask.is_deleted == False)
+Index(
+    "ix_tasks_user_deadline_active",
+    DbTask.user_id,
+    DbTask.deadline,
+    postgresql_where=(DbTask.is_deleted == False) & DbTask.deadline.isnot(None),
+)
+Index(
+    "ix_goals_user_deadline_active",
+    DbGoal.user_id,
+    DbGoal.deadline,
+    postgresql_where=(DbGoal.is_deleted == False) & DbGoal.deadline.isnot(None),
+)
+Index(
+    "ix_events_user_start_time_active",
+    DbEvent.user_id,
+    DbEvent.start_time,
+    postgresql_where=(DbEvent.is_deleted == False) & DbEvent.start_time.isnot(None),
+)
+Index("ix_subtasks_task_id_active", DbSubtask.task_id, DbSubtask.id, postgresql_where=DbSubtask.is_deleted == False)
+# У подзадач нет user_id: сводки за период (services/digest.py) берут подзадачи по сроку
+# и отсекают чужие соединением с задачей
+Index(
+    "ix_subtasks_deadline_active",
+    DbSubtask.deadline,
+    postgresql_where=(DbSubtask.is_deleted == False) & DbSubtask.deadline.isnot(None),
+)
+
+# Полнотекстовый поиск: GIN по (user_id, search_vector) через btree_gin, чтобы совпадения
+# чужих пользователей отсекались в индексе. У подзадач нет user_id — они фильтруются через задачу
+for _model in (DbTask, DbEvent, DbGoal, DbIdea, DbNote):
+    Index(
+        f"ix_{_model.__tablename__}_search",
+        _model.user_id,
+        _model.search_vector,
+        postgresql_using="gin",
+        postgresql_where=_model.is_deleted == False,
+    )
+Index(
+    "ix_subtasks_search",
+    DbSubtask.search_vector,
+    postgresql_using="gin",
+    postgresql_where=DbSubtask.is_deleted == False,
+)
+
+# Холодное хранилище для архивации давно удалённых строк (services/archiver.py): те же колонки,
+# кроме генерируемых, без внешних ключей и уникальных ограничений, плюс время архивации
+ARCHIVED_ENTITIES = ("tasks", "subtasks", "events", "goals", "ideas", "notes", "tags")
+ASSOCIATION_TABLES = (
+    task_event, task_goal, task_idea, task_note,
+    event_goal, event_idea, event_note, goal_idea, goal_note, idea_note,
+    task_tag, event_tag, goal_tag, idea_tag, note_tag,
+)
+
+
+# Единая таблица связей (LINK_BACKEND=links, database/links.py). Направление src -> dst то же,
+# что у таблиц выше: task_event — это src_type='task', dst_type='event'. Пока основной слой —
+# 15 таблиц, триггеры миграции 0006 зеркалируют их изменения сюда. Обратного зеркала нет:
+# с LINK_BACKEND=links парные таблицы устаревают, и вернуться на tables можно только после
+# синхронизации (python bot/link_tables_sync.py, database.links.sync_tables_from_links)
+LINK_ENTITY_TABLES = {"task": "tasks", "event": "events", "goal": "goals", "idea": "ideas", "note": "notes", "tag": "tags"}
+links = Table(
+    'links',
+    Base.metadata,
+    Column('user_id', Integer, ForeignKey('users.id'), nullable=False),
+    Column('src_type', String(16), primary_key=True),
+    Column('src_id', Integer, primary_key=True),
+    Column('dst_type', String(16), primary_key=True),
+    Column('dst_id', Integer, primary_key=True),
+    # Первичный ключ покрывает поиск по src, эти два — поиск по dst и выгрузку связей пользователя
+    Index('ix_links_dst', 'dst_type', 'dst_id', 'src_type', 'src_id'),
+    Index('ix_links_user', 'user_id', 'src_type', 'dst_type', 'src_id', 'dst_id'),
+)
+
+
+# Состояние FSM и данные диалогов (FSM_STORAGE=postgres, database/fsm_storage.py).
+# Одна строка на ключ хранилища; строки, не обновлявшиеся до expires_at, считаются отсутствующими
+# (NULL — без срока)
+fsm_storage = Table(
+    'fsm_storage',
+    Base.metadata,
+    Column('key', String(255), primary_key=True),
+    Column('state', String(255)),
+    Column('data', JSONB, server_default='{}', nullable=False),
+    Column('expires_at', DateTime),
+    Index('ix_fsm_storage_expires_at', 'expires_at'),
+)
+
+
+def _archive_table(table: Table) -> Table:
+    return Table(
+        f"archive_{table.name}",
+        Base.metadata,
+        *(
+            Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+            for column in table.columns
+            if column.computed is None
+        ),
+        Column("archived_at", DateTime, server_default=func.now(), nullable=False),
+    )
+
+
+ARCHIVE_TABLES = {
+    name: _archive_table(Base.metadata.tables[name])
+    for name in (*ARCHIVED_ENTITIES, *(table.name for table in ASSOCIATION_TABLES), links.name)
+}
+Index("ix_archive_subtasks_task_id", ARCHIVE_TABLES["subtasks"].c.task_id)
+
+# Выборка кандидатов на архивацию: удалённые строки по времени последнего изменения
+for _name in ARCHIVED_ENTITIES:
+    _table = Base.metadata.tables[_name]
+    Index(f"ix_{_name}_deleted_updated", _table.c.updated, postgresql_where=_table.c.is_deleted == True)
@@ -0,0 +1,147 @@
+from typing import List, Optional, Sequence, Tuple
+from sqlalchemy import Integer, Row, cast, exists, func, literal, null, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from database.links import link_store
+from database.models import DbTask, DbSubtask, DbEvent, DbNote, DbGoal, DbIdea, DbTag
+
+# Связи задачи: relationship -> (связанная модель, тип объекта в хранилище связей)
+TASK_LINKS = {
+    "events": (DbEvent, "event"),
+    "notes": (DbNote, "note"),
+    "goals": (DbGoal, "goal"),
+    "ideas": (DbIdea, "idea"),
+    "tags": (DbTag, "tag"),
+}
+
+# Подзадачи окна деталей грузятся через selectinload, удалённые отсекаются в SQL
+TASK_DETAILS_OPTIONS = (
+    selectinload(DbTask.subtasks.and_(DbSubtask.is_deleted == False)),
+)
+
+
+async def load_task_details(session: AsyncSession, task_id: int) -> Optional[DbTask]:
+    """
+    Загружает задачу вместе со всеми связанными объектами для окна деталей.
+    Связи читаются через хранилище связей (парные таблицы или links) и кладутся в коллекции
+    задачи без отслеживания изменений. Число запросов постоянно: задача, подзадачи и по одному
+    на тип связи, независимо от количества связей.
+    """
+    task = await session.scalar(
+        select(DbTask)
+        .options(*TASK_DETAILS_OPTIONS)
+        .where(DbTask.id == task_id)
+        # задача могла попасть в identity map раньше с нефильтрованными коллекциями
+        .execution_options(populate_existing=True)
+    )
+    if task is None:
+        return None
+    for relation, (model, link_type) in TASK_LINKS.items():
+        items = (await session.scalars(
+            select(model)
+            .where(model.id.in_(link_store.linked_ids_query("task", task_id, link_type)), model.is_deleted == False)
+            .order_by(model.id)
+        )).all()
+        set_committed_value(task, relation, list(items))
+    return task
+
+
+TASKS_PAGE_SIZE = 8
+
+
+async def fetch_tasks_page(
+    session: AsyncSession, user_id: int, before_id: Optional[int], limit: int = TASKS_PAGE_SIZE
+) -> Tuple[Sequence[Row], bool]:
+    """
+    Keyset-пагинация списка задач по id DESC: страница начинается с задач, чей id меньше before_id.
+    Берём на одну строку больше, чтобы узнать, есть ли следующая страница, без COUNT(*).
+    """
+    stmt = select(DbTask.id, DbTask.name, DbTask.status).where(DbTask.user_id == user_id, DbTask.is_deleted == False)
+    if before_id is not None:
+        stmt = stmt.where(DbTask.id < before_id)
+    tasks = (await session.execute(stmt.order_by(DbTask.id.desc()).limit(limit + 1))).all()
+    return tasks[:limit], len(tasks) > limit
+
+
+async def user_has_tasks(session: AsyncSession, user_id: int) -> bool:
+    return await session.scalar(
+        select(exists().where(DbTask.user_id == user_id, DbTask.is_deleted == False))
+    )
+
+
+# Строки для списков и multiselect: только нужные колонки, без ORM-сущностей и identity map.
+# Row — компактный именованный кортеж, шаблоны обращаются к нему как к объекту (item.id, item.name)
+
+async def fetch_rows(session: AsyncSession, *columns, where=(), order_by=()) -> Sequence[Row]:
+    return (await session.execute(select(*columns).where(*where).order_by(*order_by))).all()
+
+
+async def fetch_active_rows(session: AsyncSession, model, user_id: int, *columns) -> Sequence[Row]:
+    """
+    Неудалённые объекты пользователя, по умолчанию только (id, name), в порядке id.
+    """
+    return await fetch_rows(
+        session,
+        *(columns or (model.id, model.name)),
+        where=(model.user_id == user_id, model.is_deleted == False),
+        order_by=(model.id,),
+    )
+
+
+async def fetch_linked_ids(session: AsyncSession, task_id: int, relation: str) -> List[int]:
+    """
+    id объектов, связанных с задачей, прямо из хранилища связей.
+    """
+    return await link_store.get_linked_ids(session, "task", task_id, TASK_LINKS[relation][1])
+
+
+SEARCH_PAGE_SIZE = 8
+
+# Типы объектов, по которым ищет /search
+SEARCHABLE_MODELS = {
+    "task": DbTask,
+    "subtask": DbSubtask,
+    "event": DbEvent,
+    "goal": DbGoal,
+    "idea": DbIdea,
+    "note": DbNote,
+}
+
+
+async def search_entities(
+    session: AsyncSession, user_id: int, query: str, offset: int = 0, limit: int = SEARCH_PAGE_SIZE
+) -> Tuple[Sequence[Row], bool]:
+    """
+    Полнотекстовый поиск по всем типам объектов пользователя, по убыванию ts_rank_cd.
+    Строки: kind, id, name, task_id (задача подзадачи, для остальных NULL), rank.
+    Каждая ветка UNION ALL отдаёт только свои лучшие offset + limit + 1 совпадений,
+    поэтому общая сортировка идёт по небольшому числу строк.
+    """
+    tsquery = func.websearch_to_tsquery("russian", query)
+    branches = []
+    for kind, model in SEARCHABLE_MODELS.items():
+        rank = func.ts_rank_cd(model.search_vector, tsquery)
+        task_id = DbSubtask.task_id if model is DbSubtask else cast(null(), Integer)
+        stmt = select(
+            literal(kind).label("kind"), model.id, model.name, task_id.label("task_id"), rank.label("rank")
+        )
+        if model is DbSubtask:
+            stmt = stmt.join(DbTask, DbTask.id == DbSubtask.task_id).where(
+                DbTask.user_id == user_id, DbTask.is_deleted == False
+            )
+        else:
+            stmt = stmt.where(model.user_id == user_id)
+        branches.append(
+            stmt.where(model.is_deleted == False, model.search_vector.bool_op("@@")(tsquery))
+            .order_by(rank.desc(), model.id.desc())
+            .limit(offset + limit + 1)
+        )
+    results = union_all(*branches).subquery()
+    rows = (await session.execute(
+        select(results)
+        .order_by(results.c.rank.desc(), results.c.kind, results.c.id.desc())
+        .offset(offset)
+        .limit(limit + 1)
+    )).all()
+    return rows[:limit], len(rows) > limit
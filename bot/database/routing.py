@@ -0,0 +1,76 @@
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+from utils.cache import LRUCache
+from utils.logger import db_logger
+
+
+class WriterSession(Session):
+    """
+    Sync-класс сессий основной (primary) базы. Отдельный класс нужен, чтобы слушать
+    after_commit только у пишущих сессий.
+    """
+
+
+class ReadYourWritesTracker:
+    """
+    Запоминает пользователей, которые недавно закоммитили изменения. Пока окно не истекло,
+    их чтения идут в primary, чтобы не увидеть отстающую реплику.
+    """
+    def __init__(self, window: float, maxsize: int = 100_000):
+        self._recent_writes = LRUCache(maxsize=maxsize, ttl=window)
+
+    def mark_write(self, tg_id: int) -> None:
+        self._recent_writes.set(tg_id, True)
+
+    def is_pinned(self, tg_id: int) -> bool:
+        return self._recent_writes.get(tg_id, False)
+
+
+def track_writes(tracker: ReadYourWritesTracker) -> None:
+    """
+    Каждый commit пишущей сессии пинит её пользователя (session.info["tg_id"]) к primary.
+    """
+    @event.listens_for(WriterSession, "after_commit")
+    def on_commit(session: Session) -> None:
+        tg_id = session.info.get("tg_id")
+        if tg_id is not None:
+            tracker.mark_write(tg_id)
+
+
+class SessionRouter:
+    """
+    Выдаёт сессии для текущего апдейта: writer() — всегда primary, reader() — реплика,
+    если пользователь не писал в последние несколько секунд, иначе та же primary-сессия.
+    Сессия реплики создаётся только при первом обращении.
+    """
+    __slots__ = ("_writer", "_read_factory", "_tracker", "_tg_id", "_reader")
+
+    def __init__(
+        self,
+        writer: AsyncSession,
+        read_factory: Optional[async_sessionmaker[AsyncSession]],
+        tracker: ReadYourWritesTracker,
+        tg_id: int,
+    ):
+        self._writer = writer
+        self._read_factory = read_factory
+        self._tracker = tracker
+        self._tg_id = tg_id
+        self._reader: Optional[AsyncSession] = None
+
+    def writer(self) -> AsyncSession:
+        return self._writer
+
+    def reader(self) -> AsyncSession:
+        if self._read_factory is None or self._tracker.is_pinned(self._tg_id):
+            return self._writer
+        if self._reader is None:
+            self._reader = self._read_factory()
+            db_logger.debug(f"Routing reads of user {self._tg_id} to replica")
+        return self._reader
+
+    async def close(self) -> None:
+        if self._reader is not None:
+            await self._reader.close()
@@ -0,0 +1,99 @@
+from aiogram_dialog import Dialog, DialogManager, Window
+from aiogram_dialog.widgets.text import Const, Format
+from aiogram_dialog.widgets.kbd import (
+    Row,
+    Column,
+    Select,
+    Cancel,
+    StubScroll,
+    PrevPage,
+    CurrentPage,
+    NextPage,
+)
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import CallbackQuery
+from aiogram_dialog.widgets.common import ManagedWidget
+from magic_filter import F
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.queries import SEARCH_PAGE_SIZE, SEARCHABLE_MODELS, fetch_rows, search_entities
+from dialogs.tasks_dialog import KIND_ICONS, TasksStates
+from middlewares.db_session import CachedUser
+from utils.logger import tasks_logger
+
+
+class SearchStates(StatesGroup):
+    RESULTS = State()
+
+
+async def get_search_data(dialog_manager: DialogManager, **kwargs) -> dict:
+    db_session: AsyncSession = kwargs["db_router"].reader()
+    db_user: CachedUser = await kwargs["db_user"].resolve()
+    query = dialog_manager.start_data["query"]
+    scroll = dialog_manager.find("scroll_search")
+    page = await scroll.get_page()
+    results, has_next = await search_entities(db_session, db_user.id, query, offset=page * SEARCH_PAGE_SIZE)
+    tasks_logger.info(f"Search '{query}' page {page}: {len(results)} results for user {db_user.tg_id}")
+    return {
+        "query": query,
+        # id кнопки: вид:id:id задачи (последнее только у подзадач)
+        "results": [
+            {"key": f"{item.kind}:{item.id}:{item.task_id or ''}", "info": f"{KIND_ICONS[item.kind]} {item.name}"}
+            for item in results
+        ],
+        "found": bool(results),
+        "pages": page + 2 if has_next else page + 1,
+    }
+
+
+async def on_result_selected(
+    callback: CallbackQuery, widget: ManagedWidget, manager: DialogManager, item_id: str
+) -> None:
+    kind, entity_id, task_id = item_id.split(":")
+    tasks_logger.info(f"Search result selected: {kind} {entity_id}")
+    if kind == "task":
+        await manager.start(TasksStates.TASK_DETAILS, data={"task_id": int(entity_id)})
+    elif kind == "subtask":
+        await manager.start(
+            TasksStates.SUBTASK_DETAILS, data={"task_id": int(task_id), "subtask_id": int(entity_id)}
+        )
+    else:
+        # Для событий, целей, идей и заметок отдельных диалогов пока нет — показываем карточку
+        model = SEARCHABLE_MODELS[kind]
+        db_session: AsyncSession = manager.middleware_data["db_router"].reader()
+        rows = await fetch_rows(db_session, model.name, model.description, where=(model.id == int(entity_id),))
+        if not rows:
+            await callback.answer("Объект не найден")
+            return
+        text = f"{KIND_ICONS[kind]} {rows[0].name}"
+        if rows[0].description:
+            text += f"\n\n{rows[0].description}"
+        # Текст всплывающего уведомления ограничен 200 символами
+        await callback.answer(text if len(text) <= 200 else text[:199] + "…", show_alert=True)
+
+
+search_dialog = Dialog(
+    Window(
+        Format("🔎 Результаты поиска: {query}"),
+        Const("Ничего не найдено", when=~F["found"]),
+        Column(
+            Select(
+                Format("{item[info]}"),
+                id="select_result",
+                item_id_getter=lambda x: x["key"],
+                items="results",
+                on_click=on_result_selected,
+                when="found",
+            ),
+        ),
+        StubScroll(id="scroll_search", pages="pages"),
+        Row(
+            PrevPage(scroll="scroll_search"),
+            CurrentPage(scroll="scroll_search"),
+            NextPage(scroll="scroll_search"),
+            when=F["pages"] > 1,
+        ),
+        Cancel(Const("🔙 Закрыть")),
+        state=SearchStates.RESULTS,
+        getter=get_search_data,
+    ),
+)
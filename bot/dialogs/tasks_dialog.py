@@ -13,13 +13,36 @@ from aiogram_dialog.widgets.kbd import (
     Checkbox,
     SwitchTo,
     Multiselect,
+    StubScroll,
+    PrevPage,
+    CurrentPage,
+    NextPage,
 )
 from aiogram_dialog.widgets.input import MessageInput, TextInput, ManagedTextInput
 from aiogram_dialog.widgets.kbd import Keyboard
 from aiogram.types import Message
 
-from sqlalchemy.orm import Session
-from database.models import DbTask, TaskStatus, DbUser, DbSubtask, DbEvent, DbNote, DbGoal, DbIdea, DbTag
+from sqlalchemy.engine import Row as SaRow
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.models import DbTask, TaskStatus, DbSubtask
+from database.queries import (
+    load_task_details,
+    fetch_tasks_page,
+    fetch_rows,
+    fetch_active_rows,
+    fetch_linked_ids,
+    TASK_LINKS,
+    SEARCHABLE_MODELS,
+)
+from database.changes import mark_task_changed, mark_user_changed
+from database.loader import RowLoader
+from services.related import RELATED_DEFAULT_DEPTH, RELATED_MAX_DEPTH, get_related
+from services.link_edits import LinkEditBuffer
+from services.write_behind import WriteBehindQueue, Write, apply_overlay
+from services import bulk_tasks
+from middlewares.db_session import CachedUser
+from utils.cache import LRUCache, Versions
+from environs import Env
 from datetime import datetime
 from aiogram.fsm.state import State, StatesGroup
 from utils.logger import tasks_logger
@@ -27,12 +50,19 @@ from pprint import pprint
 from aiogram.types import CallbackQuery
 from aiogram_dialog.widgets.common import ManagedWidget
 from magic_filter import F
+import asyncio
 import enum
+from typing import Any, Dict, Hashable, Optional, Sequence, Tuple
+
+
+env = Env()
+env.read_env()
 
 
 class TaskMode(enum.Enum):
     EDIT = "Режим: ✏️ Редактирование"
     CHANGE_STATUS = "Режим: 📊 Изменение статуса"
+    BULK = "Режим: ☑️ Массовые действия"
 
 
 class SubtaskMode(enum.Enum):
@@ -40,51 +70,63 @@ class SubtaskMode(enum.Enum):
     CHANGE_STATUS = "Режим: 📊 Изменение статуса"
 
 
+KIND_ICONS = {
+    "task": "📋",
+    "subtask": "☑️",
+    "event": "📅",
+    "goal": "🎯",
+    "idea": "💡",
+    "note": "🗒️",
+}
+
+
 def get_task_text(task: DbTask) -> str:
     """
-    Format("🔹 {current_task.name}"),
-    Format("📝 Описание: {current_task.description}"),
-    Format("🔍 Статус: {current_task.status.value}"),
-    Const("🧩 Подзадачи:", when="has_subtasks"),
-    List(
-        field= Format("• {item}"),
-        items="text_for_subtasks"
-    ),
-    Format("🕒 Срок: {current_task.deadline}"),
-    Format("🏷️ Теги: {current_task.tag}"),
+    Текст окна задачи: поля, теги, подзадачи и связанные события, заметки, цели и идеи.
     """
-    text = f"🔹 {task.name}\n"
+    lines = [f"🔹 {task.name}"]
     if task.description:
-        text += f"📝 Описание: {task.description}\n"
-    text += f"🔍 Статус: {task.status.value}\n"
+        lines.append(f"📝 Описание: {task.description}")
+    lines.append(f"🔍 Статус: {task.status.value}")
     if task.deadline:
-        text += f"🕒 Срок: {task.deadline}\n"
+        lines.append(f"🕒 Срок: {task.deadline}")
     if task.tags:
-        text += f"🏷️ Теги: {', '.join([tag.name for tag in task.tags])}\n"
-    if task.subtasks and len(task.subtasks) > 0:
-        text += f"🧩 Подзадачи:\n"
-        for subtask in task.subtasks:
-            text += f"• {subtask.name} {'✅' if subtask.is_done else '⬜'}\n"
+        lines.append(f"🏷️ Теги: {', '.join(tag.name for tag in task.tags)}")
+    if task.subtasks:
+        lines.append("🧩 Подзадачи:")
+        lines.extend(f"• {subtask.name} {'✅' if subtask.is_done else '⬜'}" for subtask in task.subtasks)
     # Connected events, notes, goals, ideas
-    if task.events and len(task.events) > 0:
-        events_text = "\n".join([f"• {event.name}" for event in task.events])
-        text += f"🔗 Связанные события 📅:\n {events_text}\n"
-    if task.notes and len(task.notes) > 0:
-        notes_text = "\n".join([f"• {note.name}" for note in task.notes])
-        text += (
-            f"🔗 Связанные заметки 🗒️:\n {notes_text}\n"
-        )
-    if task.goals and len(task.goals) > 0:
-        goals_text = "\n".join([f"• {goal.name}" for goal in task.goals])
-        text += (
-            f"🔗 Связанные цели 🎯:\n {goals_text}\n"
-        )
-    if task.ideas and len(task.ideas) > 0:
-        ideas_text = "\n".join([f"• {idea.name}" for idea in task.ideas])
-        text += (
-            f"🔗 Связанные идеи 💡:\n {ideas_text}\n"
-        )
-    return text
+    for title, items in (
+        ("🔗 Связанные события 📅:", task.events),
+        ("🔗 Связанные заметки 🗒️:", task.notes),
+        ("🔗 Связанные цели 🎯:", task.goals),
+        ("🔗 Связанные идеи 💡:", task.ideas),
+    ):
+        if items:
+            lines.append(title)
+            lines.append(" " + "\n".join(f"• {item.name}" for item in items))
+    return "\n".join(lines) + "\n"
+
+
+# Кэш текста окна задачи по (task_id, версия задачи, версия пользователя). Версию задачи
+# повышает любое изменение её полей, подзадач и связей (mark_task_changed), версию
+# пользователя — изменения его объектов, например переименование связанного события
+# (mark_user_changed). Пока версии не менялись, окно рисуется без запросов к БД.
+# Версии живут в процессе; TTL — страховка от изменений, сделанных в обход бота
+task_versions = Versions(maxsize=env.int("TASK_TEXT_CACHE_SIZE", 5000) * 2)
+user_versions = Versions(maxsize=env.int("USER_CACHE_SIZE", 10000))
+task_text_cache = LRUCache(
+    maxsize=env.int("TASK_TEXT_CACHE_SIZE", 5000),
+    ttl=env.int("TASK_TEXT_CACHE_TTL", 3600),
+    name="task_text",
+)
+
+# Отметки в окнах связей пишутся одной транзакцией при уходе из окна или после паузы
+link_edits = LinkEditBuffer(delay=env.float("LINK_EDIT_FLUSH_DELAY", 10))
+# Статусы задач и подзадач из кнопок: с WRITE_BEHIND ответ сразу, запись — пачкой в фоне
+write_behind = WriteBehindQueue(
+    env.bool("WRITE_BEHIND", False), env.float("WRITE_BEHIND_DELAY", 0.5), env.int("WRITE_BEHIND_MAX_BATCH", 50)
+)
 
 
 # States
@@ -105,43 +147,86 @@ class TasksStates(StatesGroup):
     ADD_SUBTASK = State()
 
     DELETE_TASK = State()
+
+    RELATED = State()
+
+    BULK_STATUS = State()
+    BULK_DEADLINE = State()
+    BULK_TAG = State()
+    BULK_DELETE = State()
     # Новые состояния для управления подзадачами
     SUBTASKS_LIST = State()
     SUBTASK_DETAILS = State()
     CHANGE_SUBTASK_NAME = State()
+    CHANGE_SUBTASK_DEADLINE = State()
     DELETE_SUBTASK = State()
 
 
+async def on_tasks_dialog_start(start_data, manager: DialogManager) -> None:
+    """Переход по ссылке (например, из /search): сразу открываем задачу или подзадачу"""
+    if not isinstance(start_data, dict):
+        return
+    if "task_id" in start_data:
+        manager.dialog_data["selected_task_id"] = start_data["task_id"]
+    if "subtask_id" in start_data:
+        manager.dialog_data["selected_subtask_id"] = start_data["subtask_id"]
+
+
 # Data getters
 async def get_tasks_data(dialog_manager: DialogManager, **kwargs) -> dict:
-    db_session: Session = kwargs["db_session"]
-    db_user: DbUser = kwargs["db_user"]
-    tasks = (
-        db_session.query(DbTask)
-        .filter(DbTask.user_id == db_user.id, DbTask.is_deleted == False)
-        .order_by(DbTask.id.desc())
-        .all()
-    )
+    db_session: AsyncSession = kwargs["db_router"].reader()
+    db_user: CachedUser = await kwargs["db_user"].resolve()
+    scroll = dialog_manager.find("scroll_tasks")
+    page = await scroll.get_page()
+    # cursors[i] — id последней задачи перед страницей i (None для первой страницы)
+    cursors = dialog_manager.dialog_data.setdefault("tasks_page_cursors", [None])
+    page = min(page, len(cursors) - 1)
+    tasks, has_next = await fetch_tasks_page(db_session, db_user.id, cursors[page])
+    while not tasks and page > 0:
+        # Задачи последней страницы удалены — показываем предыдущую
+        page -= 1
+        tasks, has_next = await fetch_tasks_page(db_session, db_user.id, cursors[page])
+    await scroll.set_page(page)
+    tasks = apply_overlay(tasks, write_behind.overlay(db_user.id), "task_status", "status")
+    del cursors[page + 1:]
+    if has_next:
+        cursors.append(tasks[-1].id)
     dialog_manager.dialog_data["mode"] = dialog_manager.dialog_data.get(
         "mode", TaskMode.CHANGE_STATUS.value
     )
-    tasks_logger.info(f"Retrieved {len(tasks)} tasks for user {db_user.tg_id}")
+    tasks_logger.info(f"Retrieved page {page} ({len(tasks)} tasks) for user {db_user.tg_id}")
+    # Id задач текущей страницы — для кнопки «выбрать всю страницу»
+    dialog_manager.dialog_data["tasks_page_ids"] = [task.id for task in tasks]
+    # Показанные статусы — от них отсчитывается следующий статус при отложенной записи
+    dialog_manager.dialog_data["tasks_page_statuses"] = {str(task.id): task.status.name for task in tasks}
+    bulk = dialog_manager.find("bulk_tasks")
+    if dialog_manager.dialog_data.pop("bulk_reset", False):
+        await bulk.reset_checked()
     return {
         "tasks": tasks,
+        "pages": page + 2 if has_next else page + 1,
         "mode": dialog_manager.dialog_data.get("mode", TaskMode.CHANGE_STATUS.value),
+        "bulk": dialog_manager.dialog_data["mode"] == TaskMode.BULK.value,
+        "selected_count": len(bulk.get_checked()),
     }
 
 
-
+async def get_bulk_data(dialog_manager: DialogManager, **kwargs) -> dict:
+    """Окна массовых действий: число выбранных задач и теги пользователя"""
+    data = {"selected_count": len(dialog_manager.dialog_data.get("bulk_task_ids", []))}
+    if dialog_manager.current_context().state == TasksStates.BULK_TAG:
+        db_user: CachedUser = await kwargs["db_user"].resolve()
+        data["all_tags"] = await fetch_active_rows(kwargs["db_router"].reader(), TASK_LINKS["tags"][0], db_user.id)
+    return data
 
 
 async def get_current_task_data(dialog_manager: DialogManager, **kwargs) -> dict:
-    db_session: Session = kwargs["db_session"]
+    db_session: AsyncSession = kwargs["db_router"].reader()
     task_id = dialog_manager.dialog_data.get("selected_task_id")
     if not task_id:
         tasks_logger.warning("No selected_task_id in dialog_data")
         return {"current_task": None}
-    task = db_session.query(DbTask).filter(DbTask.id == task_id).first()
+    task = await load_task_details(db_session, task_id)
     if not task:
         tasks_logger.warning(f"Task with id {task_id} not found")
         return {"current_task": None}
@@ -153,32 +238,66 @@ async def get_current_task_data(dialog_manager: DialogManager, **kwargs) -> dict
     }
 
 
+async def get_task_details_data(dialog_manager: DialogManager, **kwargs) -> dict:
+    """Окно задачи: текст из кэша, пока версия задачи не изменилась"""
+    # Правки связей, оставшиеся в состоянии диалога (например, после перезапуска бота
+    # с постоянным хранилищем FSM)
+    await flush_link_edits(dialog_manager)
+    task_id = dialog_manager.dialog_data.get("selected_task_id")
+    db_user: CachedUser = await kwargs["db_user"].resolve()
+    # Текст кэшируется по версиям из БД, поэтому отложенные изменения сначала записываются
+    await write_behind.flush_user(db_user.id)
+    # Версии берутся до загрузки: если задачу изменят во время запроса, результат
+    # ляжет под старую версию и не будет показан
+    key = (task_id, task_versions.get(task_id), user_versions.get(db_user.id))
+    task_text = task_text_cache.get(key)
+    if task_text is None:
+        data = await get_current_task_data(dialog_manager, **kwargs)
+        if not data["current_task"]:
+            return data
+        task_text = data["task_text"]
+        task_text_cache.set(key, task_text)
+    return {"task_text": task_text}
+
+
+async def _get_linked_items_data(
+    dialog_manager: DialogManager, kwargs: dict, relation: str, widget_id: str
+) -> Tuple[Sequence[SaRow], list[int], Optional[SaRow]]:
+    """
+    Общий геттер окон связей задачи: все объекты пользователя данного типа (id, name),
+    id уже связанных объектов и строка текущей задачи. При первом показе окна для задачи
+    отмечает связанные объекты в multiselect.
+    """
+    db_session: AsyncSession = kwargs["db_router"].reader()
+    db_user: CachedUser = await kwargs["db_user"].resolve()
+    task_id = dialog_manager.dialog_data.get("selected_task_id")
+    model = TASK_LINKS[relation][0]
+
+    all_items = await fetch_active_rows(db_session, model, db_user.id)
+    current_task = await kwargs["db_loader"].load("task", task_id)
+
+    # Устанавливаем начальное состояние multiselect (заново, если выбрана другая задача).
+    # Дальше источник правды — сам виджет: в нём могут быть ещё не записанные отметки
+    checked_key = f"{relation}_checked_for_task"
+    widget = dialog_manager.find(widget_id)
+    if dialog_manager.dialog_data.get(checked_key) != task_id:
+        selected_ids = await fetch_linked_ids(db_session, task_id, relation) if current_task else []
+        if widget:
+            await widget.reset_checked()
+            for item_id in selected_ids:
+                await widget.set_checked(str(item_id), True)
+        dialog_manager.dialog_data[checked_key] = task_id
+    else:
+        selected_ids = [int(item_id) for item_id in widget.get_checked()] if widget else []
+
+    return all_items, selected_ids, current_task
+
+
 async def get_events_data(dialog_manager: DialogManager, **kwargs) -> dict:
     """Получение данных для управления связанными событиями"""
-    db_session: Session = kwargs["db_session"]
-    db_user: DbUser = kwargs["db_user"]
-    task_id = dialog_manager.dialog_data.get("selected_task_id")
-    
-    # Получаем все события пользователя
-    all_events = (
-        db_session.query(DbEvent)
-        .filter(DbEvent.user_id == db_user.id, DbEvent.is_deleted == False)
-        .order_by(DbEvent.id)
-        .all()
+    all_events, selected_event_ids, current_task = await _get_linked_items_data(
+        dialog_manager, kwargs, "events", "task_select_events"
     )
-    
-    # Получаем текущую задачу для определения уже связанных событий
-    current_task = db_session.query(DbTask).filter(DbTask.id == task_id).first()
-    selected_event_ids = [event.id for event in current_task.events] if current_task else []
-    
-    # Устанавливаем начальное состояние multiselect
-    if not dialog_manager.dialog_data.get("events_checked_set"):
-        events_widget = dialog_manager.dialog().find("select_events")
-        if events_widget:
-            for event_id in selected_event_ids:
-                events_widget.set_checked(dialog_manager, str(event_id), True)
-        dialog_manager.dialog_data["events_checked_set"] = True
-    
     return {
         "all_events": all_events,
         "selected_event_ids": selected_event_ids,
@@ -188,30 +307,9 @@ async def get_events_data(dialog_manager: DialogManager, **kwargs) -> dict:
 
 async def get_notes_data(dialog_manager: DialogManager, **kwargs) -> dict:
     """Получение данных для управления связанными заметками"""
-    db_session: Session = kwargs["db_session"]
-    db_user: DbUser = kwargs["db_user"]
-    task_id = dialog_manager.dialog_data.get("selected_task_id")
-    
-    # Получаем все заметки пользователя
-    all_notes = (
-        db_session.query(DbNote)
-        .filter(DbNote.user_id == db_user.id, DbNote.is_deleted == False)
-        .order_by(DbNote.id)
-        .all()
+    all_notes, selected_note_ids, current_task = await _get_linked_items_data(
+        dialog_manager, kwargs, "notes", "select_notes"
     )
-    
-    # Получаем текущую задачу для определения уже связанных заметок
-    current_task = db_session.query(DbTask).filter(DbTask.id == task_id).first()
-    selected_note_ids = [note.id for note in current_task.notes] if current_task else []
-    
-    # Устанавливаем начальное состояние multiselect
-    if not dialog_manager.dialog_data.get("notes_checked_set"):
-        notes_widget = dialog_manager.dialog().find("select_notes")
-        if notes_widget:
-            for note_id in selected_note_ids:
-                notes_widget.set_checked(dialog_manager, str(note_id), True)
-        dialog_manager.dialog_data["notes_checked_set"] = True
-    
     return {
         "all_notes": all_notes,
         "selected_note_ids": selected_note_ids,
@@ -221,30 +319,9 @@ async def get_notes_data(dialog_manager: DialogManager, **kwargs) -> dict:
 
 async def get_goals_data(dialog_manager: DialogManager, **kwargs) -> dict:
     """Получение данных для управления связанными целями"""
-    db_session: Session = kwargs["db_session"]
-    db_user: DbUser = kwargs["db_user"]
-    task_id = dialog_manager.dialog_data.get("selected_task_id")
-    
-    # Получаем все цели пользователя
-    all_goals = (
-        db_session.query(DbGoal)
-        .filter(DbGoal.user_id == db_user.id, DbGoal.is_deleted == False)
-        .order_by(DbGoal.id)
-        .all()
+    all_goals, selected_goal_ids, current_task = await _get_linked_items_data(
+        dialog_manager, kwargs, "goals", "select_goals"
     )
-    
-    # Получаем текущую задачу для определения уже связанных целей
-    current_task = db_session.query(DbTask).filter(DbTask.id == task_id).first()
-    selected_goal_ids = [goal.id for goal in current_task.goals] if current_task else []
-    
-    # Устанавливаем начальное состояние multiselect
-    if not dialog_manager.dialog_data.get("goals_checked_set"):
-        goals_widget = dialog_manager.dialog().find("select_goals")
-        if goals_widget:
-            for goal_id in selected_goal_ids:
-                goals_widget.set_checked(dialog_manager, str(goal_id), True)
-        dialog_manager.dialog_data["goals_checked_set"] = True
-    
     return {
         "all_goals": all_goals,
         "selected_goal_ids": selected_goal_ids,
@@ -254,30 +331,9 @@ async def get_goals_data(dialog_manager: DialogManager, **kwargs) -> dict:
 
 async def get_ideas_data(dialog_manager: DialogManager, **kwargs) -> dict:
     """Получение данных для управления связанными идеями"""
-    db_session: Session = kwargs["db_session"]
-    db_user: DbUser = kwargs["db_user"]
-    task_id = dialog_manager.dialog_data.get("selected_task_id")
-    
-    # Получаем все идеи пользователя
-    all_ideas = (
-        db_session.query(DbIdea)
-        .filter(DbIdea.user_id == db_user.id, DbIdea.is_deleted == False)
-        .order_by(DbIdea.id)
-        .all()
+    all_ideas, selected_idea_ids, current_task = await _get_linked_items_data(
+        dialog_manager, kwargs, "ideas", "select_ideas"
     )
-    
-    # Получаем текущую задачу для определения уже связанных идей
-    current_task = db_session.query(DbTask).filter(DbTask.id == task_id).first()
-    selected_idea_ids = [idea.id for idea in current_task.ideas] if current_task else []
-    
-    # Устанавливаем начальное состояние multiselect
-    if not dialog_manager.dialog_data.get("ideas_checked_set"):
-        ideas_widget = dialog_manager.dialog().find("select_ideas")
-        if ideas_widget:
-            for idea_id in selected_idea_ids:
-                ideas_widget.set_checked(dialog_manager, str(idea_id), True)
-        dialog_manager.dialog_data["ideas_checked_set"] = True
-    
     return {
         "all_ideas": all_ideas,
         "selected_idea_ids": selected_idea_ids,
@@ -287,30 +343,9 @@ async def get_ideas_data(dialog_manager: DialogManager, **kwargs) -> dict:
 
 async def get_tags_data(dialog_manager: DialogManager, **kwargs) -> dict:
     """Получение данных для управления связанными тегами"""
-    db_session: Session = kwargs["db_session"]
-    db_user: DbUser = kwargs["db_user"]
-    task_id = dialog_manager.dialog_data.get("selected_task_id")
-    
-    # Получаем все теги пользователя
-    all_tags = (
-        db_session.query(DbTag)
-        .filter(DbTag.user_id == db_user.id, DbTag.is_deleted == False)
-        .order_by(DbTag.id)
-        .all()
+    all_tags, selected_tag_ids, current_task = await _get_linked_items_data(
+        dialog_manager, kwargs, "tags", "select_tags"
     )
-    
-    # Получаем текущую задачу для определения уже связанных тегов
-    current_task = db_session.query(DbTask).filter(DbTask.id == task_id).first()
-    selected_tag_ids = [tag.id for tag in current_task.tags] if current_task else []
-    
-    # Устанавливаем начальное состояние multiselect
-    if not dialog_manager.dialog_data.get("tags_checked_set"):
-        tags_widget = dialog_manager.dialog().find("select_tags")
-        if tags_widget:
-            for tag_id in selected_tag_ids:
-                tags_widget.set_checked(dialog_manager, str(tag_id), True)
-        dialog_manager.dialog_data["tags_checked_set"] = True
-    
     return {
         "all_tags": all_tags,
         "selected_tag_ids": selected_tag_ids,
@@ -318,26 +353,26 @@ async def get_tags_data(dialog_manager: DialogManager, **kwargs) -> dict:
     }
 
 
-
-
-
 async def get_subtasks_list_data(dialog_manager: DialogManager, **kwargs) -> dict:
     """Получение данных для списка подзадач с режимами"""
-    db_session: Session = kwargs["db_session"]
+    db_session: AsyncSession = kwargs["db_router"].reader()
     task_id = dialog_manager.dialog_data.get("selected_task_id")
     
     # Получаем текущую задачу
-    current_task = db_session.query(DbTask).filter(DbTask.id == task_id).first()
+    current_task = await kwargs["db_loader"].load("task", task_id)
     if not current_task:
         return {"current_task": None, "subtasks": [], "mode": SubtaskMode.CHANGE_STATUS.value}
     
     # Получаем все подзадачи текущей задачи (не удаленные)
-    subtasks = (
-        db_session.query(DbSubtask)
-        .filter(DbSubtask.task_id == task_id, DbSubtask.is_deleted == False)
-        .order_by(DbSubtask.id)
-        .all()
+    subtasks = await fetch_rows(
+        db_session,
+        DbSubtask.id, DbSubtask.name, DbSubtask.is_done,
+        where=(DbSubtask.task_id == task_id, DbSubtask.is_deleted == False),
+        order_by=(DbSubtask.id,),
     )
+    db_user: CachedUser = await kwargs["db_user"].resolve()
+    subtasks = apply_overlay(subtasks, write_behind.overlay(db_user.id), "subtask_done", "is_done")
+    dialog_manager.dialog_data["subtasks_done"] = {str(item.id): item.is_done for item in subtasks}
     
     # Устанавливаем режим по умолчанию
     dialog_manager.dialog_data["subtask_mode"] = dialog_manager.dialog_data.get(
@@ -350,7 +385,6 @@ async def get_subtasks_list_data(dialog_manager: DialogManager, **kwargs) -> dic
         }
         for item in subtasks
     ]
-    print(subtasks_info)
     tasks_logger.info(f"Retrieved {len(subtasks)} subtasks for task {task_id}")
     return {
         "current_task": current_task,
@@ -361,7 +395,7 @@ async def get_subtasks_list_data(dialog_manager: DialogManager, **kwargs) -> dic
 
 async def get_current_subtask_data(dialog_manager: DialogManager, **kwargs) -> dict:
     """Получение данных текущей подзадачи"""
-    db_session: Session = kwargs["db_session"]
+    loader: RowLoader = kwargs["db_loader"]
     subtask_id = dialog_manager.dialog_data.get("selected_subtask_id")
     task_id = dialog_manager.dialog_data.get("selected_task_id")
     
@@ -369,32 +403,101 @@ async def get_current_subtask_data(dialog_manager: DialogManager, **kwargs) -> d
         tasks_logger.warning("No selected_subtask_id in dialog_data")
         return {"current_subtask": None, "current_task": None}
     
-    subtask = db_session.query(DbSubtask).filter(DbSubtask.id == subtask_id).first()
+    # Обе строки запрашиваются в одной итерации loop — загрузчик отправит их одной пачкой
+    subtask, current_task = await asyncio.gather(loader.load("subtask", subtask_id), loader.load("task", task_id))
     if not subtask:
         tasks_logger.warning(f"Subtask with id {subtask_id} not found")
         return {"current_subtask": None, "current_task": None}
-    
-    current_task = db_session.query(DbTask).filter(DbTask.id == task_id).first()
+    db_user: CachedUser = await kwargs["db_user"].resolve()
+    overlay = write_behind.overlay(db_user.id)
+    subtask = apply_overlay([subtask], overlay, "subtask_done", "is_done")[0]
+    if current_task:
+        current_task = apply_overlay([current_task], overlay, "task_status", "status")[0]
+    dialog_manager.dialog_data.setdefault("subtasks_done", {})[str(subtask.id)] = subtask.is_done
     
     tasks_logger.info(f"Retrieved subtask {subtask_id} for details window")
     return {
         "current_subtask": subtask,
         "current_task": current_task,
         "done_info": f"✅ Выполнена" if subtask.is_done else f"⬜ Не выполнена",
+        "deadline_info": subtask.deadline or "не задан",
+    }
+
+
+async def get_related_data(dialog_manager: DialogManager, **kwargs) -> dict:
+    """Объекты в пределах нескольких шагов по связям от текущей задачи"""
+    db_session: AsyncSession = kwargs["db_router"].reader()
+    db_user: CachedUser = await kwargs["db_user"].resolve()
+    task_id = dialog_manager.dialog_data.get("selected_task_id")
+    depth = dialog_manager.dialog_data.setdefault("related_depth", RELATED_DEFAULT_DEPTH)
+    current_task = await kwargs["db_loader"].load("task", task_id)
+    items = await get_related(db_session, db_user.id, "task", task_id, depth) if current_task else []
+    tasks_logger.info(f"Retrieved {len(items)} related items for task {task_id} (depth {depth})")
+    return {
+        "current_task": current_task,
+        "depth": depth,
+        "found": bool(items),
+        # Отступ показывает, через сколько связей объект достижим
+        "related": [
+            {"key": f"{item.type}:{item.id}", "info": f"{'· ' * (item.depth - 1)}{KIND_ICONS[item.type]} {item.name}"}
+            for item in items
+        ],
     }
 
 
+def _write_behind(
+    manager: DialogManager, callback: CallbackQuery, db_user: CachedUser, description: str,
+    write: Write, overlay: Dict[Hashable, Any],
+) -> None:
+    write_behind.submit(
+        manager.middleware_data["session_factory"], callback.bot, db_user.tg_id, db_user.id, description, write, overlay
+    )
+
+
+async def _toggle_subtask_behind(callback: CallbackQuery, manager: DialogManager, subtask_id: int) -> bool:
+    """Отложенное переключение подзадачи от показанного значения. False — писать сразу, как обычно."""
+    done = manager.dialog_data.get("subtasks_done", {})
+    if not write_behind.enabled or str(subtask_id) not in done:
+        return False
+    db_user: CachedUser = await manager.middleware_data["db_user"].resolve()
+    is_done = done[str(subtask_id)] = not done[str(subtask_id)]
+    await callback.answer(f"Подзадача теперь {'выполнена' if is_done else 'не выполнена'}")
+    _write_behind(
+        manager, callback, db_user, "отметка подзадачи",
+        lambda session: bulk_tasks.set_subtask_done(session, db_user.id, subtask_id, is_done),
+        {("subtask_done", subtask_id): is_done},
+    )
+    return True
+
+
 async def on_task_selected(
     callback: CallbackQuery, widget: ManagedWidget, manager: DialogManager, item_id: int
 ) -> None:
     manager.dialog_data["selected_task_id"] = item_id
     tasks_logger.info(f"Task selected: {item_id}")
-    db_session: Session = manager.middleware_data["db_session"]
+    db_session: AsyncSession = manager.middleware_data["db_session"]
     if manager.dialog_data["mode"] == TaskMode.CHANGE_STATUS.value:
-        db_current_task = db_session.query(DbTask).filter(DbTask.id == item_id).first()
-        db_current_task.status = TaskStatus(db_current_task.status).next()
-        db_session.commit()
-        await callback.answer(f"Статус обновлён: {db_current_task.status.value}")
+        db_user: CachedUser = await manager.middleware_data["db_user"].resolve()
+        statuses = manager.dialog_data.get("tasks_page_statuses", {})
+        if write_behind.enabled and str(item_id) in statuses:
+            # Следующий статус считаем от показанного и пишем абсолютное значение:
+            # очередь пользователя упорядочена, поэтому в БД окажется последний клик
+            new_status = TaskStatus[statuses[str(item_id)]].next()
+            statuses[str(item_id)] = new_status.name
+            await callback.answer(f"Статус обновлён: {new_status.value}")
+            _write_behind(
+                manager, callback, db_user, "статус задачи",
+                lambda session: bulk_tasks.set_task_status(session, db_user.id, item_id, new_status),
+                {("task_status", item_id): new_status},
+            )
+            return
+        # Один UPDATE ... RETURNING вместо SELECT + UPDATE
+        changed = await bulk_tasks.cycle_status(db_session, db_user.id, [item_id])
+        await db_session.commit()
+        if changed:
+            await callback.answer(f"Статус обновлён: {changed[0][1].value}")
+        else:
+            await callback.answer("Ошибка: задача не найдена", show_alert=True)
     else:
         await manager.switch_to(TasksStates.TASK_DETAILS)
 
@@ -404,11 +507,14 @@ async def on_subtask_selected(
 ) -> None:
     manager.dialog_data["selected_subtask_id"] = item_id
     tasks_logger.info(f"Subtask selected: {item_id}")
-    db_session: Session = manager.middleware_data["db_session"]
+    db_session: AsyncSession = manager.middleware_data["db_session"]
     if manager.dialog_data["subtask_mode"] == SubtaskMode.CHANGE_STATUS.value:
-        db_current_subtask = db_session.query(DbSubtask).filter(DbSubtask.id == item_id).first()
+        if await _toggle_subtask_behind(callback, manager, item_id):
+            return
+        db_current_subtask = await db_session.get(DbSubtask, item_id)
         db_current_subtask.is_done = not db_current_subtask.is_done
-        db_session.commit()
+        mark_task_changed(db_session, db_current_subtask.task_id)
+        await db_session.commit()
         status_text = "выполнена" if db_current_subtask.is_done else "не выполнена"
         await callback.answer(f"Подзадача теперь {status_text}")
     else:
@@ -425,11 +531,9 @@ async def on_add_task(
 async def on_task_mode_select(
     callback: CallbackQuery, widget: ManagedWidget, manager: DialogManager
 ) -> None:
-    manager.dialog_data["mode"] = (
-        TaskMode.CHANGE_STATUS.value
-        if manager.dialog_data["mode"] == TaskMode.EDIT.value
-        else TaskMode.EDIT.value
-    )
+    """Режимы по кругу: изменение статуса -> редактирование -> массовые действия"""
+    modes = [TaskMode.CHANGE_STATUS.value, TaskMode.EDIT.value, TaskMode.BULK.value]
+    manager.dialog_data["mode"] = modes[(modes.index(manager.dialog_data["mode"]) + 1) % len(modes)]
     tasks_logger.info(f"Task mode select button clicked: {manager.dialog_data['mode']}")
 
 
@@ -444,16 +548,87 @@ async def on_subtask_mode_select(
     tasks_logger.info(f"Subtask mode select button clicked: {manager.dialog_data['subtask_mode']}")
 
 
+# --- BULK ---
+async def on_bulk_select_page(
+    callback: CallbackQuery, widget: ManagedWidget, manager: DialogManager
+) -> None:
+    """Отметить все задачи текущей страницы"""
+    bulk = manager.find("bulk_tasks")
+    for task_id in manager.dialog_data.get("tasks_page_ids", []):
+        await bulk.set_checked(str(task_id), True)
+
+
+async def on_bulk_clear(
+    callback: CallbackQuery, widget: ManagedWidget, manager: DialogManager
+) -> None:
+    await manager.find("bulk_tasks").reset_checked()
+
+
+async def on_bulk_action_open(
+    callback: CallbackQuery, widget: ManagedWidget, manager: DialogManager
+) -> None:
+    """Переход к массовому действию: запоминаем отмеченные задачи (виджет есть только в окне списка)"""
+    manager.dialog_data["bulk_task_ids"] = [int(task_id) for task_id in manager.find("bulk_tasks").get_checked()]
+
+
+async def _apply_bulk(callback: CallbackQuery, manager: DialogManager, action, *args) -> None:
+    """
+    Применяет массовое действие к отмеченным задачам одной транзакцией,
+    снимает отметки и возвращает к списку задач.
+    """
+    db_session: AsyncSession = manager.middleware_data["db_session"]
+    db_user: CachedUser = await manager.middleware_data["db_user"].resolve()
+    # Отложенные клики по этим задачам были раньше — они не должны перезаписать результат
+    await write_behind.flush_user(db_user.id)
+    task_ids = manager.dialog_data.pop("bulk_task_ids", [])
+    changed = await action(db_session, db_user.id, task_ids, *args)
+    await db_session.commit()
+    manager.dialog_data["bulk_reset"] = True
+    tasks_logger.info(f"Bulk {action.__name__} for user {db_user.tg_id}: {changed} of {len(task_ids)} tasks")
+    await manager.switch_to(TasksStates.TASKS_LIST)
+    await callback.answer(f"Изменено задач: {changed} из {len(task_ids)}")
+
+
+async def on_bulk_status_selected(
+    callback: CallbackQuery, widget: Select, manager: DialogManager, item_id: str
+) -> None:
+    await _apply_bulk(callback, manager, bulk_tasks.set_status, TaskStatus[item_id])
+
+
+async def on_bulk_deadline_shift(
+    callback: CallbackQuery, widget: ManagedWidget, manager: DialogManager
+) -> None:
+    """Кнопки сдвига срока: id вида shift_7 / shift_minus_1"""
+    days = int(widget.widget_id.split("_")[-1])
+    if "minus" in widget.widget_id:
+        days = -days
+    await _apply_bulk(callback, manager, bulk_tasks.shift_deadline, days)
+
+
+async def on_bulk_tag_selected(
+    callback: CallbackQuery, widget: Select, manager: DialogManager, item_id: str
+) -> None:
+    await _apply_bulk(callback, manager, bulk_tasks.add_tag, int(item_id))
+
+
+async def on_bulk_delete_confirm(
+    callback: CallbackQuery, widget: ManagedWidget, manager: DialogManager
+) -> None:
+    await _apply_bulk(callback, manager, bulk_tasks.delete_tasks)
+
+
 # --- NAME ---
 async def on_change_task_name_success(
     message: Message, widget: ManagedTextInput, dialog_manager: DialogManager, text: str
 ) -> None:
     tasks_logger.info(f"Task name changed: {message.text}")
-    db_session: Session = dialog_manager.middleware_data["db_session"]
+    db_session: AsyncSession = dialog_manager.middleware_data["db_session"]
     task_id = dialog_manager.dialog_data["selected_task_id"]
-    db_current_task = db_session.query(DbTask).filter(DbTask.id == task_id).first()
+    db_current_task = await db_session.get(DbTask, task_id)
     db_current_task.name = text
-    db_session.commit()
+    mark_task_changed(db_session, task_id)
+    mark_user_changed(db_session, db_current_task.user_id)
+    await db_session.commit()
     await dialog_manager.switch_to(TasksStates.TASK_DETAILS)
 
 
@@ -478,11 +653,12 @@ async def on_change_task_description_success(
     message: Message, widget: ManagedTextInput, dialog_manager: DialogManager, text: str
 ) -> None:
     tasks_logger.info(f"Task description changed: {message.text}")
-    db_session: Session = dialog_manager.middleware_data["db_session"]
+    db_session: AsyncSession = dialog_manager.middleware_data["db_session"]
     task_id = dialog_manager.dialog_data["selected_task_id"]
-    db_current_task = db_session.query(DbTask).filter(DbTask.id == task_id).first()
+    db_current_task = await db_session.get(DbTask, task_id)
     db_current_task.description = text
-    db_session.commit()
+    mark_task_changed(db_session, task_id)
+    await db_session.commit()
     await dialog_manager.switch_to(TasksStates.TASK_DETAILS)
 
 
@@ -507,11 +683,12 @@ async def on_change_task_deadline_success(
     message: Message, widget: ManagedTextInput, dialog_manager: DialogManager, deadline: datetime
 ) -> None:
     tasks_logger.info(f"Task deadline changed: {message.text}")
-    db_session: Session = dialog_manager.middleware_data["db_session"]
+    db_session: AsyncSession = dialog_manager.middleware_data["db_session"]
     task_id = dialog_manager.dialog_data["selected_task_id"]
-    db_current_task = db_session.query(DbTask).filter(DbTask.id == task_id).first()
+    db_current_task = await db_session.get(DbTask, task_id)
     db_current_task.deadline = deadline
-    db_session.commit()
+    mark_task_changed(db_session, task_id)
+    await db_session.commit()
     await dialog_manager.switch_to(TasksStates.TASK_DETAILS)
 
 
@@ -539,9 +716,9 @@ async def on_change_task_status_success(
     message: Message, widget: ManagedTextInput, dialog_manager: DialogManager, text: str
 ) -> None:
     tasks_logger.info(f"Task status changed: {message.text}")
-    db_session: Session = dialog_manager.middleware_data["db_session"]
+    db_session: AsyncSession = dialog_manager.middleware_data["db_session"]
     task_id = dialog_manager.dialog_data["selected_task_id"]
-    db_current_task = db_session.query(DbTask).filter(DbTask.id == task_id).first()
+    db_current_task = await db_session.get(DbTask, task_id)
     # Поддерживаем только значения из TaskStatus
     status_map = {s.value: s for s in TaskStatus}
     if text not in status_map:
@@ -551,7 +728,8 @@ async def on_change_task_status_success(
         )
         return
     db_current_task.status = status_map[text]
-    db_session.commit()
+    mark_task_changed(db_session, task_id)
+    await db_session.commit()
     await dialog_manager.switch_to(TasksStates.TASK_DETAILS)
 
 
@@ -581,184 +759,139 @@ async def change_task_status(
     Handler for changing the status of a task via Select widget.
     item_id: TaskStatus.name (str)
     """
-    db_session: Session = manager.middleware_data["db_session"]
+    db_session: AsyncSession = manager.middleware_data["db_session"]
     task_id = manager.dialog_data["selected_task_id"]
-    db_current_task = db_session.query(DbTask).filter(DbTask.id == task_id).first()
+    new_status = TaskStatus[item_id]
+    if write_behind.enabled:
+        db_user: CachedUser = await manager.middleware_data["db_user"].resolve()
+        await callback.answer("Статус обновлён")
+        _write_behind(
+            manager, callback, db_user, "статус задачи",
+            lambda session: bulk_tasks.set_task_status(session, db_user.id, task_id, new_status),
+            {("task_status", task_id): new_status},
+        )
+        await manager.switch_to(TasksStates.TASK_DETAILS)
+        return
+    db_current_task = await db_session.get(DbTask, task_id)
     if not db_current_task:
         await callback.answer("Ошибка: задача не найдена в базе", show_alert=True)
         return
-    new_status = TaskStatus[item_id]
     tasks_logger.info(f"Changing task status to: {new_status}")
     db_current_task.status = new_status
-    db_session.commit()
+    mark_task_changed(db_session, task_id)
+    await db_session.commit()
     await manager.switch_to(TasksStates.TASK_DETAILS)
     await callback.answer("Статус обновлён")
 
 
+async def on_related_depth_click(
+    callback: CallbackQuery, widget: ManagedWidget, manager: DialogManager
+) -> None:
+    """Переключение глубины обхода связей: 1 -> 2 -> ... -> RELATED_MAX_DEPTH -> 1"""
+    depth = manager.dialog_data.get("related_depth", RELATED_DEFAULT_DEPTH)
+    manager.dialog_data["related_depth"] = depth % RELATED_MAX_DEPTH + 1
+
+
+async def on_related_selected(
+    callback: CallbackQuery, widget: ManagedWidget, manager: DialogManager, item_id: str
+) -> None:
+    """Связанная задача открывается в этом же диалоге, остальные объекты — карточкой"""
+    kind, entity_id = item_id.split(":")
+    tasks_logger.info(f"Related item selected: {kind} {entity_id}")
+    if kind == "task":
+        manager.dialog_data["selected_task_id"] = int(entity_id)
+        await manager.switch_to(TasksStates.TASK_DETAILS)
+        return
+    model = SEARCHABLE_MODELS[kind]
+    db_session: AsyncSession = manager.middleware_data["db_router"].reader()
+    rows = await fetch_rows(db_session, model.name, where=(model.id == int(entity_id),))
+    await callback.answer(f"{KIND_ICONS[kind]} {rows[0].name}" if rows else "Объект не найден", show_alert=True)
+
+
 # Обработчики multiselect виджетов
+async def _on_linked_selection_changed(
+    callback: CallbackQuery, widget: Multiselect, manager: DialogManager, relation: str
+) -> None:
+    """
+    Общий обработчик multiselect связей задачи. В БД ничего не пишет: отмеченный набор
+    сохраняется в dialog_data и в буфере link_edits, который запишет его после паузы.
+    Перезапуск бота до записи переживают только правки в dialog_data и только с постоянным
+    хранилищем FSM (FSM_STORAGE=redis или postgres); с memory они теряются.
+    """
+    db_user: CachedUser = await manager.middleware_data["db_user"].resolve()
+    task_id = manager.dialog_data["selected_task_id"]
+    link_type = TASK_LINKS[relation][1]
+    checked_ids = [int(item_id) for item_id in widget.get_checked()]
+    seq = link_edits.add(
+        manager.middleware_data["session_factory"], db_user.tg_id, db_user.id, task_id, link_type, checked_ids
+    )
+    manager.dialog_data.setdefault("pending_links", {})[f"{relation}:{task_id}"] = {
+        "task_id": task_id,
+        "relation": relation,
+        "ids": checked_ids,
+        "seq": seq,
+    }
+    tasks_logger.debug(f"Buffered {relation} for task {task_id}: {checked_ids}")
+
+
+async def flush_link_edits(manager: DialogManager) -> int:
+    """
+    Записывает накопленные в dialog_data правки связей одной транзакцией.
+    Правки, которые буфер уже записал по таймеру, пропускаются. Возвращает число изменённых строк.
+    """
+    pending = manager.dialog_data.pop("pending_links", None)
+    if not pending:
+        return 0
+    db_session: AsyncSession = manager.middleware_data["db_session"]
+    db_user: CachedUser = await manager.middleware_data["db_user"].resolve()
+    changed = await link_edits.write_edits(db_session, db_user.id, [
+        (edit["task_id"], TASK_LINKS[edit["relation"]][1], edit["ids"], edit["seq"]) for edit in pending.values()
+    ])
+    tasks_logger.info(f"Flushed {len(pending)} link edits for user {db_user.tg_id} ({changed} rows changed)")
+    return changed
+
+
+async def on_linked_window_leave(
+    callback: CallbackQuery, widget: ManagedWidget, manager: DialogManager
+) -> None:
+    """Кнопка «Назад» окон связей: записываем отметки до перехода к задаче"""
+    if await flush_link_edits(manager):
+        await callback.answer("Связи сохранены")
+
+
 async def on_events_selection_changed(
     callback: CallbackQuery, widget: Multiselect, manager: DialogManager, *_
 ) -> None:
     """Обработчик изменения выбора событий"""
-    db_session: Session = manager.middleware_data["db_session"]
-    task_id = manager.dialog_data["selected_task_id"]
-    
-    # Получаем текущую задачу
-    current_task = db_session.query(DbTask).filter(DbTask.id == task_id).first()
-    if not current_task:
-        await callback.answer("Ошибка: задача не найдена", show_alert=True)
-        return
-    
-    # Получаем выбранные события
-    selected_event_ids = widget.get_checked()
-    
-    # Очищаем текущие связи
-    current_task.events.clear()
-    
-    # Добавляем новые связи
-    if selected_event_ids:
-        selected_events = (
-            db_session.query(DbEvent)
-            .filter(DbEvent.id.in_(selected_event_ids))
-            .all()
-        )
-        current_task.events.extend(selected_events)
-    
-    db_session.commit()
-    tasks_logger.info(f"Updated events for task {task_id}: {selected_event_ids}")
-    await callback.answer("Связанные события обновлены")
+    await _on_linked_selection_changed(callback, widget, manager, "events")
 
 
 async def on_notes_selection_changed(
     callback: CallbackQuery, widget: Multiselect, manager: DialogManager, *_
 ) -> None:
     """Обработчик изменения выбора заметок"""
-    db_session: Session = manager.middleware_data["db_session"]
-    task_id = manager.dialog_data["selected_task_id"]
-    
-    # Получаем текущую задачу
-    current_task = db_session.query(DbTask).filter(DbTask.id == task_id).first()
-    if not current_task:
-        await callback.answer("Ошибка: задача не найдена", show_alert=True)
-        return
-    
-    # Получаем выбранные заметки
-    selected_note_ids = widget.get_checked()
-    
-    # Очищаем текущие связи
-    current_task.notes.clear()
-    
-    # Добавляем новые связи
-    if selected_note_ids:
-        selected_notes = (
-            db_session.query(DbNote)
-            .filter(DbNote.id.in_(selected_note_ids))
-            .all()
-        )
-        current_task.notes.extend(selected_notes)
-    
-    db_session.commit()
-    tasks_logger.info(f"Updated notes for task {task_id}: {selected_note_ids}")
-    await callback.answer("Связанные заметки обновлены")
+    await _on_linked_selection_changed(callback, widget, manager, "notes")
 
 
 async def on_goals_selection_changed(
     callback: CallbackQuery, widget: Multiselect, manager: DialogManager, *_
 ) -> None:
     """Обработчик изменения выбора целей"""
-    db_session: Session = manager.middleware_data["db_session"]
-    task_id = manager.dialog_data["selected_task_id"]
-    
-    # Получаем текущую задачу
-    current_task = db_session.query(DbTask).filter(DbTask.id == task_id).first()
-    if not current_task:
-        await callback.answer("Ошибка: задача не найдена", show_alert=True)
-        return
-    
-    # Получаем выбранные цели
-    selected_goal_ids = widget.get_checked()
-    
-    # Очищаем текущие связи
-    current_task.goals.clear()
-    
-    # Добавляем новые связи
-    if selected_goal_ids:
-        selected_goals = (
-            db_session.query(DbGoal)
-            .filter(DbGoal.id.in_(selected_goal_ids))
-            .all()
-        )
-        current_task.goals.extend(selected_goals)
-    
-    db_session.commit()
-    tasks_logger.info(f"Updated goals for task {task_id}: {selected_goal_ids}")
-    await callback.answer("Связанные цели обновлены")
+    await _on_linked_selection_changed(callback, widget, manager, "goals")
 
 
 async def on_ideas_selection_changed(
     callback: CallbackQuery, widget: Multiselect, manager: DialogManager, *_
 ) -> None:
     """Обработчик изменения выбора идей"""
-    db_session: Session = manager.middleware_data["db_session"]
-    task_id = manager.dialog_data["selected_task_id"]
-    
-    # Получаем текущую задачу
-    current_task = db_session.query(DbTask).filter(DbTask.id == task_id).first()
-    if not current_task:
-        await callback.answer("Ошибка: задача не найдена", show_alert=True)
-        return
-    
-    # Получаем выбранные идеи
-    selected_idea_ids = widget.get_checked()
-    
-    # Очищаем текущие связи
-    current_task.ideas.clear()
-    
-    # Добавляем новые связи
-    if selected_idea_ids:
-        selected_ideas = (
-            db_session.query(DbIdea)
-            .filter(DbIdea.id.in_(selected_idea_ids))
-            .all()
-        )
-        current_task.ideas.extend(selected_ideas)
-    
-    db_session.commit()
-    tasks_logger.info(f"Updated ideas for task {task_id}: {selected_idea_ids}")
-    await callback.answer("Связанные идеи обновлены")
+    await _on_linked_selection_changed(callback, widget, manager, "ideas")
 
 
 async def on_tags_selection_changed(
     callback: CallbackQuery, widget: Multiselect, manager: DialogManager, *_
 ) -> None:
     """Обработчик изменения выбора тегов"""
-    db_session: Session = manager.middleware_data["db_session"]
-    task_id = manager.dialog_data["selected_task_id"]
-    
-    # Получаем текущую задачу
-    current_task = db_session.query(DbTask).filter(DbTask.id == task_id).first()
-    if not current_task:
-        await callback.answer("Ошибка: задача не найдена", show_alert=True)
-        return
-    
-    # Получаем выбранные теги
-    selected_tag_ids = widget.get_checked()
-    
-    # Очищаем текущие связи
-    current_task.tags.clear()
-    
-    # Добавляем новые связи
-    if selected_tag_ids:
-        selected_tags = (
-            db_session.query(DbTag)
-            .filter(DbTag.id.in_(selected_tag_ids))
-            .all()
-        )
-        current_task.tags.extend(selected_tags)
-    
-    db_session.commit()
-    tasks_logger.info(f"Updated tags for task {task_id}: {selected_tag_ids}")
-    await callback.answer("Связанные теги обновлены")
+    await _on_linked_selection_changed(callback, widget, manager, "tags")
 
 
 async def on_add_subtask_button(
@@ -773,7 +906,7 @@ async def on_add_subtask_success(
     message: Message, widget: ManagedTextInput, dialog_manager: DialogManager, text: str
 ) -> None:
     """Успешное добавление новой подзадачи"""
-    db_session: Session = dialog_manager.middleware_data["db_session"]
+    db_session: AsyncSession = dialog_manager.middleware_data["db_session"]
     task_id = dialog_manager.dialog_data["selected_task_id"]
     
     # Создаем новую подзадачу
@@ -785,7 +918,8 @@ async def on_add_subtask_success(
     )
     
     db_session.add(new_subtask)
-    db_session.commit()
+    mark_task_changed(db_session, task_id)
+    await db_session.commit()
     
     tasks_logger.info(f"Added new subtask: {text} for task {task_id}")
     await dialog_manager.switch_to(TasksStates.SUBTASKS_LIST)
@@ -814,11 +948,12 @@ async def on_change_subtask_name_success(
     message: Message, widget: ManagedTextInput, dialog_manager: DialogManager, text: str
 ) -> None:
     tasks_logger.info(f"Subtask name changed: {message.text}")
-    db_session: Session = dialog_manager.middleware_data["db_session"]
+    db_session: AsyncSession = dialog_manager.middleware_data["db_session"]
     subtask_id = dialog_manager.dialog_data["selected_subtask_id"]
-    db_current_subtask = db_session.query(DbSubtask).filter(DbSubtask.id == subtask_id).first()
+    db_current_subtask = await db_session.get(DbSubtask, subtask_id)
     db_current_subtask.name = text
-    db_session.commit()
+    mark_task_changed(db_session, db_current_subtask.task_id)
+    await db_session.commit()
     await dialog_manager.switch_to(TasksStates.SUBTASK_DETAILS)
 
 
@@ -838,6 +973,20 @@ def on_change_subtask_name_type_factory(text: str) -> str:
     return text
 
 
+# --- SUBTASK DEADLINE ---
+async def on_change_subtask_deadline_success(
+    message: Message, widget: ManagedTextInput, dialog_manager: DialogManager, deadline: datetime
+) -> None:
+    tasks_logger.info(f"Subtask deadline changed: {message.text}")
+    db_session: AsyncSession = dialog_manager.middleware_data["db_session"]
+    subtask_id = dialog_manager.dialog_data["selected_subtask_id"]
+    db_current_subtask = await db_session.get(DbSubtask, subtask_id)
+    db_current_subtask.deadline = deadline
+    mark_task_changed(db_session, db_current_subtask.task_id)
+    await db_session.commit()
+    await dialog_manager.switch_to(TasksStates.SUBTASK_DETAILS)
+
+
 
 
 
@@ -846,16 +995,19 @@ async def on_subtask_status_toggle(
     callback: CallbackQuery, widget: ManagedWidget, manager: DialogManager
 ) -> None:
     """Переключение статуса выполнения подзадачи"""
-    db_session: Session = manager.middleware_data["db_session"]
+    db_session: AsyncSession = manager.middleware_data["db_session"]
     subtask_id = manager.dialog_data["selected_subtask_id"]
+    if await _toggle_subtask_behind(callback, manager, subtask_id):
+        return
     
-    subtask = db_session.query(DbSubtask).filter(DbSubtask.id == subtask_id).first()
+    subtask = await db_session.get(DbSubtask, subtask_id)
     if not subtask:
         await callback.answer("Ошибка: подзадача не найдена", show_alert=True)
         return
     
     subtask.is_done = not subtask.is_done
-    db_session.commit()
+    mark_task_changed(db_session, subtask.task_id)
+    await db_session.commit()
     
     status_text = "выполнена" if subtask.is_done else "не выполнена"
     tasks_logger.info(f"Toggled subtask {subtask_id} status to {subtask.is_done}")
@@ -867,16 +1019,19 @@ async def on_delete_subtask_confirm(
     callback: CallbackQuery, widget: ManagedWidget, manager: DialogManager
 ) -> None:
     """Подтверждение удаления подзадачи"""
-    db_session: Session = manager.middleware_data["db_session"]
+    db_session: AsyncSession = manager.middleware_data["db_session"]
     subtask_id = manager.dialog_data["selected_subtask_id"]
+    # Иначе отложенная отметка удалённой подзадачи вернётся пользователю как ошибка
+    await write_behind.flush_user((await manager.middleware_data["db_user"].resolve()).id)
     
-    subtask = db_session.query(DbSubtask).filter(DbSubtask.id == subtask_id).first()
+    subtask = await db_session.get(DbSubtask, subtask_id)
     if not subtask:
         await callback.answer("Ошибка: подзадача не найдена", show_alert=True)
         return
     
     subtask.is_deleted = True
-    db_session.commit()
+    mark_task_changed(db_session, subtask.task_id)
+    await db_session.commit()
     
     tasks_logger.info(f"Deleted subtask {subtask_id}")
     await manager.switch_to(TasksStates.SUBTASKS_LIST)
@@ -888,17 +1043,20 @@ async def on_delete_task_confirm(
     callback: CallbackQuery, widget: ManagedWidget, manager: DialogManager
 ) -> None:
     """Подтверждение удаления задачи"""
-    db_session: Session = manager.middleware_data["db_session"]
+    db_session: AsyncSession = manager.middleware_data["db_session"]
     task_id = manager.dialog_data["selected_task_id"]
+    await write_behind.flush_user((await manager.middleware_data["db_user"].resolve()).id)
     
     # Помечаем задачу как удаленную
-    task = db_session.query(DbTask).filter(DbTask.id == task_id).first()
+    task = await db_session.get(DbTask, task_id)
     if not task:
         await callback.answer("Ошибка: задача не найдена", show_alert=True)
         return
     
     task.is_deleted = True
-    db_session.commit()
+    mark_task_changed(db_session, task_id)
+    mark_user_changed(db_session, task.user_id)
+    await db_session.commit()
     
     tasks_logger.info(f"Deleted task {task_id}")
     await manager.switch_to(TasksStates.TASKS_LIST)
@@ -908,21 +1066,43 @@ async def on_delete_task_confirm(
 tasks_dialog = Dialog(
     Window(
         Const("📋 Ваши задачи:"),
-        ScrollingGroup(
-            Row(
-                Select(
-                    Format("{item.status.value} {item.name}"),
-                    id="select_task",
-                    item_id_getter=lambda x: x.id,
-                    items="tasks",
-                    on_click=on_task_selected,
-                    when="tasks",
-                )
+        Column(
+            Select(
+                Format("{item.status.value} {item.name}"),
+                id="select_task",
+                item_id_getter=lambda x: x.id,
+                type_factory=int,
+                items="tasks",
+                on_click=on_task_selected,
+                when=F["tasks"] & ~F["bulk"],
             ),
-            hide_on_single_page=True,
-            id="scroll_tasks",
-            height=8,
-            width=1,
+            # Отметки хранятся по id задач и сохраняются при листании страниц
+            Multiselect(
+                Format("☑️ {item.status.value} {item.name}"),
+                Format("☐ {item.status.value} {item.name}"),
+                id="bulk_tasks",
+                item_id_getter=lambda x: x.id,
+                items="tasks",
+                when=F["tasks"] & F["bulk"],
+            ),
+        ),
+        # Страницы грузятся из БД по одной, поэтому скролл — только счётчик страниц
+        StubScroll(id="scroll_tasks", pages="pages"),
+        Row(
+            PrevPage(scroll="scroll_tasks"),
+            CurrentPage(scroll="scroll_tasks"),
+            NextPage(scroll="scroll_tasks"),
+            when=F["pages"] > 1,
+        ),
+        Group(
+            Button(Const("☑️ Вся страница"), id="bulk_select_page", on_click=on_bulk_select_page),
+            Button(Format("✖️ Снять ({selected_count})"), id="bulk_clear", on_click=on_bulk_clear),
+            SwitchTo(Const("🔄 Статус"), id="bulk_status", state=TasksStates.BULK_STATUS, on_click=on_bulk_action_open),
+            SwitchTo(Const("⏰ Срок"), id="bulk_deadline", state=TasksStates.BULK_DEADLINE, on_click=on_bulk_action_open),
+            SwitchTo(Const("🏷️ Тег"), id="bulk_tag", state=TasksStates.BULK_TAG, on_click=on_bulk_action_open),
+            SwitchTo(Const("🗑️ Удалить"), id="bulk_delete", state=TasksStates.BULK_DELETE, on_click=on_bulk_action_open),
+            width=2,
+            when="bulk",
         ),
         Button(Format("{mode}"), id="select_task_mode", on_click=on_task_mode_select),
         Button(Const("➕ Добавить задачу"), id="add_task", on_click=on_add_task),
@@ -979,6 +1159,11 @@ tasks_dialog = Dialog(
                 id="manage_subtasks",
                 state=TasksStates.SUBTASKS_LIST,
             ),
+            SwitchTo(
+                Const("🕸️ Связанное"),
+                id="show_related",
+                state=TasksStates.RELATED,
+            ),
             SwitchTo(
                 Const("🗑️ Удалить"), id="delete_task", state=TasksStates.DELETE_TASK
             ),
@@ -986,7 +1171,75 @@ tasks_dialog = Dialog(
         ),
         Back(Const("🔙 Назад"), id="back_to_tasks"),
         state=TasksStates.TASK_DETAILS,
-        getter=get_current_task_data,
+        getter=get_task_details_data,
+    ),
+    # --- BULK STATUS ---
+    Window(
+        Format("🔄 Новый статус для выбранных задач ({selected_count}):"),
+        Select(
+            Format("{item.value}"),
+            id="bulk_select_status",
+            item_id_getter=lambda status: status.name,
+            items=list(TaskStatus),
+            on_click=on_bulk_status_selected,
+            when=F["selected_count"] > 0,
+        ),
+        SwitchTo(Const("🔙 Назад"), id="back_to_tasks_from_bulk_status", state=TasksStates.TASKS_LIST),
+        state=TasksStates.BULK_STATUS,
+        getter=get_bulk_data,
+    ),
+    # --- BULK DEADLINE ---
+    Window(
+        Format("⏰ Сдвиг срока выбранных задач ({selected_count}):"),
+        Const("Задачи без срока не изменятся"),
+        Group(
+            Button(Const("-1 день"), id="shift_minus_1", on_click=on_bulk_deadline_shift),
+            Button(Const("+1 день"), id="shift_1", on_click=on_bulk_deadline_shift),
+            Button(Const("+7 дней"), id="shift_7", on_click=on_bulk_deadline_shift),
+            Button(Const("+30 дней"), id="shift_30", on_click=on_bulk_deadline_shift),
+            width=2,
+            when=F["selected_count"] > 0,
+        ),
+        SwitchTo(Const("🔙 Назад"), id="back_to_tasks_from_bulk_deadline", state=TasksStates.TASKS_LIST),
+        state=TasksStates.BULK_DEADLINE,
+        getter=get_bulk_data,
+    ),
+    # --- BULK TAG ---
+    Window(
+        Format("🏷️ Тег для выбранных задач ({selected_count}):"),
+        ScrollingGroup(
+            Select(
+                Format("{item.name}"),
+                id="bulk_select_tag",
+                item_id_getter=lambda tag: tag.id,
+                items="all_tags",
+                on_click=on_bulk_tag_selected,
+            ),
+            id="bulk_tags_scroll",
+            width=1,
+            height=8,
+            when=F["all_tags"] & (F["selected_count"] > 0),
+        ),
+        Const("У вас пока нет тегов", when=~F["all_tags"]),
+        SwitchTo(Const("🔙 Назад"), id="back_to_tasks_from_bulk_tag", state=TasksStates.TASKS_LIST),
+        state=TasksStates.BULK_TAG,
+        getter=get_bulk_data,
+    ),
+    # --- BULK DELETE ---
+    Window(
+        Format("🗑️ Удалить выбранные задачи ({selected_count})?"),
+        Group(
+            Button(
+                Const("✅ Да, удалить"),
+                id="confirm_bulk_delete",
+                on_click=on_bulk_delete_confirm,
+                when=F["selected_count"] > 0,
+            ),
+            SwitchTo(Const("❌ Отмена"), id="cancel_bulk_delete", state=TasksStates.TASKS_LIST),
+            width=2,
+        ),
+        state=TasksStates.BULK_DELETE,
+        getter=get_bulk_data,
     ),
     # --- NAME ---
     Window(
@@ -1072,7 +1325,12 @@ tasks_dialog = Dialog(
             when="all_events",
         ),
         Const("У вас пока нет событий", when=~F["all_events"]),
-        SwitchTo(Const("🔙 Назад"), id="back_to_task_details_from_events", state=TasksStates.TASK_DETAILS),
+        SwitchTo(
+            Const("🔙 Назад"),
+            id="back_to_task_details_from_events",
+            state=TasksStates.TASK_DETAILS,
+            on_click=on_linked_window_leave,
+        ),
         state=TasksStates.CHANGE_EVENTS,
         getter=get_events_data,
     ),
@@ -1096,7 +1354,12 @@ tasks_dialog = Dialog(
             when="all_notes",
         ),
         Const("У вас пока нет заметок", when=~F["all_notes"]),
-        SwitchTo(Const("🔙 Назад"), id="back_to_task_details_from_notes", state=TasksStates.TASK_DETAILS),
+        SwitchTo(
+            Const("🔙 Назад"),
+            id="back_to_task_details_from_notes",
+            state=TasksStates.TASK_DETAILS,
+            on_click=on_linked_window_leave,
+        ),
         state=TasksStates.CHANGE_NOTES,
         getter=get_notes_data,
     ),
@@ -1120,7 +1383,12 @@ tasks_dialog = Dialog(
             when="all_goals",
         ),
         Const("У вас пока нет целей", when=~F["all_goals"]),
-        SwitchTo(Const("🔙 Назад"), id="back_to_task_details_from_goals", state=TasksStates.TASK_DETAILS),
+        SwitchTo(
+            Const("🔙 Назад"),
+            id="back_to_task_details_from_goals",
+            state=TasksStates.TASK_DETAILS,
+            on_click=on_linked_window_leave,
+        ),
         state=TasksStates.CHANGE_GOALS,
         getter=get_goals_data,
     ),
@@ -1144,7 +1412,12 @@ tasks_dialog = Dialog(
             when="all_ideas",
         ),
         Const("У вас пока нет идей", when=~F["all_ideas"]),
-        SwitchTo(Const("🔙 Назад"), id="back_to_task_details_from_ideas", state=TasksStates.TASK_DETAILS),
+        SwitchTo(
+            Const("🔙 Назад"),
+            id="back_to_task_details_from_ideas",
+            state=TasksStates.TASK_DETAILS,
+            on_click=on_linked_window_leave,
+        ),
         state=TasksStates.CHANGE_IDEAS,
         getter=get_ideas_data,
     ),
@@ -1168,10 +1441,37 @@ tasks_dialog = Dialog(
             when="all_tags",
         ),
         Const("У вас пока нет тегов", when=~F["all_tags"]),
-        SwitchTo(Const("🔙 Назад"), id="back_to_task_details_from_tags", state=TasksStates.TASK_DETAILS),
+        SwitchTo(
+            Const("🔙 Назад"),
+            id="back_to_task_details_from_tags",
+            state=TasksStates.TASK_DETAILS,
+            on_click=on_linked_window_leave,
+        ),
         state=TasksStates.CHANGE_TAGS,
         getter=get_tags_data,
     ),
+    # --- RELATED ---
+    Window(
+        Format("🕸️ Связано с задачей «{current_task.name}» (шагов: {depth}):"),
+        Const("Связанных объектов нет", when=~F["found"]),
+        ScrollingGroup(
+            Select(
+                Format("{item[info]}"),
+                id="select_related",
+                item_id_getter=lambda x: x["key"],
+                items="related",
+                on_click=on_related_selected,
+            ),
+            id="scroll_related",
+            height=8,
+            width=1,
+            when="found",
+        ),
+        Button(Format("🔭 Глубина: {depth}"), id="related_depth", on_click=on_related_depth_click),
+        SwitchTo(Const("🔙 Назад"), id="back_to_task_details_from_related", state=TasksStates.TASK_DETAILS),
+        state=TasksStates.RELATED,
+        getter=get_related_data,
+    ),
     # --- SUBTASKS LIST ---
     Window(
         Const("🧩 Подзадачи задачи:"),
@@ -1181,6 +1481,7 @@ tasks_dialog = Dialog(
                 Format("{item[info]}"),
                 id="select_subtask",
                 item_id_getter=lambda x: x["id"],
+                type_factory=int,
                 items="subtasks_info",
                 on_click=on_subtask_selected,
             ),
@@ -1199,10 +1500,14 @@ tasks_dialog = Dialog(
     Window(
         Format("🔹 {current_subtask.name}"),
         Format("📝 Статус: {done_info}"),
+        Format("🕒 Срок: {deadline_info}"),
         Group(
             SwitchTo(
                 Const("✏️ Имя"), id="change_subtask_name", state=TasksStates.CHANGE_SUBTASK_NAME
             ),
+            SwitchTo(
+                Const("⏰ Срок"), id="change_subtask_deadline", state=TasksStates.CHANGE_SUBTASK_DEADLINE
+            ),
             Button(
                 Const("🔄 Переключить статус"),
                 id="toggle_subtask_status",
@@ -1249,6 +1554,22 @@ tasks_dialog = Dialog(
         state=TasksStates.CHANGE_SUBTASK_NAME,
         getter=get_current_subtask_data,
     ),
+    # --- CHANGE SUBTASK DEADLINE ---
+    Window(
+        Const("⏰ Меню изменения срока подзадачи"),
+        Format("🕒 Текущий срок: {deadline_info}"),
+        Const("⚠️ Введите срок в формате: ГГГГ-ММ-ДД ЧЧ:ММ:СС"),
+        Const("📝 Введите новый срок подзадачи:"),
+        TextInput(
+            id="change_subtask_deadline_input",
+            type_factory=on_change_task_deadline_type_factory,
+            on_success=on_change_subtask_deadline_success,
+            on_error=on_change_task_deadline_error,
+        ),
+        SwitchTo(Const("🔙 Назад"), id="back_to_subtask_details_from_deadline", state=TasksStates.SUBTASK_DETAILS),
+        state=TasksStates.CHANGE_SUBTASK_DEADLINE,
+        getter=get_current_subtask_data,
+    ),
 
     # --- DELETE SUBTASK ---
     Window(
@@ -1284,4 +1605,5 @@ tasks_dialog = Dialog(
         state=TasksStates.DELETE_TASK,
         getter=get_current_task_data,
     ),
+    on_start=on_tasks_dialog_start,
 )
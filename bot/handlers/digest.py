@@ -0,0 +1,117 @@
+import html
+from datetime import datetime
+from typing import List
+from aiogram import Router
+from aiogram.types import Message
+from aiogram.filters import Command, CommandObject
+from database.models import TaskStatus
+from database.routing import SessionRouter
+from middlewares.db_session import LazyUser
+from services.digest import PERIODS, get_digest
+from utils.logger import tasks_logger
+digest_router = Router(name="DigestHandler")
+
+TITLES = {"today": "сегодня", "week": "неделю", "month": "месяц", "year": "год"}
+LINK_ICONS = {"goal": "🎯", "idea": "💡", "note": "🗒️"}
+# Лимит длины сообщения Telegram
+MESSAGE_LIMIT = 4096
+
+
+def _when(value: str, period: str) -> str:
+    moment = datetime.fromisoformat(value)
+    if period == "today":
+        return moment.strftime("%H:%M")
+    if period == "year":
+        return moment.strftime("%d.%m")
+    return moment.strftime("%d.%m %H:%M")
+
+
+def _links(links: list) -> str:
+    return "".join(f"\n    {LINK_ICONS[link['type']]} {html.escape(link['name'])}" for link in links)
+
+
+def _more(shown: int, total: int) -> List[str]:
+    return [f"… и ещё {total - shown}"] if total > shown else []
+
+
+def format_digest(digest: dict, period: str) -> str:
+    lines = [f"🗓️ Сводка на {TITLES[period]} ({digest['start']:%d.%m.%Y} — {digest['end']:%d.%m.%Y}, не включая)"]
+    lines.append(f"\n📋 Задачи ({digest['tasks_total']}):")
+    lines.extend(
+        f"{TaskStatus[task['status']].value} {_when(task['deadline'], period)} {html.escape(task['name'])}{_links(task['links'])}"
+        for task in digest["tasks"]
+    )
+    lines.extend(_more(len(digest["tasks"]), digest["tasks_total"]))
+    lines.append(f"\n☑️ Подзадачи ({digest['subtasks_total']}):")
+    lines.extend(
+        f"{'✅' if subtask['is_done'] else '⬜'} {_when(subtask['deadline'], period)} {html.escape(subtask['name'])}"
+        f" ({html.escape(subtask['task_name'])})"
+        for subtask in digest["subtasks"]
+    )
+    lines.extend(_more(len(digest["subtasks"]), digest["subtasks_total"]))
+    lines.append(f"\n📅 События ({digest['events_total']}):")
+    lines.extend(
+        f"• {_when(event['start_time'], period)} {html.escape(event['name'])}{_links(event['links'])}"
+        for event in digest["events"]
+    )
+    lines.extend(_more(len(digest["events"]), digest["events_total"]))
+    lines.append(f"\n🎯 Текущие цели ({digest['goals_total']}):")
+    lines.extend(
+        f"• {html.escape(goal['name'])}" + (f" (до {datetime.fromisoformat(goal['deadline']):%d.%m.%Y})" if goal["deadline"] else "")
+        for goal in digest["goals"]
+    )
+    lines.extend(_more(len(digest["goals"]), digest["goals_total"]))
+    return "\n".join(lines)
+
+
+def _length(text: str) -> int:
+    """Длина в единицах UTF-16 — так лимит считает Telegram (эмодзи — две единицы)."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _cut(line: str, limit: int) -> int:
+    """Сколько символов строки помещается в limit, не разрезая HTML-сущность вроде &amp;."""
+    size, end = 0, 0
+    for end, char in enumerate(line):
+        size += 2 if ord(char) > 0xFFFF else 1
+        if size > limit:
+            break
+    else:
+        return len(line)
+    entity = line.rfind("&", 0, end)
+    if entity != -1 and line.find(";", entity, end) == -1 and end - entity < 10:
+        return entity
+    return end
+
+
+def split_message(text: str) -> List[str]:
+    """Делит текст по строкам на части не длиннее лимита Telegram; слишком длинная строка режется."""
+    chunks, current = [], ""
+    for line in text.split("\n"):
+        while _length(line) > MESSAGE_LIMIT:
+            if current:
+                chunks.append(current)
+                current = ""
+            cut = _cut(line, MESSAGE_LIMIT)
+            chunks.append(line[:cut])
+            line = line[cut:]
+        if current and _length(current) + _length(line) + 1 > MESSAGE_LIMIT:
+            chunks.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    return chunks + [current] if current or not chunks else chunks
+
+
+@digest_router.message(Command(*PERIODS))
+async def cmd_digest(message: Message, command: CommandObject, db_router: SessionRouter, db_user: LazyUser):
+    """
+    Command handler for /today, /week, /month and /year - tasks, subtasks and events of the period
+    with their linked goals, ideas and notes, plus all current goals
+    """
+    period = command.command.lower()
+    tasks_logger.info(f"Digest command /{period} received from user {db_user.tg_id}")
+    user = await db_user.resolve()
+    digest = await get_digest(db_router.reader(), user.tg_id, user.id, period)
+    for chunk in split_message(format_digest(digest, period)):
+        await message.answer(chunk)
@@ -10,12 +10,19 @@ login_router = Router(name="LoginHandler")
 @login_router.message(CommandStart())
 async def start_command(message: Message, bot: Bot):
     """
-    Команда /start: создаёт пользователя в базе данных, если его ещё нет.
+    Команда /start: регистрирует команды бота для чата.
+    В БД не обращается — пользователь создаётся при первом обращении к данным.
     """
     await bot.set_my_commands(commands=[
             #BotCommand(command="start", description="Начать работу с ботом"),
             #BotCommand(command="help", description="Помощь по командам"),
             BotCommand(command="tasks", description="Управление задачами"),
+            BotCommand(command="search", description="Поиск по задачам, событиям, целям, идеям и заметкам"),
+            BotCommand(command="stats", description="Статистика"),
+            BotCommand(command="today", description="Сводка на сегодня"),
+            BotCommand(command="week", description="Сводка на неделю"),
+            BotCommand(command="month", description="Сводка на месяц"),
+            BotCommand(command="year", description="Сводка на год"),
             #BotCommand(command="events", description="Управление событиями"),
             #BotCommand(command="goals", description="Управление целями"),
         ],
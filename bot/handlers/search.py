@@ -0,0 +1,21 @@
+from aiogram import Router
+from aiogram.types import Message
+from aiogram.filters import Command, CommandObject
+from aiogram_dialog import DialogManager, StartMode
+from middlewares.db_session import LazyUser
+from dialogs.search_dialog import SearchStates
+from utils.logger import tasks_logger
+search_router = Router(name="SearchHandler")
+
+
+@search_router.message(Command("search"))
+async def cmd_search(message: Message, command: CommandObject, dialog_manager: DialogManager, db_user: LazyUser):
+    """
+    Command handler for /search <query> - full-text search across tasks, subtasks, events, goals, ideas and notes
+    """
+    query = (command.args or "").strip()
+    if not query:
+        await message.answer("🔎 Использование: /search <запрос>\nНапример: /search отчёт по проекту")
+        return
+    tasks_logger.info(f"Search command received from user {db_user.tg_id}: {query}")
+    await dialog_manager.start(SearchStates.RESULTS, data={"query": query}, mode=StartMode.RESET_STACK)
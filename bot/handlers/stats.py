@@ -0,0 +1,32 @@
+from aiogram import Router
+from aiogram.types import Message
+from aiogram.filters import Command
+from database.routing import SessionRouter
+from middlewares.db_session import LazyUser
+from services.stats import get_user_stats
+from utils.logger import tasks_logger
+stats_router = Router(name="StatsHandler")
+
+
+@stats_router.message(Command("stats"))
+async def cmd_stats(message: Message, db_router: SessionRouter, db_user: LazyUser):
+    """
+    Command handler for /stats - summary of user items from the user_stats table
+    """
+    tasks_logger.info(f"Stats command received from user {db_user.tg_id}")
+    user = await db_user.resolve()
+    stats = await get_user_stats(db_router.reader(), user.id)
+    await message.answer(
+        "📊 Ваша статистика:\n\n"
+        f"📋 Задачи: {stats['tasks']}\n"
+        f"  🆕 Новые: {stats['tasks_new']}\n"
+        f"  🟠 В работе: {stats['tasks_in_progress']}\n"
+        f"  ✅ Выполнены: {stats['tasks_completed']}\n"
+        f"  ⏰ Просрочены: {stats['overdue']}\n"
+        f"☑️ Подзадачи: {stats['subtasks_done']}/{stats['subtasks']} выполнено\n"
+        f"📅 События: {stats['events']}\n"
+        f"🎯 Цели: {stats['goals']}\n"
+        f"💡 Идеи: {stats['ideas']}\n"
+        f"🗒️ Заметки: {stats['notes']}\n"
+        f"🏷️ Теги: {stats['tags']}"
+    )
@@ -3,18 +3,34 @@ from aiogram import types, Router
 from aiogram.types import ReplyKeyboardRemove
 from aiogram.filters import CommandStart
 from aiogram import F
-from sqlalchemy.orm import Session
-from utils.voice_transcriber import transcribe_audio_message
-from utils.llm_connector import send_prompt_to_llm
+from sqlalchemy.ext.asyncio import AsyncSession
 from aiogram.utils.text_decorations import html_decoration
+import asyncio
 import html
+import importlib
 from services import executor, validator
-from database.models import DbUser
+from middlewares.db_session import LazyUser
+from database.routing import SessionRouter
 from models.answers import AnswerModel
 from utils.logger import voice_logger
 
 voice_router = Router(name="VoiceCommandsHandler")
 
+
+async def preload_voice_stack():
+    """
+    Импортирует распознавание речи (torch/whisper, загрузка модели) и клиент LLM (openai).
+    Импорт идёт в отдельном потоке, чтобы не блокировать event loop; повторные вызовы
+    ждут уже идущий импорт или сразу получают загруженные модули.
+    """
+    def load():
+        return (
+            importlib.import_module("utils.voice_transcriber"),
+            importlib.import_module("utils.llm_connector"),
+        )
+    return await asyncio.to_thread(load)
+
+
 def get_action_result_text(is_valid: bool, errors: list, answer: AnswerModel, added_items: list, updated_items: list, deleted_items: list) -> str:
     """
     Формирует текст ответа на основе результатов выполнения команд. 
@@ -48,16 +64,18 @@ def get_action_result_text(is_valid: bool, errors: list, answer: AnswerModel, ad
     
 
 @voice_router.message(F.voice)
-async def handle_voice_message(message: types.Message, db_session: Session, db_user: DbUser):
+async def handle_voice_message(message: types.Message, db_session: AsyncSession, db_router: SessionRouter, db_user: LazyUser):
     """
     Обрабатывает голосовое сообщение: проверяет наличие пользователя, распознаёт текст, 
     отправляет в LLM, выполняет команды и возвращает результат.
     """
-    voice_logger.info(f"Received voice message from user {db_user.tg_id} ({db_user.name})")
+    voice_logger.info(f"Received voice message from user {db_user.tg_id} ({db_user.username})")
+    user = await db_user.resolve()
+    voice_transcriber, llm_connector = await preload_voice_stack()
     
     # Распознаём голосовое сообщение
     voice_logger.debug("Starting voice transcription...")
-    text = await transcribe_audio_message(message)
+    text = await voice_transcriber.transcribe_audio_message(message)
     voice_logger.info(f"Transcribed text: {text[:100]}...")
     
     # Отправляем расшифровку пользователю
@@ -65,16 +83,16 @@ async def handle_voice_message(message: types.Message, db_session: Session, db_u
     
     # Отправляем в LLM и валидируем ответ
     voice_logger.debug("Sending to LLM...")
-    text_answer = send_prompt_to_llm(text, db_session, db_user.id)
+    text_answer = await llm_connector.send_prompt_to_llm(text, db_router.reader(), user.id)
     
     # Валидируем ответ от LLM, чтобы формат ответа соответствовал модели AnswerModel и ссылки на элементы БД были валидными
     voice_logger.debug("Validating LLM response...")
-    is_valid, errors, answer = validator.validate(text_answer, db_session)
+    is_valid, errors, answer = await validator.validate(text_answer, db_session)
 
     # Выполняем команды, если валидация прошла успешно и ответ от LLM не пустой
     if is_valid:
         voice_logger.info("LLM response is valid, executing commands...")
-        added_items, updated_items, deleted_items = executor.execute(db_session, answer.response, db_user.id)
+        added_items, updated_items, deleted_items = await executor.execute(db_session, answer.response, user.id)
         voice_logger.info(f"Executed commands: added={len(added_items) if added_items else 0}, updated={len(updated_items) if updated_items else 0}, deleted={len(deleted_items) if deleted_items else 0}")
     else:
         voice_logger.warning(f"LLM response validation failed: {errors}")
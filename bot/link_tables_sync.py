@@ -0,0 +1,36 @@
+"""
+Синхронизация 15 парных таблиц связей с единой таблицей links перед возвратом
+с LINK_BACKEND=links на LINK_BACKEND=tables. Запускать при остановленном боте:
+
+    python bot/link_tables_sync.py
+"""
+import argparse
+import asyncio
+
+from environs import Env
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.engine import create_db_engine
+from database.links import sync_tables_from_links
+from utils.logger import db_logger
+
+env = Env()
+env.read_env()
+
+
+async def run() -> None:
+    engine = create_db_engine(env("DATABASE_URL"), name="link_tables_sync")
+    try:
+        async with AsyncSession(engine) as session:
+            result = await sync_tables_from_links(session)
+            await session.commit()
+        for table, (removed, added) in result.items():
+            if removed or added:
+                db_logger.info(f"{table}: removed {removed}, added {added}")
+        print(f"Synced from links (removed, added): {result}")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter).parse_args()
+    asyncio.run(run())
@@ -1,16 +1,42 @@
+import time
+# Засекаем до остальных импортов — они и есть основная часть холодного старта
+started_at = time.perf_counter()
+
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from environs import Env
-from handlers.voice import voice_router as voice_router
+from handlers.voice import voice_router as voice_router, preload_voice_stack
 from handlers.login import login_router as login_router
 from handlers.tasks import tasks_router as tasks_router
-from dialogs.tasks_dialog import tasks_dialog
+from handlers.search import search_router as search_router
+from handlers.stats import stats_router as stats_router
+from handlers.digest import digest_router as digest_router
+from dialogs.tasks_dialog import tasks_dialog, task_versions, user_versions, link_edits, write_behind
+from dialogs.search_dialog import search_dialog
 from aiogram_dialog import setup_dialogs
 from middlewares.db_session import DbSessionMiddleware
-from sqlalchemy import create_engine, inspect
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from database.engine import create_db_engine
+from database.routing import ReadYourWritesTracker, WriterSession, track_writes
 from utils.logger import bot_logger
+from utils.metrics import log_metrics_periodically
+from utils.rate_limiter import (
+    OutboundScheduler, TG_CHAT_BURST, TG_CHAT_RATE, TG_GLOBAL_RATE, TG_GROUP_RATE, TG_RATE_LIMIT, TG_RETRY_LIMIT,
+)
+from services.archiver import archive_periodically
+from services.stats import reconcile_periodically
+from services.related import related_cache
+from services.digest import digest_versions
+from database import changes
+from database.loader import clear_loaders_on_commit
+from database.fsm_storage import PostgresStorage, create_fsm_storage
+from webhook import WEBHOOK_HOST, WEBHOOK_PORT, run_webhook
+import asyncio
 import sys
 import os
 
@@ -21,40 +47,176 @@ env.read_env()
 bot_logger.info("Starting bot initialization...")
 bot_logger.info(f"Bot token: {env('TELEGRAM_BOT_TOKEN')[:10]}...")
 
-bot = Bot(token=env("TELEGRAM_BOT_TOKEN"), default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+# polling — long polling в одном процессе; webhook — процесс сам принимает вебхук;
+# worker — воркер за фронтом bot/webhook.py (его запускает фронт)
+BOT_MODE = env("BOT_MODE", "polling")
+WEBHOOK_WORKER_INDEX = env.int("WEBHOOK_WORKER_INDEX", 0)
+
+# Другой адрес Bot API: локальный Bot API server или фейковый Telegram из benchmarks/fake_telegram.py
+TELEGRAM_API_URL = env("TELEGRAM_API_URL", None)
+session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)) if TELEGRAM_API_URL else None
+bot = Bot(token=env("TELEGRAM_BOT_TOKEN"), session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+# Отправки в чаты — через очереди с лимитами Telegram; воркеры за фронтом делят общий лимит бота поровну
+if TG_RATE_LIMIT:
+    workers = env.int("WEBHOOK_WORKERS", 1) if BOT_MODE == "worker" else 1
+    bot.session.middleware(OutboundScheduler(
+        global_rate=TG_GLOBAL_RATE / workers,
+        chat_rate=TG_CHAT_RATE,
+        chat_burst=TG_CHAT_BURST,
+        group_rate=TG_GROUP_RATE,
+        retry_limit=TG_RETRY_LIMIT,
+    ))
 
 # Инициализация SQLAlchemy engine и sessionmaker для PostgreSQL
 DATABASE_URL = env("DATABASE_URL")
 bot_logger.info(f"Database URL: {DATABASE_URL.split('@')[1] if '@' in DATABASE_URL else 'configured'}")
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+engine = create_db_engine(DATABASE_URL)
+# expire_on_commit=False: после commit объекты остаются доступными без неявных lazy-запросов,
+# которые в асинхронном режиме недопустимы
+SessionLocal = async_sessionmaker(
+    bind=engine, autoflush=False, expire_on_commit=False, sync_session_class=WriterSession
+)
+
+# Чтения (геттеры диалогов, контекст для LLM) можно направить в реплику
+DATABASE_REPLICA_URL = env("DATABASE_REPLICA_URL", None)
+if DATABASE_REPLICA_URL:
+    replica_engine = create_db_engine(DATABASE_REPLICA_URL, name="replica")
+    ReadSessionLocal = async_sessionmaker(bind=replica_engine, autoflush=False, expire_on_commit=False)
+    bot_logger.info("Read replica configured")
+else:
+    replica_engine = None
+    ReadSessionLocal = None
+
+rw_tracker = ReadYourWritesTracker(window=env.float("READ_YOUR_WRITES_WINDOW", 5))
+track_writes(rw_tracker)
+# Закоммиченные изменения сбрасывают кэши связанных объектов, текста задач и сводок
+changes.track_changes()
+changes.subscribe(changes.USER, related_cache.invalidate)
+changes.subscribe(changes.USER, user_versions.bump)
+changes.subscribe(changes.TASK, task_versions.bump)
+changes.subscribe(changes.TG_USER, digest_versions.bump)
+clear_loaders_on_commit()
 
 # Проверка инициализации базы
 from database.models import Base, DbTask, DbEvent, DbGoal, DbIdea, DbNote, DbTag
-inspector = inspect(engine)
 required_tables = [cls.__tablename__ for cls in [DbTask, DbEvent, DbGoal, DbIdea, DbNote, DbTag]]
-missing = [t for t in required_tables if not inspector.has_table(t)]
-if missing:
-    bot_logger.error(f"Database not initialized. Missing tables: {', '.join(missing)}")
-    bot_logger.error("Run 'alembic upgrade head' to initialize schema.")
-    sys.exit(1)
-else:
-    bot_logger.info("Database schema check passed")
 
-dp = Dispatcher(session_factory=SessionLocal)
+# Быстрый старт: вместо инспекции схемы сверяем ревизию Alembic одним запросом
+FAST_START = env.bool("FAST_START", False)
+ALEMBIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "alembic")
+
+
+async def check_schema_revision() -> None:
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+
+    config = Config()
+    config.set_main_option("script_location", ALEMBIC_DIR)
+    head = ScriptDirectory.from_config(config).get_current_head()
+    async with engine.connect() as connection:
+        try:
+            current = await connection.scalar(text("SELECT version_num FROM alembic_version"))
+        except ProgrammingError:
+            current = None
+    if current != head:
+        bot_logger.error(f"Database schema revision is {current}, expected {head}")
+        bot_logger.error("Run 'alembic upgrade head' to initialize schema.")
+        sys.exit(1)
+    bot_logger.info(f"Database schema revision check passed ({head})")
+
+
+async def check_schema() -> None:
+    if FAST_START:
+        await check_schema_revision()
+        return
+    async with engine.connect() as connection:
+        existing = await connection.run_sync(lambda sync_conn: set(inspect(sync_conn).get_table_names()))
+    missing = [t for t in required_tables if t not in existing]
+    if missing:
+        bot_logger.error(f"Database not initialized. Missing tables: {', '.join(missing)}")
+        bot_logger.error("Run 'alembic upgrade head' to initialize schema.")
+        sys.exit(1)
+    else:
+        bot_logger.info("Database schema check passed")
+
+
+# Состояние FSM и стеки диалогов: в памяти, в Redis или в Postgres (FSM_STORAGE)
+storage = create_fsm_storage(engine)
+dp = Dispatcher(storage=storage, session_factory=SessionLocal, read_session_factory=ReadSessionLocal, rw_tracker=rw_tracker)
 dp.include_router(login_router)
 dp.include_router(voice_router)
 dp.include_router(tasks_router)
+dp.include_router(search_router)
+dp.include_router(stats_router)
+dp.include_router(digest_router)
 dp.include_router(tasks_dialog)
+dp.include_router(search_dialog)
 
 setup_dialogs(dp)
 
 
 dp.update.middleware(DbSessionMiddleware())
 
-bot_logger.info("Bot setup completed, starting polling...")
+# Фоновые задачи, запущенные из startup (ссылки держим, чтобы их не собрал GC)
+background_tasks = set()
+
+
+@dp.startup()
+async def on_startup() -> None:
+    # Строку "Bot started in" ищет benchmarks/startup_time.py
+    bot_logger.info(f"Bot started in {time.perf_counter() - started_at:.2f}s")
+    # torch/whisper и openai грузятся в фоне уже после старта polling, а не при импорте
+    if env.bool("VOICE_PRELOAD", True):
+        task = asyncio.create_task(preload_voice_stack())
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+
+
+@dp.shutdown()
+async def on_shutdown() -> None:
+    # Отметки в окнах связей, ещё не записанные по таймеру, и отложенные статусы
+    await link_edits.flush_all()
+    await write_behind.flush_all()
+
+
+bot_logger.info(f"Bot setup completed, mode: {BOT_MODE}")
+
+
+async def main() -> None:
+    await check_schema()
+    metrics_task = asyncio.create_task(log_metrics_periodically(env.float("METRICS_LOG_INTERVAL", 300)))
+    # Периодические задачи по всей базе запускает только один процесс (воркер 0 за фронтом)
+    background = []
+    if WEBHOOK_WORKER_INDEX == 0:
+        # Архивация удалённых строк внутри бота (0 — выключена, можно запускать bot/archive.py по cron)
+        archive_interval = env.float("ARCHIVE_INTERVAL", 0)
+        if archive_interval > 0:
+            background.append(asyncio.create_task(archive_periodically(
+                engine, archive_interval, env.int("ARCHIVE_AFTER_DAYS", 30), env.int("ARCHIVE_BATCH_SIZE", 1000)
+            )))
+        # Сверка счётчиков user_stats с фактическими данными (0 — выключена)
+        reconcile_interval = env.float("STATS_RECONCILE_INTERVAL", 86400)
+        if reconcile_interval > 0:
+            background.append(asyncio.create_task(reconcile_periodically(engine, reconcile_interval)))
+        # Просроченные строки fsm_storage (Redis удаляет ключи по TTL сам)
+        if isinstance(storage, PostgresStorage):
+            background.append(asyncio.create_task(storage.purge_periodically(env.float("FSM_PURGE_INTERVAL", 3600))))
+    try:
+        if BOT_MODE == "polling":
+            bot_logger.info("Starting bot polling...")
+            await dp.start_polling(bot)
+        else:
+            await run_webhook(dp, bot, WEBHOOK_HOST, WEBHOOK_PORT, register=BOT_MODE == "webhook")
+    finally:
+        metrics_task.cancel()
+        for task in background:
+            task.cancel()
+        await storage.close()
+        await engine.dispose()
+        if replica_engine is not None:
+            await replica_engine.dispose()
+
 
 if __name__ == "__main__":
-    bot_logger.info("Starting bot polling...")
-    dp.run_polling(bot)
\ No newline at end of file
+    asyncio.run(main())
@@ -1,50 +1,138 @@
 from aiogram.dispatcher.middlewares.base import BaseMiddleware
-from sqlalchemy.orm import sessionmaker, Session
-from typing import Callable, Awaitable, Dict, Any, Optional
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+from typing import Callable, Awaitable, Dict, Any, NamedTuple, Optional
 from database.models import DbUser
+from database.loader import LOADER_KEY, RowLoader
+from database.routing import ReadYourWritesTracker, SessionRouter
 from aiogram.types import User, Update
+from environs import Env
+from utils.cache import LRUCache
+from utils.metrics import metrics
 from utils.logger import db_logger
-from pprint import pprint
 
-def get_or_create_user(session: Session, tg_id: int, name: str = None, last_name: str = None, username: str = None) -> DbUser:
+env = Env()
+env.read_env()
+
+
+class CachedUser(NamedTuple):
+    """
+    Лёгкая запись о пользователе для кэша: всё, что нужно хендлерам, без ORM-объекта.
+    """
+    id: int
+    tg_id: int
+    username: Optional[str]
+
+
+# Пользователи после создания практически не меняются, поэтому tg_id -> CachedUser кэшируется в процессе
+user_cache = LRUCache(
+    maxsize=env.int("USER_CACHE_SIZE", 10000),
+    ttl=env.int("USER_CACHE_TTL", 3600),
+    name="users",
+)
+
+
+async def get_or_create_user(session: AsyncSession, tg_id: int, name: str = None, last_name: str = None, username: str = None) -> CachedUser:
     """
     Получает пользователя из базы по tg_id или создаёт нового, если не найден.
+    Создание безопасно при гонке: INSERT ... ON CONFLICT (tg_id) DO NOTHING RETURNING.
+    """
+    columns = (DbUser.id, DbUser.tg_id, DbUser.username)
+    metrics.inc("users.db_lookups")
+    row = (await session.execute(select(*columns).where(DbUser.tg_id == tg_id))).first()
+    if row is None:
+        row = (await session.execute(
+            insert(DbUser)
+            .values(tg_id=tg_id, name=name, last_name=last_name, username=username)
+            .on_conflict_do_nothing(index_elements=[DbUser.tg_id])
+            .returning(*columns)
+        )).first()
+        if row is None:
+            # Пользователя успел создать параллельный апдейт
+            row = (await session.execute(select(*columns).where(DbUser.tg_id == tg_id))).first()
+        else:
+            metrics.inc("users.created")
+        await session.commit()
+    return CachedUser(*row)
+
+
+class LazyUser:
     """
-    user = session.query(DbUser).filter(DbUser.tg_id == tg_id).first()
-    if not user:
-        user = DbUser(tg_id=tg_id, name=name, last_name=last_name, username=username)
-        session.add(user)
-        session.commit()
-    return user
+    Ленивая ссылка на пользователя БД для текущего апдейта.
+    tg_id и username берутся из Telegram без запросов, строка в users ищется (или создаётся)
+    только при первом вызове resolve() и только если её нет в user_cache.
+    """
+    __slots__ = ("tg_id", "username", "_tg_user", "_session", "_user")
+
+    def __init__(self, session: AsyncSession, tg_user: User):
+        self.tg_id = tg_user.id
+        self.username = tg_user.username
+        self._tg_user = tg_user
+        self._session = session
+        self._user: Optional[CachedUser] = None
+
+    async def resolve(self) -> CachedUser:
+        if self._user is not None:
+            return self._user
+        user: Optional[CachedUser] = user_cache.get(self.tg_id)
+        if user is None:
+            user = await get_or_create_user(
+                self._session,
+                self.tg_id,
+                name=self._tg_user.first_name,
+                last_name=self._tg_user.last_name,
+                username=self.username,
+            )
+            db_logger.debug(f"Resolved user {user.tg_id} {user.username}")
+        if user.username != self.username:
+            # Смена username в Telegram: записываем при первом обращении к пользователю
+            await self._session.execute(update(DbUser).where(DbUser.id == user.id).values(username=self.username))
+            await self._session.commit()
+            user = user._replace(username=self.username)
+            db_logger.info(f"Updated username for user {user.tg_id}: {user.username}")
+        user_cache.set(self.tg_id, user)
+        self._user = user
+        return user
+
 
 class DbSessionMiddleware(BaseMiddleware):
     """
     Мидлварь для управления сессией БД в каждом запросе.
+    db_session — пишущая сессия primary, db_router.reader() — сессия для чтения (реплика или primary),
+    db_loader — загрузчик строк с памятью в пределах апдейта.
+    AsyncSession берёт соединение из пула только при первом запросе, а пользователь
+    резолвится через LazyUser, поэтому апдейты без работы с БД не делают ни одного запроса.
     """
     def __init__(self):
         super().__init__()
 
     async def __call__(self, handler: Callable, update: Update, data: Dict[str, Any]) -> Awaitable:
-        session_factory: Optional[Callable[[], Session]] = data.get("session_factory", None)
+        session_factory: Optional[async_sessionmaker[AsyncSession]] = data.get("session_factory", None)
         if session_factory is None:
             db_logger.error("session_factory is not set")
             raise ValueError("session_factory is not set")
         
-        session: Session = session_factory()
-        data["db_session"] = session
-
         event_from_user: Optional[User] = data.get("event_from_user", None)
         if event_from_user is None:
             db_logger.error("event_from_user is not set")
             raise ValueError("event_from_user is not set")
-        
-        user: DbUser = get_or_create_user(session, event_from_user.id, event_from_user.username)
-        data["db_user"] = user
-        
-        db_logger.debug(f"Database session created for update from user {user.tg_id} {user.username}")
-        
-        try:
-            return await handler(update, data)
-        finally:
-            session.close()
-            db_logger.debug("Database session closed")
+
+        read_session_factory: Optional[async_sessionmaker[AsyncSession]] = data.get("read_session_factory", None)
+        rw_tracker: ReadYourWritesTracker = data["rw_tracker"]
+
+        async with session_factory() as session:
+            # По tg_id коммиты этой сессии пинят чтения пользователя к primary
+            session.info["tg_id"] = event_from_user.id
+            router = SessionRouter(session, read_session_factory, rw_tracker, event_from_user.id)
+            data["db_session"] = session
+            data["db_router"] = router
+            data["db_user"] = LazyUser(session, event_from_user)
+            # Строки задач и подзадач, общие для хендлера и геттеров этого апдейта
+            data["db_loader"] = session.info[LOADER_KEY] = RowLoader(router)
+
+            try:
+                return await handler(update, data)
+            finally:
+                await router.close()
+                db_logger.debug("Database session closed")
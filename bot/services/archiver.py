@@ -0,0 +1,189 @@
+import asyncio
+from collections import defaultdict
+from typing import Dict, List, Tuple
+from sqlalchemy import Table, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from database.models import ARCHIVED_ENTITIES, ARCHIVE_TABLES, ASSOCIATION_TABLES, LINK_ENTITY_TABLES
+from utils.logger import db_logger
+from utils.metrics import metrics
+
+
+def _links_of(table_name: str) -> List[Tuple[Table, str, str, str]]:
+    """
+    Таблицы связей, ссылающиеся на table_name:
+    (таблица связи, своя колонка, колонка другой стороны, таблица другой стороны).
+    """
+    links = []
+    for association in ASSOCIATION_TABLES:
+        for fk in association.foreign_keys:
+            if fk.column.table.name == table_name:
+                other = next(other for other in association.foreign_keys if other is not fk)
+                links.append((association, fk.parent.name, other.parent.name, other.column.table.name))
+    return links
+
+
+# Таблица -> тип объекта в единой таблице links (у подзадач связей нет)
+LINK_TYPES = {table: link_type for link_type, table in LINK_ENTITY_TABLES.items()}
+
+
+async def _move(
+    conn: AsyncConnection, table_name: str, where: str, params: dict, restore: bool = False
+) -> Tuple[int, int]:
+    """
+    Переносит строки между горячей таблицей и archive_* одним запросом (DELETE ... RETURNING
+    в CTE + INSERT). Возвращает число строк и их суммарный размер в байтах.
+    """
+    columns = ", ".join(c.name for c in ARCHIVE_TABLES[table_name].columns if c.name != "archived_at")
+    archive_name = ARCHIVE_TABLES[table_name].name
+    source, target = (archive_name, table_name) if restore else (table_name, archive_name)
+    rows, size = (await conn.execute(text(f"""
+        WITH moved AS (DELETE FROM {source} WHERE {where} RETURNING {columns}),
+             inserted AS (INSERT INTO {target} ({columns}) SELECT {columns} FROM moved)
+        SELECT count(*), coalesce(sum(pg_column_size(moved.*)), 0) FROM moved
+    """), params)).one()
+    return rows, size
+
+
+async def _archive_batch(
+    conn: AsyncConnection, table_name: str, older_than_days: int, batch_size: int
+) -> Dict[str, Tuple[int, int]]:
+    """
+    Архивирует одну пачку удалённых строк table_name вместе с их связями
+    (и подзадачами — для задач). SKIP LOCKED не даёт параллельным запускам мешать друг другу.
+    """
+    ids = (await conn.execute(text(f"""
+        SELECT id FROM {table_name}
+        WHERE is_deleted = true AND updated < now() - make_interval(days => :days)
+        ORDER BY updated
+        LIMIT :limit
+        FOR UPDATE SKIP LOCKED
+    """), {"days": older_than_days, "limit": batch_size})).scalars().all()
+    if not ids:
+        return {}
+    moved = {}
+    if table_name in LINK_TYPES:
+        # links — раньше парных таблиц: иначе триггер-зеркало удалил бы эти строки вместо переноса
+        moved["links"] = await _move(
+            conn,
+            "links",
+            "(src_type = :type AND src_id = ANY(:ids)) OR (dst_type = :type AND dst_id = ANY(:ids))",
+            {"type": LINK_TYPES[table_name], "ids": ids},
+        )
+    for association, column, _, _ in _links_of(table_name):
+        moved[association.name] = await _move(conn, association.name, f"{column} = ANY(:ids)", {"ids": ids})
+    if table_name == "tasks":
+        # Подзадачи не живут без задачи — уходят в архив вместе с ней, даже неудалённые
+        moved["subtasks"] = await _move(conn, "subtasks", "task_id = ANY(:ids)", {"ids": ids})
+    moved[table_name] = await _move(conn, table_name, "id = ANY(:ids)", {"ids": ids})
+    return moved
+
+
+async def refresh_table_stats(engine: AsyncEngine) -> None:
+    """
+    Обновляет gauge размеров горячих и архивных таблиц и числа мёртвых строк
+    (место, которое освободит VACUUM).
+    """
+    tables = [*ARCHIVED_ENTITIES, *(table.name for table in ASSOCIATION_TABLES), "links"]
+    tables += [ARCHIVE_TABLES[name].name for name in list(tables)]
+    async with engine.connect() as conn:
+        stats = (await conn.execute(text("""
+            SELECT relname, n_live_tup, n_dead_tup, pg_total_relation_size(relid) AS size_bytes
+            FROM pg_stat_user_tables WHERE relname = ANY(:tables)
+        """), {"tables": tables})).all()
+    for row in stats:
+        metrics.set_gauge(f"archive.{row.relname}.live_tuples", row.n_live_tup)
+        metrics.set_gauge(f"archive.{row.relname}.dead_tuples", row.n_dead_tup)
+        metrics.set_gauge(f"archive.{row.relname}.size_bytes", row.size_bytes)
+
+
+async def archive_deleted(engine: AsyncEngine, older_than_days: int, batch_size: int = 1000) -> Dict[str, int]:
+    """
+    Переносит строки, удалённые (is_deleted) больше older_than_days дней назад, в таблицы archive_*.
+    Временем удаления считается updated. Каждая пачка — отдельная короткая транзакция.
+    Возвращает число перенесённых строк по таблицам.
+    """
+    totals = defaultdict(int)
+    for table_name in ARCHIVED_ENTITIES:
+        while True:
+            async with engine.begin() as conn:
+                moved = await _archive_batch(conn, table_name, older_than_days, batch_size)
+            for name, (rows, size) in moved.items():
+                totals[name] += rows
+                metrics.inc(f"archive.{name}.rows_moved", rows)
+                metrics.inc(f"archive.{name}.bytes_moved", size)
+            if moved.get(table_name, (0, 0))[0] < batch_size:
+                break
+    await refresh_table_stats(engine)
+    db_logger.info(f"Archived rows deleted more than {older_than_days} days ago: {dict(totals)}")
+    return dict(totals)
+
+
+async def restore_archived(engine: AsyncEngine, table_name: str, entity_id: int) -> Dict[str, int]:
+    """
+    Возвращает объект из архива в горячую таблицу и снимает с него пометку удаления.
+    Вместе с задачей возвращаются её подзадачи. Связи восстанавливаются только с объектами,
+    которые сейчас в горячих таблицах; остальные вернутся при восстановлении второй стороны.
+    """
+    if table_name not in ARCHIVED_ENTITIES:
+        raise ValueError(f"Unknown table {table_name}, expected one of: {', '.join(ARCHIVED_ENTITIES)}")
+    params = {"id": entity_id}
+    async with engine.begin() as conn:
+        if table_name == "subtasks":
+            task_id = (await conn.execute(
+                text("SELECT task_id FROM archive_subtasks WHERE id = :id"), params
+            )).scalar()
+            if task_id is not None and not (await conn.execute(
+                text("SELECT 1 FROM tasks WHERE id = :task_id"), {"task_id": task_id}
+            )).scalar():
+                raise ValueError(f"Task {task_id} is archived, restore it first")
+        moved = {table_name: await _move(conn, table_name, "id = :id", params, restore=True)}
+        if not moved[table_name][0]:
+            raise ValueError(f"{table_name} {entity_id} not found in archive")
+        if table_name == "tasks":
+            moved["subtasks"] = await _move(conn, "subtasks", "task_id = :id", params, restore=True)
+        if table_name in LINK_TYPES:
+            # links — раньше парных таблиц: триггер-зеркало на них пропускает уже существующие строки
+            restored_links = 0
+            for other_table in LINK_ENTITY_TABLES.values():
+                if other_table == table_name:
+                    continue
+                rows, _ = await _move(
+                    conn,
+                    "links",
+                    "((src_type = :type AND src_id = :id AND dst_type = :other_type) "
+                    "OR (dst_type = :type AND dst_id = :id AND src_type = :other_type)) "
+                    f"AND (CASE WHEN src_type = :type THEN dst_id ELSE src_id END) IN (SELECT id FROM {other_table})",
+                    {**params, "type": LINK_TYPES[table_name], "other_type": LINK_TYPES[other_table]},
+                    restore=True,
+                )
+                restored_links += rows
+            moved["links"] = (restored_links, 0)
+        for association, column, other_column, other_table in _links_of(table_name):
+            moved[association.name] = await _move(
+                conn,
+                association.name,
+                f"{column} = :id AND {other_column} IN (SELECT id FROM {other_table})",
+                params,
+                restore=True,
+            )
+        # Иначе следующий запуск архивации сразу унёс бы строку обратно
+        await conn.execute(
+            text(f"UPDATE {table_name} SET is_deleted = false, updated = now() WHERE id = :id"), params
+        )
+    restored = {name: rows for name, (rows, _) in moved.items() if rows}
+    for name, rows in restored.items():
+        metrics.inc(f"archive.{name}.rows_restored", rows)
+    db_logger.info(f"Restored {table_name} {entity_id} from archive: {restored}")
+    return restored
+
+
+async def archive_periodically(engine: AsyncEngine, interval: float, older_than_days: int, batch_size: int) -> None:
+    """
+    Фоновая архивация внутри бота. Ошибка одного запуска логируется и не останавливает цикл.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await archive_deleted(engine, older_than_days, batch_size)
+        except Exception as e:
+            db_logger.error(f"Archiving failed: {e}")
@@ -0,0 +1,107 @@
+from datetime import timedelta
+from typing import Iterable, List, Sequence, Tuple
+from sqlalchemy import case, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.changes import mark_task_changed, mark_user_changed
+from database.links import link_store
+from database.models import DbSubtask, DbTask, TaskStatus
+from utils.metrics import metrics
+
+# Массовые (и точечные) действия над задачами пользователя. Каждое — один UPDATE/INSERT на таблицу
+# без загрузки ORM-объектов; commit делает вызывающий, поэтому несколько действий
+# можно объединить в одну транзакцию. Задачи других пользователей и удалённые пропускаются.
+
+
+def _update_tasks(user_id: int, task_ids: Iterable[int]):
+    return (
+        update(DbTask)
+        .where(DbTask.id.in_(list(task_ids)), DbTask.user_id == user_id, DbTask.is_deleted == False)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _mark(session: AsyncSession, action: str, task_ids: Sequence[int]) -> None:
+    for task_id in task_ids:
+        mark_task_changed(session, task_id)
+    metrics.inc(f"bulk.{action}.tasks", len(task_ids))
+
+
+async def set_status(session: AsyncSession, user_id: int, task_ids: Iterable[int], status: TaskStatus) -> int:
+    ids = (await session.scalars(
+        _update_tasks(user_id, task_ids).where(DbTask.status != status).values(status=status).returning(DbTask.id)
+    )).all()
+    _mark(session, "status", ids)
+    return len(ids)
+
+
+async def set_task_status(session: AsyncSession, user_id: int, task_id: int, status: TaskStatus) -> bool:
+    """Ставит статус одной задаче (повторная установка того же — не ошибка). False — задача не найдена."""
+    ids = (await session.scalars(
+        _update_tasks(user_id, [task_id]).values(status=status).returning(DbTask.id)
+    )).all()
+    _mark(session, "status", ids)
+    return bool(ids)
+
+
+async def set_subtask_done(session: AsyncSession, user_id: int, subtask_id: int, is_done: bool) -> bool:
+    """Отмечает подзадачу выполненной или нет. False — подзадача или её задача не найдены."""
+    owned_task = select(DbTask.id).where(DbTask.user_id == user_id, DbTask.is_deleted == False)
+    task_id = await session.scalar(
+        update(DbSubtask)
+        .where(DbSubtask.id == subtask_id, DbSubtask.is_deleted == False, DbSubtask.task_id.in_(owned_task))
+        .values(is_done=is_done)
+        .returning(DbSubtask.task_id)
+        .execution_options(synchronize_session=False)
+    )
+    if task_id is None:
+        return False
+    mark_task_changed(session, task_id)
+    return True
+
+
+async def cycle_status(session: AsyncSession, user_id: int, task_ids: Iterable[int]) -> List[Tuple[int, TaskStatus]]:
+    """
+    Переводит задачи в следующий статус (TaskStatus.next) на стороне БД.
+    Возвращает (id, новый статус) изменённых задач.
+    """
+    status_type = DbTask.status.type
+    next_status = case(
+        (DbTask.status == TaskStatus.NEW, literal(TaskStatus.IN_PROGRESS, status_type)),
+        (DbTask.status == TaskStatus.IN_PROGRESS, literal(TaskStatus.COMPLETED, status_type)),
+        else_=literal(TaskStatus.NEW, status_type),
+    )
+    rows = (await session.execute(
+        _update_tasks(user_id, task_ids).values(status=next_status).returning(DbTask.id, DbTask.status)
+    )).all()
+    _mark(session, "status", [row.id for row in rows])
+    return [tuple(row) for row in rows]
+
+
+async def shift_deadline(session: AsyncSession, user_id: int, task_ids: Iterable[int], days: int) -> int:
+    """Сдвигает срок на days дней (можно отрицательное); задачи без срока не меняются."""
+    ids = (await session.scalars(
+        _update_tasks(user_id, task_ids)
+        .where(DbTask.deadline.isnot(None))
+        .values(deadline=DbTask.deadline + timedelta(days=days))
+        .returning(DbTask.id)
+    )).all()
+    _mark(session, "deadline", ids)
+    return len(ids)
+
+
+async def add_tag(session: AsyncSession, user_id: int, task_ids: Iterable[int], tag_id: int) -> int:
+    """Вешает тег на задачи; уже отмеченные тегом не считаются. Возвращает число новых связей."""
+    task_ids = list(task_ids)
+    added = await link_store.link_many(session, user_id, "task", task_ids, "tag", tag_id)
+    if added:
+        _mark(session, "tag", task_ids)
+    return added
+
+
+async def delete_tasks(session: AsyncSession, user_id: int, task_ids: Iterable[int]) -> int:
+    """Помечает задачи удалёнными (как одиночное удаление из окна задачи)."""
+    ids = (await session.scalars(_update_tasks(user_id, task_ids).values(is_deleted=True).returning(DbTask.id))).all()
+    _mark(session, "delete", ids)
+    if ids:
+        mark_user_changed(session, user_id)
+    return len(ids)
@@ -0,0 +1,143 @@
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Tuple
+from environs import Env
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import JSON
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.links import link_store
+from database.models import LINK_ENTITY_TABLES
+from utils.cache import LRUCache, Versions
+from utils.metrics import metrics
+
+env = Env()
+env.read_env()
+
+PERIODS = ("today", "week", "month", "year")
+# Сколько элементов каждого раздела попадает в сводку (остальные только считаются)
+DIGEST_MAX_ITEMS = env.int("DIGEST_MAX_ITEMS", 30)
+# Объекты, связи с которыми показываются у задач и событий
+LINKED_TYPES = ("goal", "idea", "note")
+
+
+def period_bounds(period: str, now: datetime) -> Tuple[datetime, datetime]:
+    """Начало и конец (не включая) текущего дня, недели (с понедельника), месяца или года."""
+    day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == "today":
+        return day, day + timedelta(days=1)
+    if period == "week":
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=7)
+    if period == "month":
+        start = day.replace(day=1)
+        return start, (start + timedelta(days=32)).replace(day=1)
+    if period == "year":
+        start = day.replace(month=1, day=1)
+        return start, start.replace(year=start.year + 1)
+    raise ValueError(f"Unknown period {period}, expected one of: {', '.join(PERIODS)}")
+
+
+@lru_cache(maxsize=None)
+def digest_sql(store) -> str:
+    """
+    Сводка за период одним запросом: задачи и подзадачи по deadline, события по start_time
+    (у задач и событий — связанные цели, идеи и заметки) и все текущие цели. Каждый раздел —
+    json_agg не больше :limit первых по сроку элементов плюс их общее число.
+    Выборки идут по индексам (user_id, deadline/start_time); связи — только от попавших в период
+    задач и событий.
+    """
+    linked_nodes = "\nUNION ALL ".join(
+        f"SELECT '{node_type}'::text AS type, id, name FROM {LINK_ENTITY_TABLES[node_type]} "
+        f"WHERE user_id = :user_id AND NOT is_deleted"
+        for node_type in LINKED_TYPES
+    )
+    links = """
+        SELECT coalesce(json_agg(json_build_object('type', l.type, 'name', l.name) ORDER BY l.type, l.name), '[]')
+        FROM linked l WHERE l.root_type = '{root_type}' AND l.root_id = {alias}.id
+    """
+    return f"""
+WITH
+    t AS (
+        SELECT id, name, status, deadline FROM tasks
+        WHERE user_id = :user_id AND NOT is_deleted AND deadline >= :start AND deadline < :end
+    ),
+    st AS (
+        SELECT s.id, s.name, s.is_done, s.deadline, tk.name AS task_name
+        FROM subtasks s JOIN tasks tk ON tk.id = s.task_id
+        WHERE tk.user_id = :user_id AND NOT tk.is_deleted AND NOT s.is_deleted
+          AND s.deadline >= :start AND s.deadline < :end
+    ),
+    ev AS (
+        SELECT id, name, start_time, end_time FROM events
+        WHERE user_id = :user_id AND NOT is_deleted AND start_time >= :start AND start_time < :end
+    ),
+    roots AS (
+        SELECT 'task'::text AS type, id FROM (SELECT id FROM t ORDER BY deadline, id LIMIT :limit) r
+        UNION ALL SELECT 'event', id FROM (SELECT id FROM ev ORDER BY start_time, id LIMIT :limit) r
+    ),
+    linked AS (
+        SELECT e.from_type AS root_type, e.from_id AS root_id, v.type, v.name
+        FROM roots r
+        JOIN ({store.edges_sql(("task", "event", *LINKED_TYPES))}) e ON e.from_type = r.type AND e.from_id = r.id
+        JOIN ({linked_nodes}) v ON v.type = e.to_type AND v.id = e.to_id
+    )
+SELECT
+    (SELECT count(*) FROM t) AS tasks_total,
+    (SELECT coalesce(json_agg(json_build_object(
+        'name', t.name, 'status', t.status, 'deadline', t.deadline,
+        'links', ({links.format(root_type="task", alias="t")})
+     ) ORDER BY t.deadline, t.id), '[]')
+     FROM (SELECT * FROM t ORDER BY deadline, id LIMIT :limit) t) AS tasks,
+    (SELECT count(*) FROM st) AS subtasks_total,
+    (SELECT coalesce(json_agg(json_build_object(
+        'name', st.name, 'is_done', st.is_done, 'deadline', st.deadline, 'task_name', st.task_name
+     ) ORDER BY st.deadline, st.id), '[]')
+     FROM (SELECT * FROM st ORDER BY deadline, id LIMIT :limit) st) AS subtasks,
+    (SELECT count(*) FROM ev) AS events_total,
+    (SELECT coalesce(json_agg(json_build_object(
+        'name', ev.name, 'start_time', ev.start_time, 'end_time', ev.end_time,
+        'links', ({links.format(root_type="event", alias="ev")})
+     ) ORDER BY ev.start_time, ev.id), '[]')
+     FROM (SELECT * FROM ev ORDER BY start_time, id LIMIT :limit) ev) AS events,
+    (SELECT count(*) FROM goals WHERE user_id = :user_id AND NOT is_deleted) AS goals_total,
+    (SELECT coalesce(json_agg(json_build_object('name', g.name, 'deadline', g.deadline)
+     ORDER BY g.deadline NULLS LAST, g.id), '[]')
+     FROM (
+        SELECT id, name, deadline FROM goals WHERE user_id = :user_id AND NOT is_deleted
+        ORDER BY deadline NULLS LAST, id LIMIT :limit
+     ) g) AS goals
+"""
+
+
+async def fetch_digest(session: AsyncSession, user_id: int, start: datetime, end: datetime, store=None) -> dict:
+    """Сводка за [start, end) без кэша: разделы tasks, subtasks, events, goals и их *_total."""
+    started = time.perf_counter()
+    row = (await session.execute(
+        text(digest_sql(store or link_store)).columns(tasks=JSON, subtasks=JSON, events=JSON, goals=JSON),
+        {"user_id": user_id, "start": start, "end": end, "limit": DIGEST_MAX_ITEMS},
+    )).one()
+    metrics.observe("digest.query_ms", (time.perf_counter() - started) * 1000)
+    return dict(row._mapping)
+
+
+# Версия сводок пользователя (по tg_id) растёт с каждой его закоммиченной записью
+# (database.changes, вид TG_USER); TTL — страховка от записей мимо пометок
+digest_versions = Versions(env.int("USER_CACHE_SIZE", 10000))
+digest_cache = LRUCache(
+    maxsize=env.int("DIGEST_CACHE_SIZE", 10000), ttl=env.float("DIGEST_CACHE_TTL", 600), name="digest"
+)
+
+
+async def get_digest(session: AsyncSession, tg_id: int, user_id: int, period: str) -> dict:
+    """
+    Сводка за текущий период с кэшем. Начало периода входит в ключ, поэтому со сменой
+    дня (недели, ...) запись перестаёт находиться сама; версия берётся до запроса.
+    """
+    start, end = period_bounds(period, datetime.now())
+    key = (tg_id, period, start, digest_versions.get(tg_id))
+    digest = digest_cache.get(key)
+    if digest is None:
+        digest = await fetch_digest(session, user_id, start, end)
+        digest_cache.set(key, digest)
+    return {**digest, "start": start, "end": end}
@@ -1,10 +1,11 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from database import models as db_models
+from database.changes import mark_user_changed
 from maps.answers_info import answer_to_db
 from models.answers import ResponseModel 
 from models.answers import ToAddModel, ToEditModel, ToDeleteModel
 
-def execute(session: Session, resp: ResponseModel, user_id: int) -> tuple[list, list, list]:
+async def execute(session: AsyncSession, resp: ResponseModel, user_id: int) -> tuple[list, list, list]:
     """
     Выполняет команды добавления, изменения и удаления объектов в базе данных.
     Возвращает словарь с результатами: added, updated, deleted.
@@ -17,18 +18,20 @@ def execute(session: Session, resp: ResponseModel, user_id: int) -> tuple[list,
         return added_items, updated_items, deleted_items
         
     if getattr(resp, "to_add", None):
-        added_items = execute_add(session, resp.to_add, user_id)
+        added_items = await execute_add(session, resp.to_add, user_id)
         
     if getattr(resp, "to_edit", None):
-        updated_items = execute_edit(session, resp.to_edit)
+        updated_items = await execute_edit(session, resp.to_edit)
         
     if getattr(resp, "to_delete", None):
-        deleted_items = execute_delete(session, resp.to_delete)
+        deleted_items = await execute_delete(session, resp.to_delete)
         
-    session.commit()
+    # Добавления, переименования и удаления меняют вершины графа связанных объектов
+    mark_user_changed(session, user_id)
+    await session.commit()
     return added_items, updated_items, deleted_items
 
-def execute_add(session: Session, to_add: ToAddModel, user_id: int) -> list:
+async def execute_add(session: AsyncSession, to_add: ToAddModel, user_id: int) -> list:
     """
     Выполняет добавление объектов в базу данных с привязкой к пользователю.
     Возвращает список добавленных объектов.
@@ -36,19 +39,19 @@ def execute_add(session: Session, to_add: ToAddModel, user_id: int) -> list:
     added_items = []
     
     if getattr(to_add, "tasks", None):
-        added_items.extend(_add_tasks_with_subtasks(session, to_add.tasks, user_id))
+        added_items.extend(await _add_tasks_with_subtasks(session, to_add.tasks, user_id))
         
     if getattr(to_add, "subtasks", None):
-        added_items.extend(_add_subtasks_for_existing_tasks(session, to_add.subtasks, user_id))
+        added_items.extend(await _add_subtasks_for_existing_tasks(session, to_add.subtasks, user_id))
         
     for key in ["events", "goals", "ideas", "notes", "tags"]:
         items = getattr(to_add, key, None)
         if items:
-            added_items.extend(_add_simple_items(session, key, items, user_id))
+            added_items.extend(await _add_simple_items(session, key, items, user_id))
             
     return added_items
 
-def _add_tasks_with_subtasks(session: Session, tasks, user_id: int) -> list:
+async def _add_tasks_with_subtasks(session: AsyncSession, tasks, user_id: int) -> list:
     """
     Добавляет задачи с подзадачами, привязывая их к пользователю.
     """
@@ -63,7 +66,7 @@ def _add_tasks_with_subtasks(session: Session, tasks, user_id: int) -> list:
         user_id=user_id  # Привязка к пользователю
         )
         session.add(db_task)
-        session.flush()  # Получаем id задачи для подзадач
+        await session.flush()  # Получаем id задачи для подзадач
         
         added_items.append({
             'type': 'Task',
@@ -88,7 +91,7 @@ def _add_tasks_with_subtasks(session: Session, tasks, user_id: int) -> list:
             
     return added_items
 
-def _add_subtasks_for_existing_tasks(session: Session, subtasks, user_id: int) -> list:
+async def _add_subtasks_for_existing_tasks(session: AsyncSession, subtasks, user_id: int) -> list:
     """
     Добавляет подзадачи к существующим задачам.
     """
@@ -110,7 +113,7 @@ def _add_subtasks_for_existing_tasks(session: Session, subtasks, user_id: int) -
         
     return added_items
 
-def _add_simple_items(session: Session, key: str, items, user_id: int) -> list:
+async def _add_simple_items(session: AsyncSession, key: str, items, user_id: int) -> list:
     """
     Добавляет простые объекты (events, goals, ideas, notes, tags) с привязкой к пользователю.
     """
@@ -129,7 +132,7 @@ def _add_simple_items(session: Session, key: str, items, user_id: int) -> list:
             
         db_obj = db_model(**data)
         session.add(db_obj)
-        session.flush()  # Получаем id объекта
+        await session.flush()  # Получаем id объекта
         
         added_items.append({
             'type': db_model.__name__,
@@ -139,7 +142,7 @@ def _add_simple_items(session: Session, key: str, items, user_id: int) -> list:
         
     return added_items
 
-def execute_edit(session: Session, to_edit: ToEditModel) -> list:
+async def execute_edit(session: AsyncSession, to_edit: ToEditModel) -> list:
     """
     Выполняет изменение существующих объектов в базе данных.
     Возвращает список изменённых объектов.
@@ -154,7 +157,7 @@ def execute_edit(session: Session, to_edit: ToEditModel) -> list:
             
         db_model = info["db"]
         for item in items:
-            db_obj = session.get(db_model, item.id)
+            db_obj = await session.get(db_model, item.id)
             if not db_obj:
                 continue
                 
@@ -176,7 +179,7 @@ def execute_edit(session: Session, to_edit: ToEditModel) -> list:
             
     return updated_items
 
-def execute_delete(session: Session, to_delete: ToDeleteModel) -> list:
+async def execute_delete(session: AsyncSession, to_delete: ToDeleteModel) -> list:
     """
     Выполняет удаление объектов из базы данных (устанавливает is_deleted=True).
     Возвращает список удалённых объектов.
@@ -190,13 +193,13 @@ def execute_delete(session: Session, to_delete: ToDeleteModel) -> list:
             
         db_model = info["db"]
         for item in items:
-            db_obj = session.get(db_model, item.id)
+            db_obj = await session.get(db_model, item.id)
             if db_obj:
                 if hasattr(db_obj, "is_deleted"):
                     db_obj.is_deleted = True
                 else:
                     # Если модель не поддерживает soft delete, удаляем физически
-                    session.delete(db_obj)
+                    await session.delete(db_obj)
                     
                 deleted_items.append({
                     'type': db_model.__name__,
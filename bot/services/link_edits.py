@@ -0,0 +1,154 @@
+import asyncio
+import itertools
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import AsyncIterator, Dict, Iterable, List, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from database.changes import mark_task_changed
+from database.links import link_store
+from database.models import DbTask
+from utils.cache import LRUCache
+from utils.logger import tasks_logger
+from utils.metrics import metrics
+
+# (user_id, task_id, тип связанных объектов)
+EditKey = Tuple[int, int, str]
+
+
+async def write_link_edit(session: AsyncSession, user_id: int, task_id: int, link_type: str, ids: Iterable[int]) -> int:
+    """
+    Приводит связи задачи пользователя с объектами link_type к набору ids. Без commit;
+    возвращает число изменённых строк (0 и для чужой или несуществующей задачи).
+    """
+    if not await session.scalar(select(DbTask.id).where(DbTask.id == task_id, DbTask.user_id == user_id)):
+        return 0
+    changed = await link_store.set_linked_ids(session, user_id, "task", task_id, link_type, ids)
+    if changed:
+        mark_task_changed(session, task_id)
+    return changed
+
+
+class LinkEditBuffer:
+    """
+    Отложенная запись правок связей из multiselect-окон. Каждая отметка заменяет
+    предыдущую правку того же ключа и перезапускает таймер: если пользователь delay секунд
+    ничего не отмечал, правка пишется отдельной транзакцией. Уход из окна пишет правки
+    сразу (см. dialogs.tasks_dialog.flush_link_edits) и снимает таймер через discard.
+    Номер правки (seq) выдаёт add: он растёт с каждой отметкой и уникален на весь процесс,
+    а не на один диалог, и отсчитывается от времени запуска, поэтому правки, сохранённые в
+    состоянии диалога до перезапуска, старше новых. Записанные номера запоминаются, чтобы
+    повторная запись из состояния диалога не затёрла более поздние изменения.
+    Записи одного ключа (по таймеру и при уходе из окна) идут по очереди под блокировкой
+    ключа, и номер сверяется уже под ней: более старая правка не перепишет более новую.
+    """
+    def __init__(self, delay: float):
+        self.delay = delay
+        self._pending: Dict[EditKey, tuple] = {}
+        self._timers: Dict[EditKey, asyncio.Task] = {}
+        self._flushed = LRUCache(maxsize=10000)
+        self._seq = itertools.count(time.time_ns())
+        # Ключ -> [блокировка, сколько задач её держит или ждёт]
+        self._locks: Dict[EditKey, list] = {}
+
+    @asynccontextmanager
+    async def _locked(self, key: EditKey) -> AsyncIterator[None]:
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    def add(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        tg_id: int,
+        user_id: int,
+        task_id: int,
+        link_type: str,
+        ids: List[int],
+    ) -> int:
+        """Ставит правку в очередь; возвращает её номер (seq) для записи в состояние диалога."""
+        key = (user_id, task_id, link_type)
+        seq = next(self._seq)
+        self._pending[key] = (session_factory, tg_id, ids, seq)
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        self._timers[key] = asyncio.create_task(self._flush_later(key))
+        metrics.inc("link_edits.buffered")
+        return seq
+
+    def is_flushed(self, user_id: int, task_id: int, link_type: str, seq: int) -> bool:
+        return self._flushed.get((user_id, task_id, link_type), 0) >= seq
+
+    def discard(self, user_id: int, task_id: int, link_type: str, seq: int) -> None:
+        """Правка до seq включительно уже записана вызывающим: отменяем таймер, если он ещё ждёт."""
+        key = (user_id, task_id, link_type)
+        self._flushed.set(key, max(seq, self._flushed.get(key, 0)))
+        pending = self._pending.get(key)
+        if pending is not None and pending[3] <= seq:
+            del self._pending[key]
+            timer = self._timers.pop(key, None)
+            if timer is not None:
+                timer.cancel()
+
+    async def _flush_later(self, key: EditKey) -> None:
+        await asyncio.sleep(self.delay)
+        # Таймер больше не отменяем: запись уже идёт
+        self._timers.pop(key, None)
+        await self._flush(key)
+        metrics.inc("link_edits.flushed_by_timer")
+
+    async def _flush(self, key: EditKey) -> None:
+        async with self._locked(key):
+            pending = self._pending.pop(key, None)
+            if pending is None:
+                return
+            session_factory, tg_id, ids, seq = pending
+            user_id, task_id, link_type = key
+            if self.is_flushed(user_id, task_id, link_type, seq):
+                return
+            try:
+                async with session_factory() as session:
+                    session.info["tg_id"] = tg_id
+                    changed = await write_link_edit(session, user_id, task_id, link_type, ids)
+                    await session.commit()
+            except Exception as e:
+                tasks_logger.error(f"Failed to flush {link_type} links of task {task_id}: {e}")
+                return
+            self._flushed.set(key, max(seq, self._flushed.get(key, 0)))
+        tasks_logger.info(f"Flushed {link_type} links of task {task_id}: {ids} ({changed} rows changed)")
+
+    async def write_edits(self, session: AsyncSession, user_id: int, edits: List[Tuple[int, str, List[int], int]]) -> int:
+        """
+        Пишет правки (task_id, link_type, ids, seq) в сессии вызывающего одной транзакцией
+        и с commit. Ключи блокируются на время записи (по порядку — без взаимных блокировок);
+        правки, номер которых уже записан, пропускаются. Возвращает число изменённых строк.
+        """
+        changed = 0
+        keys = sorted({(user_id, task_id, link_type) for task_id, link_type, _, _ in edits})
+        async with AsyncExitStack() as stack:
+            for key in keys:
+                await stack.enter_async_context(self._locked(key))
+            for task_id, link_type, ids, seq in edits:
+                if not self.is_flushed(user_id, task_id, link_type, seq):
+                    changed += await write_link_edit(session, user_id, task_id, link_type, ids)
+            await session.commit()
+            for task_id, link_type, _, seq in edits:
+                self.discard(user_id, task_id, link_type, seq)
+        return changed
+
+    async def flush_all(self) -> None:
+        """Пишет все ожидающие правки (остановка бота)."""
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        for key in list(self._pending):
+            await self._flush(key)
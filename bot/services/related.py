@@ -0,0 +1,180 @@
+import time
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+from environs import Env
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.links import link_store
+from database.models import LINK_ENTITY_TABLES
+from utils.cache import LRUCache
+from utils.metrics import metrics
+
+env = Env()
+env.read_env()
+
+# Вершины графа. Теги не обходятся: тег связывает всё подряд и за один шаг
+# превратил бы «связанное» во «всё, что есть у пользователя»
+GRAPH_TYPES = ("task", "event", "goal", "idea", "note")
+
+RELATED_DEFAULT_DEPTH = 2
+RELATED_DEFAULT_FANOUT = 10
+# Обход ограничен сверху: не больше fanout ** depth путей от каждой вершины-корня
+RELATED_MAX_DEPTH = env.int("RELATED_MAX_DEPTH", 3)
+RELATED_MAX_FANOUT = env.int("RELATED_MAX_FANOUT", 25)
+
+Root = Tuple[str, int]
+
+
+class RelatedItem(NamedTuple):
+    type: str
+    id: int
+    name: str
+    depth: int
+
+
+@lru_cache(maxsize=None)
+def related_sql(store) -> str:
+    """
+    Рекурсивный обход графа связей от нескольких корней сразу. Каждый шаг берёт не больше
+    :fanout соседей вершины (LATERAL ... LIMIT) и не возвращается в вершины своего пути.
+    Соседи — только неудалённые объекты пользователя, поэтому удалённый объект разрывает путь.
+    Вершина, достижимая разными путями, возвращается один раз — с наименьшей глубиной.
+    """
+    nodes = "\nUNION ALL ".join(
+        f"SELECT '{node_type}'::text AS type, id, name FROM {LINK_ENTITY_TABLES[node_type]} "
+        f"WHERE user_id = :user_id AND NOT is_deleted"
+        for node_type in GRAPH_TYPES
+    )
+    return f"""
+WITH RECURSIVE walk(root_type, root_id, type, id, name, depth, path) AS (
+    SELECT v.type, v.id, v.type, v.id, v.name, 0, ARRAY[v.type || ':' || v.id]
+    FROM unnest(CAST(:root_types AS text[]), CAST(:root_ids AS integer[])) AS r(type, id)
+    JOIN ({nodes}) v ON v.type = r.type AND v.id = r.id
+  UNION ALL
+    SELECT w.root_type, w.root_id, n.type, n.id, n.name, w.depth + 1, w.path || (n.type || ':' || n.id)
+    FROM walk w
+    CROSS JOIN LATERAL (
+        SELECT e.to_type AS type, e.to_id AS id, v.name
+        FROM ({store.edges_sql(GRAPH_TYPES)}) e
+        JOIN ({nodes}) v ON v.type = e.to_type AND v.id = e.to_id
+        WHERE e.from_type = w.type AND e.from_id = w.id
+          AND NOT (e.to_type || ':' || e.to_id) = ANY(w.path)
+        ORDER BY e.to_type, e.to_id
+        LIMIT :fanout
+    ) n
+    WHERE w.depth < :depth
+)
+SELECT DISTINCT ON (root_type, root_id, type, id) root_type, root_id, type, id, name, depth
+FROM walk
+WHERE depth > 0
+ORDER BY root_type, root_id, type, id, depth
+"""
+
+
+async def fetch_related(
+    session: AsyncSession,
+    user_id: int,
+    roots: Iterable[Root],
+    depth: int = RELATED_DEFAULT_DEPTH,
+    fanout: int = RELATED_DEFAULT_FANOUT,
+    store=None,
+) -> Dict[Root, List[RelatedItem]]:
+    """
+    Объекты в пределах depth шагов от каждого корня (без кэша): корень -> список по глубине и имени.
+    Корни чужих или удалённых объектов получают пустой список.
+    """
+    roots = list(dict.fromkeys(roots))
+    for root_type, _ in roots:
+        if root_type not in GRAPH_TYPES:
+            raise ValueError(f"Unknown item type {root_type}, expected one of: {', '.join(GRAPH_TYPES)}")
+    result = {root: [] for root in roots}
+    if not roots:
+        return result
+    started = time.perf_counter()
+    rows = (await session.execute(text(related_sql(store or link_store)), {
+        "user_id": user_id,
+        "root_types": [root_type for root_type, _ in roots],
+        "root_ids": [root_id for _, root_id in roots],
+        "depth": max(1, min(depth, RELATED_MAX_DEPTH)),
+        "fanout": max(1, min(fanout, RELATED_MAX_FANOUT)),
+    })).all()
+    metrics.observe("related.query_ms", (time.perf_counter() - started) * 1000)
+    for row in rows:
+        result[(row.root_type, row.root_id)].append(RelatedItem(row.type, row.id, row.name, row.depth))
+    for items in result.values():
+        items.sort(key=lambda item: (item.depth, GRAPH_TYPES.index(item.type), item.name or ""))
+    return result
+
+
+class RelatedItemsCache:
+    """
+    Кэш связанных объектов по пользователям: user_id -> {(корень, depth, fanout): список}.
+    Изменение связей или объектов пользователя (database.changes, вид USER) сбрасывает
+    все его записи разом. Запрос, начатый до сброса, пишет в уже выброшенный словарь
+    и не может вернуть устаревший результат.
+    """
+    def __init__(self, max_users: int, per_user: int, ttl: Optional[float] = None):
+        self.per_user = per_user
+        self._users = LRUCache(maxsize=max_users, ttl=ttl)
+
+    def entries(self, user_id: int) -> dict:
+        entries = self._users.get(user_id)
+        if entries is None:
+            entries = {}
+            self._users.set(user_id, entries)
+        return entries
+
+    def invalidate(self, user_id: int) -> None:
+        if self._users.pop(user_id) is not None:
+            metrics.inc("related.cache.invalidations")
+
+
+# TTL — страховка от изменений, прошедших мимо mark_user_changed (другой процесс, ручной SQL)
+related_cache = RelatedItemsCache(
+    max_users=env.int("RELATED_CACHE_USERS", 10000),
+    per_user=env.int("RELATED_CACHE_PER_USER", 64),
+    ttl=env.int("RELATED_CACHE_TTL", 600),
+)
+
+
+async def get_related_items(
+    session: AsyncSession,
+    user_id: int,
+    roots: Sequence[Root],
+    depth: int = RELATED_DEFAULT_DEPTH,
+    fanout: int = RELATED_DEFAULT_FANOUT,
+) -> Dict[Root, List[RelatedItem]]:
+    """
+    То же, что fetch_related, но через кэш: из БД одним запросом догружаются только корни,
+    которых нет в кэше пользователя.
+    """
+    entries = related_cache.entries(user_id)
+    result, missing = {}, []
+    for root in roots:
+        cached = entries.get((root, depth, fanout))
+        if cached is None:
+            missing.append(root)
+        else:
+            result[root] = cached
+    metrics.inc("related.cache.hits", len(roots) - len(missing))
+    metrics.inc("related.cache.misses", len(missing))
+    if missing:
+        fetched = await fetch_related(session, user_id, missing, depth, fanout)
+        if len(entries) + len(fetched) > related_cache.per_user:
+            entries.clear()
+        for root, items in fetched.items():
+            entries[(root, depth, fanout)] = items
+        result.update(fetched)
+    return result
+
+
+async def get_related(
+    session: AsyncSession,
+    user_id: int,
+    item_type: str,
+    item_id: int,
+    depth: int = RELATED_DEFAULT_DEPTH,
+    fanout: int = RELATED_DEFAULT_FANOUT,
+) -> List[RelatedItem]:
+    """Связанные объекты одного объекта (через кэш)."""
+    return (await get_related_items(session, user_id, [(item_type, item_id)], depth, fanout))[(item_type, item_id)]
@@ -0,0 +1,114 @@
+import asyncio
+from datetime import datetime
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from database.models import DbTask, DbUserStats, TaskStatus
+from utils.logger import db_logger
+from utils.metrics import metrics
+
+COUNTERS = [
+    "tasks", "tasks_new", "tasks_in_progress", "tasks_completed",
+    "subtasks", "subtasks_done", "events", "goals", "ideas", "notes", "tags",
+]
+
+# Фактические значения счётчиков для пачки пользователей; каждая выборка идёт по индексам user_id
+ACTUAL_STATS = f"""
+WITH
+    t AS (
+        SELECT user_id,
+               count(*) AS tasks,
+               count(*) FILTER (WHERE status = 'NEW') AS tasks_new,
+               count(*) FILTER (WHERE status = 'IN_PROGRESS') AS tasks_in_progress,
+               count(*) FILTER (WHERE status = 'COMPLETED') AS tasks_completed
+        FROM tasks WHERE user_id = ANY(:ids) AND NOT is_deleted GROUP BY user_id
+    ),
+    st AS (
+        SELECT t.user_id, count(*) AS subtasks, count(*) FILTER (WHERE s.is_done) AS subtasks_done
+        FROM subtasks s JOIN tasks t ON t.id = s.task_id
+        WHERE t.user_id = ANY(:ids) AND NOT t.is_deleted AND NOT s.is_deleted GROUP BY t.user_id
+    ),
+    {", ".join(
+        f"{table}_n AS (SELECT user_id, count(*) AS n FROM {table} "
+        f"WHERE user_id = ANY(:ids) AND NOT is_deleted GROUP BY user_id)"
+        for table in ("events", "goals", "ideas", "notes", "tags")
+    )}
+INSERT INTO user_stats AS s (user_id, {", ".join(COUNTERS)})
+SELECT u.id,
+       coalesce(t.tasks, 0), coalesce(t.tasks_new, 0),
+       coalesce(t.tasks_in_progress, 0), coalesce(t.tasks_completed, 0),
+       coalesce(st.subtasks, 0), coalesce(st.subtasks_done, 0),
+       {", ".join(f"coalesce({table}_n.n, 0)" for table in ("events", "goals", "ideas", "notes", "tags"))}
+FROM users u
+LEFT JOIN t ON t.user_id = u.id
+LEFT JOIN st ON st.user_id = u.id
+{" ".join(f"LEFT JOIN {table}_n ON {table}_n.user_id = u.id" for table in ("events", "goals", "ideas", "notes", "tags"))}
+WHERE u.id = ANY(:ids)
+ON CONFLICT (user_id) DO UPDATE SET
+    {", ".join(f"{name} = EXCLUDED.{name}" for name in COUNTERS)},
+    updated = now()
+WHERE ({", ".join(f"s.{name}" for name in COUNTERS)})
+    IS DISTINCT FROM ({", ".join(f"EXCLUDED.{name}" for name in COUNTERS)})
+RETURNING s.user_id
+"""
+
+
+async def get_user_stats(session: AsyncSession, user_id: int) -> dict:
+    """
+    Сводка для /stats: строка user_stats по первичному ключу плюс число просроченных задач.
+    Просрочка зависит от текущего времени, поэтому не хранится, а считается по индексу
+    (user_id, deadline) только среди задач с дедлайном в прошлом.
+    """
+    stats = await session.get(DbUserStats, user_id)
+    overdue = await session.scalar(
+        select(func.count()).select_from(DbTask).where(
+            DbTask.user_id == user_id,
+            DbTask.is_deleted == False,
+            DbTask.deadline.isnot(None),
+            DbTask.deadline < datetime.now(),
+            DbTask.status != TaskStatus.COMPLETED,
+        )
+    )
+    counters = {name: getattr(stats, name) if stats else 0 for name in COUNTERS}
+    return {**counters, "overdue": overdue}
+
+
+async def reconcile_user_stats(engine: AsyncEngine, batch_size: int = 500) -> int:
+    """
+    Пересчитывает user_stats с нуля и исправляет расхождения. Пачка пользователей — одна транзакция:
+    сначала строки user_stats блокируются (FOR UPDATE), потом отдельным запросом считаются
+    фактические значения. Триггеры параллельных записей ждут блокировку, а уже прошедшие
+    записи видны новому снимку, поэтому пересчёт не затирает чужие приращения.
+    Возвращает число исправленных (или созданных) строк.
+    """
+    repaired = 0
+    last_id = 0
+    while True:
+        async with engine.begin() as conn:
+            ids = (await conn.execute(
+                text("SELECT id FROM users WHERE id > :last_id ORDER BY id LIMIT :limit"),
+                {"last_id": last_id, "limit": batch_size},
+            )).scalars().all()
+            if not ids:
+                break
+            await conn.execute(
+                text("SELECT user_id FROM user_stats WHERE user_id = ANY(:ids) FOR UPDATE"), {"ids": ids}
+            )
+            repaired += len((await conn.execute(text(ACTUAL_STATS), {"ids": ids})).all())
+        last_id = ids[-1]
+    metrics.inc("stats.reconcile.runs")
+    metrics.inc("stats.reconcile.repaired_rows", repaired)
+    if repaired:
+        db_logger.warning(f"user_stats drift repaired for {repaired} users")
+    return repaired
+
+
+async def reconcile_periodically(engine: AsyncEngine, interval: float) -> None:
+    """
+    Фоновая сверка user_stats. Ошибка одного запуска логируется и не останавливает цикл.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await reconcile_user_stats(engine)
+        except Exception as e:
+            db_logger.error(f"user_stats reconciliation failed: {e}")
@@ -16,7 +16,7 @@ from models.answers import (
     ResultEnum,
 )
 from database import models as db_models
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from maps.answers_info import answer_to_db
 
 # Определяем updateable и deleteable объекты на основе моделей из answers.py
@@ -27,9 +27,9 @@ deleteable_objects: List[str] = list(ToDeleteModel.model_fields.keys())
 EditModelType = TaskEditModel | SubtaskEditModel | EventEditModel | GoalEditModel | IdeaEditModel | NoteEditModel | TagEditModel
 DeleteModelType = DeleteIdModel
 
-def validate_edit(
+async def validate_edit(
     resp: ResponseModel,
-    session: Session,
+    session: AsyncSession,
     errors: List[str]
 ) -> None:
     """
@@ -41,13 +41,13 @@ def validate_edit(
             continue
         db_model: type = answer_to_db[attr]["db"]
         for item in items:
-            db_obj = session.get(db_model, item.id)
+            db_obj = await session.get(db_model, item.id)
             if not db_obj:
                 errors.append(f"{attr[:-1].capitalize()} with id={item.id} does not exist")
 
-def validate_delete(
+async def validate_delete(
     resp: ResponseModel,
-    session: Session,
+    session: AsyncSession,
     errors: List[str]
 ) -> None:
     """
@@ -59,27 +59,27 @@ def validate_delete(
             continue
         db_model: type = answer_to_db[attr]["db"]
         for item in items:
-            db_obj = session.get(db_model, item.id)
+            db_obj = await session.get(db_model, item.id)
             if not db_obj:
                 errors.append(f"{attr[:-1].capitalize()} with id={item.id} does not exist")
 
-def validate_subtasks(
+async def validate_subtasks(
     resp: ResponseModel,
-    session: Session,
+    session: AsyncSession,
     errors: List[str]
 ) -> None:
     """
     Валидирует подзадачи.
     """
     for item in resp.to_add.subtasks:
-        db_obj = session.get(db_models.DbTask, item.task_id)
+        db_obj = await session.get(db_models.DbTask, item.task_id)
         if not db_obj:
             errors.append(f"Can't add subtask to non-existent task with id={item.task_id}")
 
 
-def validate(
+async def validate(
     answer: str,
-    session: Session
+    session: AsyncSession
 ) -> Tuple[bool, List[str], Optional[AnswerModel]]:
     """
     Валидирует ответ LLM. Использует валидатор pydantic и проверяет на наличие id объектов в базе данных.
@@ -100,13 +100,13 @@ def validate(
         return True, [answer_model.error], answer_model
 
     if getattr(resp, "to_add", None) and getattr(resp.to_add, "subtasks", None):
-        validate_subtasks(resp, session, errors)
+        await validate_subtasks(resp, session, errors)
 
     if getattr(resp, "to_edit", None):
-        validate_edit(resp, session, errors)
+        await validate_edit(resp, session, errors)
 
     if getattr(resp, "to_delete", None):
-        validate_delete(resp, session, errors)
+        await validate_delete(resp, session, errors)
 
     is_valid: bool = not errors
     return is_valid, errors, answer_model
\ No newline at end of file
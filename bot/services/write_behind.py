@@ -0,0 +1,159 @@
+import asyncio
+from collections import deque
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Iterable, List, NamedTuple, Optional, Tuple
+from aiogram import Bot
+from sqlalchemy import Row
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from utils.logger import tasks_logger
+from utils.metrics import metrics
+
+# Запись: выполняется в транзакции очереди, без commit; False — объект не найден (удалён или чужой)
+Write = Callable[[AsyncSession], Awaitable[bool]]
+
+
+class PendingWrite(NamedTuple):
+    seq: int
+    description: str
+    write: Write
+    overlay: Dict[Hashable, Any]
+
+
+class _UserQueue:
+    __slots__ = ("session_factory", "bot", "tg_id", "items", "overlay", "wake", "task")
+
+    def __init__(self, session_factory: async_sessionmaker[AsyncSession], bot: Bot, tg_id: int):
+        self.session_factory = session_factory
+        self.bot = bot
+        self.tg_id = tg_id
+        self.items: Deque[PendingWrite] = deque()
+        # Ключ оверлея -> (seq записи, значение), которое пользователь уже видит
+        self.overlay: Dict[Hashable, Tuple[int, Any]] = {}
+        self.wake = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+
+class WriteBehindQueue:
+    """
+    Отложенная запись изменений из кнопок (WRITE_BEHIND): хендлер отвечает на callback сразу,
+    а изменение ставится в очередь пользователя. Очередь пишется пачками не чаще раза в delay
+    секунд, по порядку, одной транзакцией на пачку. Пока запись не закоммичена, её значения
+    лежат в оверлее (overlay) — списки показывают их поверх прочитанных строк.
+
+    Если пачка не прошла, она откатывается и повторяется по одной записи в savepoint:
+    теряются только сбойные записи. Их значения убираются из оверлея, а пользователю
+    приходит сообщение, что изменение не сохранено.
+    """
+    def __init__(self, enabled: bool, delay: float, max_batch: int):
+        self.enabled = enabled
+        self.delay = delay
+        self.max_batch = max_batch
+        self._users: Dict[int, _UserQueue] = {}
+        self._seq = 0
+
+    def submit(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        bot: Bot,
+        tg_id: int,
+        user_id: int,
+        description: str,
+        write: Write,
+        overlay: Dict[Hashable, Any],
+    ) -> None:
+        queue = self._users.get(user_id)
+        if queue is None:
+            queue = self._users[user_id] = _UserQueue(session_factory, bot, tg_id)
+        self._seq += 1
+        queue.items.append(PendingWrite(self._seq, description, write, overlay))
+        for key, value in overlay.items():
+            queue.overlay[key] = (self._seq, value)
+        if queue.task is None:
+            queue.task = asyncio.create_task(self._run(user_id, queue))
+        metrics.inc("write_behind.submitted")
+
+    def overlay(self, user_id: int) -> Dict[Hashable, Any]:
+        """Значения ещё не записанных изменений пользователя."""
+        queue = self._users.get(user_id)
+        return {key: value for key, (_, value) in queue.overlay.items()} if queue else {}
+
+    async def flush_user(self, user_id: int) -> None:
+        """Записывает очередь пользователя без ожидания (перед чтением, которому нужны свежие данные)."""
+        queue = self._users.get(user_id)
+        if queue is not None and queue.task is not None:
+            queue.wake.set()
+            await asyncio.shield(queue.task)
+
+    async def flush_all(self) -> None:
+        """Пишет все очереди (остановка бота)."""
+        for user_id in list(self._users):
+            await self.flush_user(user_id)
+
+    async def _run(self, user_id: int, queue: _UserQueue) -> None:
+        while queue.items:
+            try:
+                await asyncio.wait_for(queue.wake.wait(), self.delay)
+            except asyncio.TimeoutError:
+                pass
+            # flush_user будит одну запись: следующие пачки снова ждут delay
+            queue.wake.clear()
+            batch = [queue.items.popleft() for _ in range(min(len(queue.items), self.max_batch))]
+            await self._write_batch(queue, batch)
+        # Между последней проверкой очереди и удалением нет await — новая запись не потеряется
+        del self._users[user_id]
+
+    async def _commit(self, queue: _UserQueue, batch: List[PendingWrite], isolate: bool) -> List[Tuple[PendingWrite, str]]:
+        """Пишет пачку одной транзакцией; isolate — каждая запись в своём savepoint. Возвращает сбойные записи."""
+        failed = []
+        async with queue.session_factory() as session:
+            session.info["tg_id"] = queue.tg_id
+            for item in batch:
+                if not isolate:
+                    if not await item.write(session):
+                        failed.append((item, "объект не найден"))
+                    continue
+                try:
+                    async with session.begin_nested():
+                        if not await item.write(session):
+                            failed.append((item, "объект не найден"))
+                except Exception as e:
+                    failed.append((item, str(e)))
+            await session.commit()
+        return failed
+
+    async def _write_batch(self, queue: _UserQueue, batch: List[PendingWrite]) -> None:
+        try:
+            failed = await self._commit(queue, batch, isolate=False)
+        except Exception as e:
+            tasks_logger.warning(f"Write-behind batch of {len(batch)} failed for user {queue.tg_id}, retrying one by one: {e}")
+            try:
+                failed = await self._commit(queue, batch, isolate=True)
+            except Exception as e:
+                failed = [(item, str(e)) for item in batch]
+        metrics.inc("write_behind.batches")
+        metrics.observe("write_behind.batch_size", len(batch))
+        metrics.inc("write_behind.written", len(batch) - len(failed))
+        # Записанное видно из БД, несохранённое — откатываем в интерфейсе
+        for item in batch:
+            for key in item.overlay:
+                if queue.overlay.get(key, (None,))[0] == item.seq:
+                    del queue.overlay[key]
+        for item, error in failed:
+            metrics.inc("write_behind.failed")
+            tasks_logger.error(f"Write-behind failed for user {queue.tg_id}: {item.description}: {error}")
+            try:
+                await queue.bot.send_message(queue.tg_id, f"⚠️ Не удалось сохранить: {item.description}. Изменение отменено.")
+            except Exception as e:
+                tasks_logger.error(f"Failed to report write-behind failure to {queue.tg_id}: {e}")
+
+
+def apply_overlay(rows: Iterable[Row], overlay: Dict[Hashable, Any], kind: str, field: str) -> list:
+    """
+    Подставляет в строки значения поля field из оверлея (ключи (kind, id)).
+    Изменённые строки заменяются объектами с теми же атрибутами.
+    """
+    result = []
+    for row in rows:
+        value = overlay.get((kind, row.id), row)
+        result.append(row if value is row else SimpleNamespace(**{**row._asdict(), field: value}))
+    return result
@@ -0,0 +1,80 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+from utils.metrics import metrics
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Ограниченный по размеру LRU-кэш с необязательным TTL (в секундах).
+    Если задано имя, попадания и промахи учитываются в метриках как cache.<name>.hits/misses.
+    """
+    def __init__(self, maxsize: int, ttl: Optional[float] = None, name: Optional[str] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+
+    def _count(self, outcome: str) -> None:
+        if self.name:
+            metrics.inc(f"cache.{self.name}.{outcome}")
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            self._count("misses")
+            return default
+        expires_at, value = entry
+        if expires_at and expires_at < time.monotonic():
+            del self._data[key]
+            self._count("misses")
+            return default
+        self._data.move_to_end(key)
+        self._count("hits")
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl else 0.0
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+        if self.name:
+            metrics.set_gauge(f"cache.{self.name}.size", len(self._data))
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class Versions:
+    """
+    Версии ключей в пределах процесса для кэшей вида (ключ, версия) -> значение.
+    bump выдаёт ключу новый номер из общего счётчика, поэтому старые записи кэша больше
+    не находятся. Память ограничена: при вытеснении самого давно изменённого ключа его номер
+    становится версией по умолчанию для всех отсутствующих ключей — номера ключей растут
+    в порядке вытеснения, так что ни один ключ не вернётся к уже использованной версии.
+    """
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._versions: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._counter = 0
+        self._floor = 0
+
+    def get(self, key: Hashable) -> int:
+        return self._versions.get(key, self._floor)
+
+    def bump(self, key: Hashable) -> None:
+        self._counter += 1
+        self._versions[key] = self._counter
+        self._versions.move_to_end(key)
+        while len(self._versions) > self.maxsize:
+            _, self._floor = self._versions.popitem(last=False)
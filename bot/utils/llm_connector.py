@@ -1,7 +1,7 @@
-from openai import OpenAI
+from openai import AsyncOpenAI
 from utils.prompts import build_system_prompt
 from environs import Env
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from utils.logger import llm_logger
 import json
 
@@ -10,14 +10,14 @@ env = Env()
 env.read_env()
 openrouter_api_key = env("OPENROUTER_API_KEY")
 
-client = OpenAI(
+client = AsyncOpenAI(
     base_url="https://openrouter.ai/api/v1",
     api_key=openrouter_api_key,
 )
 
 MODEL = env("MODEL")
 
-def send_prompt_to_llm(prompt: str, session: Session, user_id: int) -> str:
+async def send_prompt_to_llm(prompt: str, session: AsyncSession, user_id: int) -> str:
     """
     Отправляет текстовый prompt в LLM (openrouter) с system-промптом и возвращает ответ.
     """
@@ -26,7 +26,8 @@ def send_prompt_to_llm(prompt: str, session: Session, user_id: int) -> str:
     llm_logger.debug(f"Prompt: {prompt[:200]}...")
     
     try:
-        completion = client.chat.completions.create(
+        system_prompt = await build_system_prompt(session, user_id)
+        completion = await client.chat.completions.create(
             extra_headers={},
             extra_body={},
             model=MODEL,
@@ -34,7 +35,7 @@ def send_prompt_to_llm(prompt: str, session: Session, user_id: int) -> str:
                 #{"role": "system", "content": build_system_prompt(session)},
                 {
                     "role": "user", 
-                    "content": build_system_prompt(session, user_id) + "\n\n" + prompt
+                    "content": system_prompt + "\n\n" + prompt
                 }
             ],
             temperature=1
@@ -73,4 +73,6 @@ bot_logger = setup_logger("helper_bot")
 voice_logger = setup_logger("voice_handler")
 tasks_logger = setup_logger("tasks_handler")
 db_logger = setup_logger("database")
-llm_logger = setup_logger("llm") 
\ No newline at end of file
+llm_logger = setup_logger("llm")
+metrics_logger = setup_logger("metrics")
+webhook_logger = setup_logger("webhook")
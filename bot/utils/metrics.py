@@ -0,0 +1,59 @@
+import asyncio
+from collections import defaultdict
+from typing import Dict
+from utils.logger import metrics_logger
+
+
+class Metrics:
+    """
+    In-process реестр метрик: счётчики, gauge и гистограммы (count/sum/max).
+    Все обновления происходят в потоке event loop, поэтому блокировки не нужны.
+    """
+    def __init__(self):
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.gauges: Dict[str, float] = {}
+        self.histograms: Dict[str, list] = {}
+
+    def inc(self, name: str, value: int = 1) -> None:
+        self.counters[name] += value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        self.gauges[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        hist = self.histograms.setdefault(name, [0, 0.0, 0.0])
+        hist[0] += 1
+        hist[1] += value
+        hist[2] = max(hist[2], value)
+
+    def hit_rate(self, prefix: str) -> float:
+        hits = self.counters.get(f"{prefix}.hits", 0)
+        misses = self.counters.get(f"{prefix}.misses", 0)
+        total = hits + misses
+        return hits / total if total else 0.0
+
+    def snapshot(self) -> dict:
+        return {
+            "counters": dict(self.counters),
+            "hit_rates": {
+                name[:-len(".hits")]: round(self.hit_rate(name[:-len(".hits")]), 3)
+                for name in self.counters if name.endswith(".hits")
+            },
+            "gauges": dict(self.gauges),
+            "histograms": {
+                name: {"count": count, "avg": total / count if count else 0.0, "max": peak}
+                for name, (count, total, peak) in self.histograms.items()
+            },
+        }
+
+
+metrics = Metrics()
+
+
+async def log_metrics_periodically(interval: float) -> None:
+    """
+    Периодически пишет снимок метрик в лог.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        metrics_logger.info(f"Metrics snapshot: {metrics.snapshot()}")
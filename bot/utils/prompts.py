@@ -1,9 +1,12 @@
 from ctypes import Union
 from datetime import datetime
 from database.models import DbTask, DbEvent, DbGoal, DbIdea, DbNote, DbTag, DbSubtask
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.links import link_store
+from services.related import get_related_items
 
-def build_system_prompt(session: Session, user_id: int) -> str:
+async def build_system_prompt(session: AsyncSession, user_id: int) -> str:
     """
     Возвращает system-промпт для LLM, чтобы она отвечала строго в формате YAML по answer_template.yaml,
     а также добавляет в промпт по каждой основной таблице (Task, Event, Goal, Idea, Note, Tag) список id и name.
@@ -13,44 +16,18 @@ def build_system_prompt(session: Session, user_id: int) -> str:
         template = file.read()
     
     # Справочники по объектам
-    tasks = session.query(DbTask.id, DbTask.name).filter(DbTask.user_id == user_id, DbTask.is_deleted == False).all()
-    events = session.query(DbEvent.id, DbEvent.name).filter(DbEvent.user_id == user_id, DbEvent.is_deleted == False).all()
-    goals = session.query(DbGoal.id, DbGoal.name).filter(DbGoal.user_id == user_id, DbGoal.is_deleted == False).all()
-    ideas = session.query(DbIdea.id, DbIdea.name).filter(DbIdea.user_id == user_id, DbIdea.is_deleted == False).all()
-    notes = session.query(DbNote.id, DbNote.name).filter(DbNote.user_id == user_id, DbNote.is_deleted == False).all()
-    tags = session.query(DbTag.id, DbTag.name).filter(DbTag.user_id == user_id, DbTag.is_deleted == False).all()
-    subtasks = session.query(DbSubtask.id, DbSubtask.name, DbSubtask.task_id).filter(DbSubtask.is_deleted == False).all()
+    tasks = (await session.execute(select(DbTask.id, DbTask.name).where(DbTask.user_id == user_id, DbTask.is_deleted == False))).all()
+    events = (await session.execute(select(DbEvent.id, DbEvent.name).where(DbEvent.user_id == user_id, DbEvent.is_deleted == False))).all()
+    goals = (await session.execute(select(DbGoal.id, DbGoal.name).where(DbGoal.user_id == user_id, DbGoal.is_deleted == False))).all()
+    ideas = (await session.execute(select(DbIdea.id, DbIdea.name).where(DbIdea.user_id == user_id, DbIdea.is_deleted == False))).all()
+    notes = (await session.execute(select(DbNote.id, DbNote.name).where(DbNote.user_id == user_id, DbNote.is_deleted == False))).all()
+    tags = (await session.execute(select(DbTag.id, DbTag.name).where(DbTag.user_id == user_id, DbTag.is_deleted == False))).all()
+    subtasks = (await session.execute(select(DbSubtask.id, DbSubtask.name, DbSubtask.task_id).where(DbSubtask.is_deleted == False))).all()
 
-    # Связи между объектами (many-to-many)
-    def get_links(table, col1, col2):
-        return session.execute(table.select()).fetchall()
-
-    # Импортируем таблицы связей из models.py
-    from database.models import (
-        task_event, task_goal, task_idea, task_note, task_tag,
-        event_goal, event_idea, event_note, event_tag,
-        goal_idea, goal_note, goal_tag,
-        idea_note, idea_tag,
-        note_tag
-    )
-
-    links = {
-        "task_event": get_links(task_event, "task_id", "event_id"),
-        "task_goal": get_links(task_goal, "task_id", "goal_id"),
-        "task_idea": get_links(task_idea, "task_id", "idea_id"),
-        "task_note": get_links(task_note, "task_id", "note_id"),
-        "task_tag": get_links(task_tag, "task_id", "tag_id"),
-        "event_goal": get_links(event_goal, "event_id", "goal_id"),
-        "event_idea": get_links(event_idea, "event_id", "idea_id"),
-        "event_note": get_links(event_note, "event_id", "note_id"),
-        "event_tag": get_links(event_tag, "event_id", "tag_id"),
-        "goal_idea": get_links(goal_idea, "goal_id", "idea_id"),
-        "goal_note": get_links(goal_note, "goal_id", "note_id"),
-        "goal_tag": get_links(goal_tag, "goal_id", "tag_id"),
-        "idea_note": get_links(idea_note, "idea_id", "note_id"),
-        "idea_tag": get_links(idea_tag, "idea_id", "tag_id"),
-        "note_tag": get_links(note_tag, "note_id", "tag_id"),
-    }
+    # Связи между объектами (many-to-many): имя пары (task_event, ...) -> [(src_id, dst_id)]
+    links = await link_store.fetch_catalog(session, user_id)
+    # Косвенные связи целей: что стоит за целью через промежуточные объекты (прямые уже есть в links)
+    goal_related = await get_related_items(session, user_id, [("goal", goal.id) for goal in goals])
 
     def format_list(lst, fields):
         return "\n".join(" ".join(str(getattr(row, f, row[idx])) for idx, f in enumerate(fields)) for row in lst)
@@ -65,11 +42,16 @@ def build_system_prompt(session: Session, user_id: int) -> str:
         "subtasks(subtask_id, subtask_name, task_id):\n" + format_list(subtasks, ["id", "name", "task_id"]) + "\n"
     )
     for link_name, link_rows in links.items():
-        # Имя связи и поля
-        table = eval(link_name)
-        cols = [c.name for c in table.columns]
+        # Имя связи и поля: task_event -> task_id, event_id
+        cols = [f"{entity}_id" for entity in link_name.split("_")]
         dicts_txt += f"{link_name}({', '.join(cols)}):\n"
-        dicts_txt += format_list(link_rows, cols) + "\n"
+        dicts_txt += "\n".join(f"{src_id} {dst_id}" for src_id, dst_id in link_rows) + "\n"
+    dicts_txt += "goal_indirect(goal_id, type, id, hops):\n" + "\n".join(
+        f"{goal_id} {item.type} {item.id} {item.depth}"
+        for (_, goal_id), items in goal_related.items()
+        for item in items
+        if item.depth > 1
+    ) + "\n"
 
     prompt = (
         "Ты — интеллектуальный ассистент-органайзер. "
@@ -0,0 +1,183 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Hashable, Optional, Union
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+from environs import Env
+from utils.cache import LRUCache
+from utils.logger import bot_logger
+from utils.metrics import metrics
+
+env = Env()
+env.read_env()
+
+TG_RATE_LIMIT = env.bool("TG_RATE_LIMIT", True)
+# Лимиты Telegram: ~30 сообщений в секунду на бота, ~1 в секунду в личный чат, 20 в минуту в группу
+TG_GLOBAL_RATE = env.float("TG_GLOBAL_RATE", 30)
+TG_CHAT_RATE = env.float("TG_CHAT_RATE", 1)
+# Короткая пачка в личный чат (ответ на голосовое — два сообщения подряд) уходит без ожидания
+TG_CHAT_BURST = env.int("TG_CHAT_BURST", 3)
+TG_GROUP_RATE = env.float("TG_GROUP_RATE", 20 / 60)
+# Сколько раз повторять запрос после 429 (retry_after), прежде чем отдать ошибку хендлеру
+TG_RETRY_LIMIT = env.int("TG_RETRY_LIMIT", 3)
+
+# Методы, которые Telegram считает отправкой в чат; sendChatAction в лимиты не входит
+LIMITED_PREFIXES = ("send", "edit", "copy", "forward")
+UNLIMITED_METHODS = {"sendChatAction"}
+# Правки, из которых при подряд идущих правках одного сообщения отправляется только последняя
+COALESCED_METHODS = {"editMessageText", "editMessageReplyMarkup", "editMessageCaption"}
+
+
+class TokenBucket:
+    """
+    Token bucket с резервированием: reserve() сразу забирает токен (баланс может уйти в минус)
+    и возвращает, сколько ждать до отправки. block() запрещает отправку на время retry_after.
+    """
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def reserve(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(wait, self.blocked_until - now)
+
+    def block(self, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class _Request:
+    __slots__ = ("make_request", "bot", "method", "coalesce_key", "queued_at", "future")
+
+    def __init__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod, coalesce_key: Optional[Hashable]):
+        self.make_request = make_request
+        self.bot = bot
+        self.method = method
+        self.coalesce_key = coalesce_key
+        self.queued_at = time.monotonic()
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class OutboundScheduler(BaseRequestMiddleware):
+    """
+    Middleware сессии Bot: отправки в чаты идут через очередь чата (строго по порядку, задача
+    на чат, пока очередь не пуста), ждут токен бакета чата и общего бакета бота. Остальные
+    методы (getUpdates, answerCallbackQuery, ...) проходят без очереди.
+
+    Правка сообщения, пришедшая, пока предыдущая правка того же сообщения тем же методом
+    последней ждёт в очереди чата, заменяет её: отправляется одна правка с последним
+    содержимым, и все ждавшие получают её результат.
+
+    На 429 бакет чата блокируется на retry_after, и запрос повторяется (до retry_limit раз).
+    Метрики: telegram.queue_delay_ms (от постановки в очередь до первой попытки),
+    telegram.queued, telegram.coalesced, telegram.retry_after.
+    """
+    def __init__(self, global_rate: float, chat_rate: float, chat_burst: int, group_rate: float, retry_limit: int,
+                 max_chats: int = 10000):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.retry_limit = retry_limit
+        self.global_bucket = TokenBucket(global_rate, max(int(global_rate), 1))
+        # Вытесняются давно молчавшие чаты — их бакеты и так полные
+        self._buckets = LRUCache(maxsize=max_chats)
+        self._queues: Dict[Union[int, str], Deque[_Request]] = {}
+        self._tasks = set()
+        self._queued = 0
+
+    @staticmethod
+    def chat_of(method: TelegramMethod) -> Optional[Union[int, str]]:
+        name = method.__api_method__
+        if name in UNLIMITED_METHODS or not name.startswith(LIMITED_PREFIXES):
+            return None
+        return getattr(method, "chat_id", None)
+
+    def _bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            # Положительные id — личные чаты, отрицательные и @username — группы и каналы
+            if isinstance(chat_id, int) and chat_id > 0:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            else:
+                bucket = TokenBucket(self.group_rate, 1)
+            self._buckets.set(chat_id, bucket)
+        return bucket
+
+    async def __call__(self, make_request: NextRequestMiddlewareType[TelegramType], bot: Bot,
+                       method: TelegramMethod[TelegramType]) -> Response[TelegramType]:
+        chat_id = self.chat_of(method)
+        if chat_id is None:
+            return await make_request(bot, method)
+        coalesce_key = None
+        if method.__api_method__ in COALESCED_METHODS and getattr(method, "message_id", None) is not None:
+            coalesce_key = (method.__api_method__, method.message_id)
+        queue = self._queues.get(chat_id)
+        if coalesce_key is not None and queue and queue[-1].coalesce_key == coalesce_key:
+            queue[-1].method = method
+            metrics.inc("telegram.coalesced")
+            return await asyncio.shield(queue[-1].future)
+
+        request = _Request(make_request, bot, method, coalesce_key)
+        self._queued += 1
+        metrics.set_gauge("telegram.queued", self._queued)
+        if queue is not None:
+            queue.append(request)
+        else:
+            self._queues[chat_id] = deque([request])
+            task = asyncio.create_task(self._drain(chat_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        # Отмена хендлера не отменяет отправку: на неё могут ждать и слитые правки
+        return await asyncio.shield(request.future)
+
+    async def _drain(self, chat_id: Union[int, str]) -> None:
+        queue = self._queues[chat_id]
+        while queue:
+            request = queue.popleft()
+            self._queued -= 1
+            metrics.set_gauge("telegram.queued", self._queued)
+            try:
+                result = await self._send(chat_id, request)
+            except Exception as e:
+                request.future.set_exception(e)
+            else:
+                request.future.set_result(result)
+        # Между последней проверкой очереди и удалением нет await — новый запрос не потеряется
+        del self._queues[chat_id]
+
+    async def _send(self, chat_id: Union[int, str], request: _Request) -> Any:
+        bucket = self._bucket(chat_id)
+        for attempt in range(self.retry_limit + 1):
+            delay = bucket.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            delay = self.global_bucket.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if attempt == 0:
+                metrics.observe("telegram.queue_delay_ms", (time.monotonic() - request.queued_at) * 1000)
+            try:
+                return await request.make_request(request.bot, request.method)
+            except TelegramRetryAfter as e:
+                metrics.inc("telegram.retry_after")
+                if attempt == self.retry_limit:
+                    raise
+                bot_logger.warning(
+                    f"Flood control for chat {chat_id} on {request.method.__api_method__}: retry in {e.retry_after}s"
+                )
+                bucket.block(e.retry_after)
+
+    async def join(self) -> None:
+        """Дожидается отправки всего, что уже в очередях."""
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
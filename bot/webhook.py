@@ -0,0 +1,313 @@
+"""
+Вебхук-режим бота.
+
+Один процесс принимает вебхук сам (BOT_MODE=webhook python bot/main.py) или фронт принимает
+вебхук и раздаёт апдейты N процессам-воркерам (bot/main.py с BOT_MODE=worker на локальных портах):
+
+    python bot/webhook.py --workers 4
+
+Процесс с диспетчером отвечает Telegram 200 сразу после постановки апдейта в очередь, обработка
+идёт в фоне. Фронт отвечает 200 только после того, как апдейт принял воркер, иначе 503 —
+и Telegram доставит апдейт повторно.
+Апдейты одного пользователя обрабатываются строго по очереди и всегда одним воркером
+(user_id % N), поэтому порядок сохраняется, а кэши процесса и буфер правок связей
+видят все действия пользователя. Апдейты разных пользователей идут параллельно.
+"""
+import argparse
+import asyncio
+import hmac
+import json
+import os
+import signal
+import sys
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional, Set, Tuple
+
+from aiohttp import ClientError, ClientSession, ClientTimeout, web
+from environs import Env
+
+from utils.logger import webhook_logger
+from utils.metrics import metrics
+
+env = Env()
+env.read_env()
+
+# Публичный адрес вебхука (для setWebhook); без него вебхук не регистрируется — удобно для локальных тестов
+WEBHOOK_URL = env("WEBHOOK_URL", None)
+WEBHOOK_PATH = env("WEBHOOK_PATH", "/webhook")
+WEBHOOK_HOST = env("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = env.int("WEBHOOK_PORT", 8080)
+WEBHOOK_SECRET = env("WEBHOOK_SECRET", "")
+# Воркер i слушает 127.0.0.1:WEBHOOK_WORKER_PORT + i
+WEBHOOK_WORKER_PORT = env.int("WEBHOOK_WORKER_PORT", 8100)
+# Сколько апдейтов может ждать обработки; сверх этого — 503, и Telegram повторит доставку позже
+WEBHOOK_MAX_PENDING = env.int("WEBHOOK_MAX_PENDING", 10000)
+WEBHOOK_MAX_CONNECTIONS = env.int("WEBHOOK_MAX_CONNECTIONS", 40)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+
+def update_key(update: Dict[str, Any]) -> int:
+    """
+    Ключ упорядочивания апдейта — id пользователя (from/user события), иначе id чата.
+    Апдейты без того и другого упорядочиваются каждый сам по себе.
+    """
+    for name, event in update.items():
+        if not isinstance(event, dict):
+            continue
+        for field in ("from", "user", "chat"):
+            owner = event.get(field)
+            if isinstance(owner, dict) and "id" in owner:
+                return owner["id"]
+    return -update.get("update_id", 0)
+
+
+class KeyedQueue:
+    """
+    Очереди по ключу: элементы одного ключа обрабатываются строго по порядку, разных
+    ключей — параллельно (по задаче на ключ, пока у него есть элементы). Ошибка обработки
+    логируется и не останавливает очередь ключа.
+    Результат обработки элемента — в future из submit (False при ошибке).
+    """
+    def __init__(self, handler: Callable[[Any], Awaitable[None]], max_pending: int, name: str):
+        self.handler = handler
+        self.max_pending = max_pending
+        self.name = name
+        self.pending = 0
+        self._queues: Dict[Hashable, Deque[Tuple[Any, asyncio.Future]]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def submit(self, key: Hashable, item: Any) -> Optional[asyncio.Future]:
+        """Ставит элемент в очередь ключа и возвращает future результата; None — очередь переполнена."""
+        if self.pending >= self.max_pending:
+            metrics.inc(f"{self.name}.rejected")
+            return None
+        self.pending += 1
+        metrics.set_gauge(f"{self.name}.pending", self.pending)
+        done = asyncio.get_running_loop().create_future()
+        queue = self._queues.get(key)
+        if queue is not None:
+            queue.append((item, done))
+            return done
+        self._queues[key] = deque([(item, done)])
+        task = asyncio.create_task(self._drain(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return done
+
+    async def _drain(self, key: Hashable) -> None:
+        queue = self._queues[key]
+        while queue:
+            item, done = queue.popleft()
+            started = time.perf_counter()
+            try:
+                done.set_result(await self.handler(item))
+            except Exception as e:
+                done.set_result(False)
+                metrics.inc(f"{self.name}.errors")
+                webhook_logger.error(f"{self.name}: failed to process item for key {key}: {e}")
+            finally:
+                self.pending -= 1
+                metrics.set_gauge(f"{self.name}.pending", self.pending)
+                metrics.observe(f"{self.name}.process_ms", (time.perf_counter() - started) * 1000)
+        # Между последней проверкой очереди и удалением нет await — новый элемент не потеряется
+        del self._queues[key]
+
+    async def join(self) -> None:
+        """Дожидается обработки всего, что уже в очередях."""
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+def webhook_app(path: str, secret: str, queue: KeyedQueue, parse: Callable[[bytes], tuple],
+                wait: bool = False) -> web.Application:
+    """
+    aiohttp-приложение с одним маршрутом: проверяет секрет, ставит апдейт в очередь и отвечает 200.
+    parse(body) -> (ключ упорядочивания, элемент очереди).
+    wait — отвечать только после обработки: 200, если обработчик вернул True, иначе 503.
+    """
+    async def handle(request: web.Request) -> web.Response:
+        if secret and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), secret):
+            metrics.inc("webhook.unauthorized")
+            return web.Response(status=401)
+        try:
+            key, item = parse(await request.read())
+        except ValueError:
+            metrics.inc("webhook.bad_requests")
+            return web.Response(status=400)
+        done = queue.submit(key, item)
+        if done is None:
+            return web.Response(status=503)
+        if wait and not await asyncio.shield(done):
+            return web.Response(status=503)
+        metrics.inc("webhook.received")
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(path, handle)
+    return app
+
+
+def parse_update(body: bytes) -> tuple:
+    update = json.loads(body)
+    if not isinstance(update, dict):
+        raise ValueError("Update must be a JSON object")
+    return update_key(update), update
+
+
+async def serve(app: web.Application, host: str, port: int) -> web.AppRunner:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+async def wait_for_stop_signal() -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    await stop.wait()
+
+
+async def run_webhook(dp, bot, host: str, port: int, register: bool) -> None:
+    """
+    Принимает апдейты по HTTP и скармливает их диспетчеру в фоне (BOT_MODE=webhook и worker).
+    register — зарегистрировать вебхук в Telegram (процесс принимает вебхук напрямую).
+    По SIGTERM/SIGINT перестаёт принимать апдейты, дообрабатывает очередь и вызывает shutdown-хуки.
+    """
+    queue = KeyedQueue(lambda update: dp.feed_raw_update(bot, update), WEBHOOK_MAX_PENDING, "webhook")
+    await dp.emit_startup(bot=bot)
+    if register and WEBHOOK_URL:
+        await bot.set_webhook(
+            WEBHOOK_URL + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET or None,
+            allowed_updates=dp.resolve_used_update_types(),
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+        )
+        webhook_logger.info(f"Webhook registered at {WEBHOOK_URL}{WEBHOOK_PATH}")
+    runner = await serve(webhook_app(WEBHOOK_PATH, WEBHOOK_SECRET, queue, parse_update), host, port)
+    webhook_logger.info(f"Accepting updates on {host}:{port}{WEBHOOK_PATH}")
+    try:
+        await wait_for_stop_signal()
+    finally:
+        await runner.cleanup()
+        webhook_logger.info(f"Stopping: {queue.pending} updates left to process")
+        await queue.join()
+        await dp.emit_shutdown(bot=bot)
+        await bot.session.close()
+
+
+class Front:
+    """
+    Фронт для нескольких воркеров: принимает вебхук и пересылает тело апдейта воркеру
+    user_id % N. Пересылка по ключу последовательная (следующий апдейт пользователя уходит
+    после ответа воркера на предыдущий), так что порядок доходит до воркера неизменным.
+    Telegram получает 200 только после того, как воркер принял апдейт; если воркер не принял
+    его за RETRIES попыток, фронт отвечает 503 и Telegram повторит доставку.
+    Упавший воркер перезапускается.
+    """
+    RETRIES = 5
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.processes: Dict[int, asyncio.subprocess.Process] = {}
+        self.session: Optional[ClientSession] = None
+        self.stopping = False
+        self.queue = KeyedQueue(self.forward, WEBHOOK_MAX_PENDING, "front")
+        self._supervisors: Set[asyncio.Task] = set()
+
+    def parse(self, body: bytes) -> tuple:
+        key, _ = parse_update(body)
+        return key, (key, body)
+
+    async def forward(self, item: tuple) -> bool:
+        key, body = item
+        url = f"http://127.0.0.1:{WEBHOOK_WORKER_PORT + key % self.workers}{WEBHOOK_PATH}"
+        headers = {SECRET_HEADER: WEBHOOK_SECRET, "Content-Type": "application/json"}
+        for attempt in range(1, self.RETRIES + 1):
+            try:
+                async with self.session.post(url, data=body, headers=headers) as response:
+                    if response.status == 200:
+                        return True
+                    error = f"HTTP {response.status}"
+            except (ClientError, asyncio.TimeoutError) as e:
+                error = str(e) or type(e).__name__
+            # Воркер ещё стартует, перезапускается или перегружен
+            metrics.inc("front.retries")
+            await asyncio.sleep(0.5 * attempt)
+        metrics.inc("front.rejected")
+        webhook_logger.error(f"Update for key {key} not accepted, Telegram will redeliver it: worker {key % self.workers} answered {error}")
+        return False
+
+    async def spawn(self, index: int) -> None:
+        self.processes[index] = await asyncio.create_subprocess_exec(
+            sys.executable, MAIN,
+            env={
+                **os.environ,
+                "BOT_MODE": "worker",
+                "WEBHOOK_WORKER_INDEX": str(index),
+                "WEBHOOK_WORKERS": str(self.workers),
+                "WEBHOOK_HOST": "127.0.0.1",
+                "WEBHOOK_PORT": str(WEBHOOK_WORKER_PORT + index),
+            },
+        )
+        webhook_logger.info(f"Worker {index} started (pid {self.processes[index].pid})")
+
+    async def supervise(self, index: int) -> None:
+        while True:
+            code = await self.processes[index].wait()
+            if self.stopping:
+                return
+            webhook_logger.error(f"Worker {index} exited with code {code}, restarting")
+            metrics.inc("front.worker_restarts")
+            await asyncio.sleep(1)
+            await self.spawn(index)
+
+    async def register_webhook(self) -> None:
+        from aiogram import Bot
+
+        bot = Bot(token=env("TELEGRAM_BOT_TOKEN"))
+        try:
+            await bot.set_webhook(
+                WEBHOOK_URL + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET or None,
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+            )
+        finally:
+            await bot.session.close()
+        webhook_logger.info(f"Webhook registered at {WEBHOOK_URL}{WEBHOOK_PATH}")
+
+    async def run(self) -> None:
+        self.session = ClientSession(timeout=ClientTimeout(total=10))
+        for index in range(self.workers):
+            await self.spawn(index)
+            task = asyncio.create_task(self.supervise(index))
+            self._supervisors.add(task)
+        if WEBHOOK_URL:
+            await self.register_webhook()
+        runner = await serve(webhook_app(WEBHOOK_PATH, WEBHOOK_SECRET, self.queue, self.parse, wait=True), WEBHOOK_HOST, WEBHOOK_PORT)
+        webhook_logger.info(f"Front accepting updates on {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}, {self.workers} workers")
+        try:
+            await wait_for_stop_signal()
+        finally:
+            await runner.cleanup()
+            # Сначала доставляем принятое, потом останавливаем воркеров: каждый дообработает свою очередь
+            await self.queue.join()
+            self.stopping = True
+            for process in self.processes.values():
+                if process.returncode is None:
+                    process.terminate()
+            await asyncio.gather(*(process.wait() for process in self.processes.values()))
+            for task in self._supervisors:
+                task.cancel()
+            await self.session.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=env.int("WEBHOOK_WORKERS", 2))
+    args = parser.parse_args()
+    asyncio.run(Front(args.workers).run())
@@ -0,0 +1,14 @@
+#!/bin/bash
+# Готовит primary к потоковой репликации: роль для репликации, слот и правило в pg_hba.conf.
+# Выполняется образом postgres только при инициализации пустого каталога данных.
+set -e
+
+REPLICATION_USER="${POSTGRES_REPLICATION_USER:-replicator}"
+REPLICATION_PASSWORD="${POSTGRES_REPLICATION_PASSWORD:-replicatorpass}"
+
+psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "$POSTGRES_DB" <<-EOSQL
+    CREATE ROLE ${REPLICATION_USER} WITH REPLICATION LOGIN PASSWORD '${REPLICATION_PASSWORD}';
+    SELECT pg_create_physical_replication_slot('replica_slot');
+EOSQL
+
+echo "host replication ${REPLICATION_USER} all scram-sha-256" >> "$PGDATA/pg_hba.conf"
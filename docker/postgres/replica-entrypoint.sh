@@ -0,0 +1,20 @@
+#!/bin/bash
+# Поднимает hot standby: при пустом каталоге данных снимает базовую копию с primary
+# (pg_basebackup -R пишет standby.signal и primary_conninfo), затем запускает postgres.
+set -e
+
+REPLICATION_USER="${POSTGRES_REPLICATION_USER:-replicator}"
+REPLICATION_PASSWORD="${POSTGRES_REPLICATION_PASSWORD:-replicatorpass}"
+PRIMARY_HOST="${POSTGRES_PRIMARY_HOST:-postgres}"
+
+if [ ! -s "$PGDATA/PG_VERSION" ]; then
+    until pg_isready -h "$PRIMARY_HOST" -U "$REPLICATION_USER"; do
+        sleep 1
+    done
+    PGPASSWORD="$REPLICATION_PASSWORD" pg_basebackup \
+        -h "$PRIMARY_HOST" -U "$REPLICATION_USER" -D "$PGDATA" \
+        -R -X stream -S replica_slot
+    chmod 0700 "$PGDATA"
+fi
+
+exec postgres -c hot_standby=on